@@ -0,0 +1,105 @@
+"""asyncio versions of the crud functions used by the API.
+
+Writes and graph pages run crud's plans (plans.py) on `async_db`, so the
+query and row logic lives in crud and route handlers never block a
+threadpool worker.
+"""
+from .database import async_db
+from . import cache, crud, plans, traversal
+from .crud import (
+    DETECT_USERS_QUERY, DETECT_TRANSACTIONS_QUERY, USER_TRANSACTIONS_QUERY, TRANSACTION_DETAILS_QUERY,
+    DETECTED_EDGES, graph_element, export_query, transactions_query,
+)
+from .detection_queue import DetectionQueue, DETECTION_MODE
+
+async def _log_detected(kind, keys):
+    # Links created by a background detection batch
+    await plans.arun(crud.log_changes_plan("User" if kind == "users" else "Transaction", [], DETECTED_EDGES, keys),
+                     async_db)
+
+detection = DetectionQueue({"users": DETECT_USERS_QUERY, "transactions": DETECT_TRANSACTIONS_QUERY},
+                           on_detected=_log_detected)
+
+async def create_user(user_data):
+    queued = DETECTION_MODE == "async"
+    await plans.arun(crud.create_user_plan(user_data, detect=not queued), async_db)
+    if queued:
+        await detection.put("users", user_data["user_id"], user_data)
+
+async def create_transaction(txn_data):
+    queued = DETECTION_MODE == "async"
+    txn_data = await plans.arun(crud.create_transaction_plan(txn_data, detect=not queued), async_db)
+    if queued:
+        await detection.put("transactions", txn_data["txn_id"], txn_data)
+
+async def create_users_bulk(users, batch_size=None, detect=True):
+    return await plans.arun(crud.create_users_bulk_plan(users, batch_size, detect), async_db)
+
+async def create_transactions_bulk(transactions, batch_size=None, detect=True):
+    return await plans.arun(crud.create_transactions_bulk_plan(transactions, batch_size, detect), async_db)
+
+async def get_all_users(limit: int = 200):
+    return await async_db.query("MATCH (u:User) RETURN u LIMIT $limit", {"limit": limit})
+
+async def get_all_transactions(limit: int = 200, window=None):
+    return await async_db.query(transactions_query(window), {"limit": limit, **(window or {})})
+
+def iter_graph_rows(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Async version of crud.iter_graph_rows."""
+    return plans.aiterate(crud.graph_rows_plan(seed, depth, node_limit, edge_limit, cursor, window), async_db)
+
+async def iter_graph_data(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Async version of crud.iter_graph_data."""
+    async for row in iter_graph_rows(seed, depth, node_limit, edge_limit, cursor, window):
+        yield graph_element(row)
+
+async def get_graph_data(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Read-through cached; scan pages are dropped on any write, seeded pages by their nodes."""
+    async def load():
+        graph = {"nodes": [], "edges": []}
+        async for item in iter_graph_data(seed, depth, node_limit, edge_limit, cursor, window):
+            crud.collect_graph_item(graph, item)
+        return graph
+
+    bounds = (window["since"], window["until"]) if window else None
+    key = f"graph:{seed}:{depth}:{node_limit}:{edge_limit}:{cursor}:{bounds}"
+    extra = [cache.ANY_WRITE] if seed is None else [f"User:{seed}", f"Transaction:{seed}"]
+    return await cache.aread_through(key, load, extra)
+
+async def warm_up():
+    """Run the hot read queries once so their plans are cached before the first request."""
+    await get_all_users(1)
+    await get_all_transactions(1)
+    async for _ in iter_graph_rows(node_limit=10, edge_limit=10):
+        pass
+
+async def iter_users(limit=None):
+    async for record in async_db.stream(export_query("User", limit), {"limit": limit}):
+        yield record["n"]
+
+async def iter_transactions(limit=None, window=None):
+    async for record in async_db.stream(export_query("Transaction", limit, window),
+                                        {"limit": limit, **(window or {})}):
+        yield record["n"]
+
+async def get_user_transactions(user_id):
+    """Raw `u, t, r` rows for a user's transactions (read-through cached)."""
+    return await cache.aread_through(
+        f"user_txns:{user_id}",
+        lambda: async_db.query(USER_TRANSACTIONS_QUERY, {"user_id": user_id}),
+        [f"User:{user_id}"],
+    )
+
+async def get_transaction_details(txn_id):
+    """Raw `s, t, r` rows for a transaction (read-through cached)."""
+    return await cache.aread_through(
+        f"txn:{txn_id}",
+        lambda: async_db.query(TRANSACTION_DETAILS_QUERY, {"txn_id": txn_id}),
+        [f"Transaction:{txn_id}"],
+    )
+
+async def shortest_path(u1, u2, **limits):
+    return await traversal.arun(traversal.shortest_path_search(u1, u2, **limits), async_db)
+
+async def neighbourhood(key, depth=1, **limits):
+    return await traversal.arun(traversal.neighbourhood_search(key, depth, **limits), async_db)
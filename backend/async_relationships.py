@@ -0,0 +1,20 @@
+from .database import async_db
+from .relationships import (USER_RELATIONSHIPS_QUERY, TRANSACTION_RELATIONSHIPS_QUERY, RELATIONSHIPS_LIMIT,
+                            relationships_params, bounded)
+from .traversal import DEGREE_CAP
+from . import cache
+
+async def get_user_relationships(user_id: str, limit=RELATIONSHIPS_LIMIT, degree_cap=DEGREE_CAP):
+    async def load():
+        params = relationships_params("user_id", user_id, limit, degree_cap)
+        return bounded(await async_db.query(USER_RELATIONSHIPS_QUERY, params), limit)
+
+    return await cache.aread_through(f"user_rels:{user_id}:{limit}:{degree_cap}", load, [f"User:{user_id}"])
+
+async def get_transaction_relationships(txn_id: str, limit=RELATIONSHIPS_LIMIT, degree_cap=DEGREE_CAP):
+    async def load():
+        params = relationships_params("txn_id", txn_id, limit, degree_cap)
+        return bounded(await async_db.query(TRANSACTION_RELATIONSHIPS_QUERY, params), limit)
+
+    return await cache.aread_through(f"txn_rels:{txn_id}:{limit}:{degree_cap}", load,
+                                     [f"Transaction:{txn_id}"])
@@ -0,0 +1,217 @@
+"""Read-through cache for hot lookups.
+
+Entries are keyed per entity (`user_txns:<id>`, `txn:<id>`, ...) or per
+subgraph (`graph:<params>`) and tagged with every node they contain: its id
+(`User:<id>`) and its matchable attribute values (`email:<value>`, ...).
+A write invalidates the tags of the nodes it touched, which drops exactly
+the entries that include those nodes or any node sharing an attribute with
+them, i.e. whose SHARED_ATTRIBUTE / LINKED neighbourhood just changed.
+
+CACHE_BACKEND selects the backend: "memory" (default, in-process LRU with
+TTL), "redis" (shared between workers, needs the `redis` package and
+REDIS_URL) or "none".
+"""
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+from .hubs import USER_HUBS, TRANSACTION_HUBS
+
+try:
+    import redis
+except ImportError:  # optional, only needed for CACHE_BACKEND=redis
+    redis = None
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Tag invalidated by every write; used by entries that any write may change
+ANY_WRITE = "*"
+
+USER_TAG_ATTRIBUTES = [attr for attr, _, _ in USER_HUBS]
+TRANSACTION_TAG_ATTRIBUTES = [attr for attr, _, _ in TRANSACTION_HUBS]
+
+def node_tags(props):
+    """Tags for one user or transaction property dict (empty for anything else)."""
+    if "user_id" in props:
+        tags, attrs = [f"User:{props['user_id']}"], USER_TAG_ATTRIBUTES
+    elif "txn_id" in props:
+        tags, attrs = [f"Transaction:{props['txn_id']}"], TRANSACTION_TAG_ATTRIBUTES
+        tags += [f"User:{props[k]}" for k in ("sender_id", "receiver_id") if props.get(k)]
+    else:
+        return []
+    return tags + [f"{attr}:{props[attr]}" for attr in attrs if props.get(attr) is not None]
+
+def tags_of(value):
+    """Tags of every node found anywhere in a (nested) query result."""
+    tags = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            tags.update(node_tags(item))
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return tags
+
+class LRUCache:
+    """In-process LRU with per-entry TTL and a cap on the number of entries."""
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries),
+                    "max_entries": self.max_entries, "ttl": self.ttl, **self.counters}
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class RedisCache:
+    """Shared cache in Redis; eviction is left to Redis' maxmemory policy."""
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL, prefix="utg:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        self.counters["hits" if raw is not None else "misses"] += 1
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, default=str), ex=int(self.ttl) or None)
+        for tag in tags:
+            pipe.sadd(f"{self.prefix}tag:{tag}", key)
+            pipe.expire(f"{self.prefix}tag:{tag}", int(self.ttl) or None)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self.client.smembers(tag_key)
+            if keys:
+                self.counters["invalidations"] += self.client.delete(*(self.prefix + k.decode() for k in keys))
+            self.client.delete(tag_key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        info = self.client.info("stats")
+        return {"backend": "redis", "ttl": self.ttl, **self.counters,
+                "evictions": info.get("evicted_keys"), "expirations": info.get("expired_keys")}
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags=()):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+def _make_cache():
+    if CACHE_BACKEND == "redis":
+        return RedisCache()
+    if CACHE_BACKEND == "none":
+        return NullCache()
+    return LRUCache()
+
+cache = _make_cache()
+
+def read_through(key, load, extra_tags=()):
+    """Return the cached value for `key`, else `load()` it and cache it tagged by its nodes."""
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, tags_of(value) | set(extra_tags))
+    return value
+
+async def aread_through(key, load, extra_tags=()):
+    """Async version of read_through; `load` is a coroutine function."""
+    value = cache.get(key)
+    if value is None:
+        value = await load()
+        cache.set(key, value, tags_of(value) | set(extra_tags))
+    return value
+
+def invalidate_write(*records):
+    """Drop the entries affected by writing the given user / transaction records."""
+    tags = {ANY_WRITE}
+    for record in records:
+        tags.update(node_tags(record))
+    cache.invalidate(tags)
+
+def invalidate_all():
+    """Drop everything, e.g. after a bulk load."""
+    cache.clear()
@@ -0,0 +1,179 @@
+"""Append-only change log of graph writes, for incremental updates.
+
+Every write through `crud` / `async_crud` appends the written nodes and
+the edges touching them, with their relationship detection, as
+Cytoscape elements (the same ones /graph returns). Each entry gets the
+next sequence number. An entry is one JSON line in CHANGES_LOG:
+
+    {"seq": 42, "time": 1718000000000, "op": "upsert", "element": {...}}
+
+"upsert" adds the element or replaces its data. "reload" means a write
+touched more than CHANGES_EDGE_LIMIT edges; they were not logged, so
+clients should fetch the graph again.
+
+Appends take an exclusive lock on the file and first index whatever
+other processes appended, so sequence numbers stay contiguous across API
+workers. Readers keep a sparse seq -> offset index of the file and read
+from there. Clients follow the log with GET /graph/changes?since= (pages)
+or GET /graph/changes/stream (Server-Sent Events, resumable through
+Last-Event-ID), so their traffic grows with the write rate, not with the
+graph size.
+
+Enabled with CHANGES_ENABLED=1.
+"""
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; appends from several processes may then interleave
+    fcntl = None
+
+CHANGES_ENABLED = os.getenv("CHANGES_ENABLED", "0") == "1"
+CHANGES_LOG = os.getenv("CHANGES_LOG", "changes.ndjson")
+# Edges logged per write before falling back to a "reload" entry
+CHANGES_EDGE_LIMIT = int(os.getenv("CHANGES_EDGE_LIMIT", "10000"))
+CHANGES_PAGE = int(os.getenv("CHANGES_PAGE", "1000"))
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "0.25"))
+CHANGES_HEARTBEAT = float(os.getenv("CHANGES_HEARTBEAT", "15"))
+INDEX_EVERY = 256  # entries between two offsets in the sparse index
+
+PREFIX = b'{"seq": '
+
+def _seq_of(line):
+    # Every line starts with PREFIX, so the number is read without parsing the JSON
+    return int(line[len(PREFIX):line.index(b",", len(PREFIX))])
+
+class ChangeLog:
+    def __init__(self, path=CHANGES_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+        open(path, "ab").close()
+        self._reset()
+        self._scan()
+
+    def _reset(self):
+        self._seqs, self._offsets = [], []   # sparse index
+        self._end = 0                        # bytes of complete lines indexed
+        self.first, self.head = None, 0      # oldest and newest seq in the file
+
+    def _scan(self):
+        """Index the lines appended since the last scan, by this or another process."""
+        size = os.path.getsize(self.path)
+        if size < self._end:
+            # Truncated or replaced; start over (clients behind or ahead get 410)
+            self._reset()
+        if size == self._end:
+            return
+        with open(self.path, "rb") as handle:
+            handle.seek(self._end)
+            offset = self._end
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # a line still being written
+                seq = _seq_of(line)
+                if self.first is None:
+                    self.first = seq
+                if not self._seqs or seq - self._seqs[-1] >= INDEX_EVERY:
+                    self._seqs.append(seq)
+                    self._offsets.append(offset)
+                self.head = seq
+                offset += len(line)
+        self._end = offset
+
+    def append(self, elements, complete=True):
+        """Log `elements` as upserts, then a "reload" entry if `complete` is false."""
+        entries = [("upsert", element) for element in elements]
+        if not complete:
+            entries.append(("reload", None))
+        if not entries:
+            return self.head
+        now = int(time.time() * 1000)
+        with self._lock, open(self.path, "ab") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                self._scan()
+                lines = []
+                for seq, (op, element) in enumerate(entries, self.head + 1):
+                    entry = {"seq": seq, "time": now, "op": op}
+                    if element is not None:
+                        entry["element"] = element
+                    lines.append(json.dumps(entry, default=str))
+                handle.write(("\n".join(lines) + "\n").encode())
+                handle.flush()
+                self._scan()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        return self.head
+
+    def bounds(self):
+        """(first, head): the oldest and newest seq available; first is None while empty."""
+        with self._lock:
+            self._scan()
+            return self.first, self.head
+
+    def read(self, since=0, limit=CHANGES_PAGE):
+        """Up to `limit` entries after seq `since`, as raw JSON lines."""
+        with self._lock:
+            self._scan()
+            if since >= self.head or limit <= 0:
+                return []
+            i = bisect.bisect_right(self._seqs, since + 1) - 1
+            offset, end = (self._offsets[i] if i >= 0 else 0), self._end
+        lines = []
+        with open(self.path, "rb") as handle:
+            handle.seek(offset)
+            for line in handle:
+                offset += len(line)
+                if offset > end:
+                    break
+                if _seq_of(line) > since:
+                    lines.append(line.rstrip(b"\n"))
+                    if len(lines) == limit:
+                        break
+        return lines
+
+    def stats(self):
+        first, head = self.bounds()
+        return {"path": self.path, "first": first, "head": head, "bytes": self._end}
+
+def page(lines, since, head):
+    """The /graph/changes body, assembled from the raw lines without re-encoding them."""
+    last = _seq_of(lines[-1]) if lines else since
+    return b'{"changes": [' + b",".join(lines) + b'], "next": %d, "head": %d}' % (last, head)
+
+async def events(log, since, disconnected):
+    """Server-Sent Events for the entries after `since`, until the client disconnects.
+
+    Polls the file every CHANGES_POLL_INTERVAL seconds (an os.stat when
+    nothing changed), which also picks up other workers' appends. Reads
+    run in a thread, off the event loop.
+    """
+    yield b"retry: 2000\n\n"
+    idle = 0.0
+    while not await disconnected():
+        lines = await asyncio.to_thread(log.read, since)
+        for line in lines:
+            since = _seq_of(line)
+            yield b"id: %d\nevent: change\ndata: %s\n\n" % (since, line)
+        if lines:
+            idle = 0.0
+            continue
+        if idle >= CHANGES_HEARTBEAT:
+            yield b": keepalive\n\n"
+            idle = 0.0
+        await asyncio.sleep(CHANGES_POLL_INTERVAL)
+        idle += CHANGES_POLL_INTERVAL
+
+log = ChangeLog() if CHANGES_ENABLED else None
+
+def record(elements, complete=True):
+    """Append written elements to the change log, if enabled."""
+    if log is not None:
+        log.append(elements, complete)
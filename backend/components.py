@@ -0,0 +1,281 @@
+"""Incremental connected-component (fraud ring) index.
+
+Users are connected when they share an attribute value, and transactions
+join their sender's component and connect to every transaction sharing a
+device or IP, i.e. the closure of SHARED_ATTRIBUTE and LINKED plus SENT.
+(Receiving money does not pull a user into the sender's ring.) Attribute
+values are union-find elements of their own, so a shared value costs one
+union per holder instead of one per pair.
+
+The index is a union-find with union by size and path halving, plus a
+member list per root (smaller list appended to the larger), so inserts
+are near O(1) amortised and listing a component is O(component). It is
+updated from the crud write paths; attribute changes never split a
+component until the next rebuild.
+
+A component's id is its smallest member key, so it does not depend on
+which element union-find picked as the root and is the same after a
+rebuild. It changes only when the component takes in a smaller key. The
+crud write paths store `component_id` / `component_size` on the nodes
+they write, and on the members of a component whose id just changed.
+The stored size of the other members is only refreshed by `--persist`.
+
+    python -m backend.components --workers 8 --persist
+
+rebuilds it from a snapshot of the database, reducing shards of the
+union pairs in a process pool, and writes `component_id` / `component_size`
+onto every user and transaction.
+
+Enabled in the API with COMPONENTS_ENABLED=1.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import heapq
+import os
+import threading
+
+from .database import db, INGEST_BATCH_SIZE, SNAPSHOT_READONLY
+from .hubs import USER_HUBS, TRANSACTION_HUBS
+
+# On by default when serving a snapshot read-only
+COMPONENTS_ENABLED = os.getenv("COMPONENTS_ENABLED", "1" if SNAPSHOT_READONLY else "0") == "1"
+
+USER_ATTRIBUTES = [attr for attr, _, _ in USER_HUBS]
+TRANSACTION_ATTRIBUTES = [attr for attr, _, _ in TRANSACTION_HUBS]
+
+# Component id and size of users and transactions, by key
+COMPONENT_IDS_QUERY = """
+UNWIND $rows AS row
+CALL {
+  WITH row MATCH (n:User {user_id: row.key}) RETURN n
+  UNION
+  WITH row MATCH (n:Transaction {txn_id: row.key}) RETURN n
+}
+SET n.component_id = row.id, n.component_size = row.size
+"""
+
+class ComponentIndex:
+    def __init__(self):
+        self.ids = {}        # key -> element
+        self.keys = []       # element -> key
+        self.parent = []
+        self.weight = []     # elements under a root, attribute values included
+        self.members = {}    # root -> user / transaction elements of its component
+        self.least = {}      # root -> smallest member key, the component id
+        self._touched = None # elements whose component id to report, during add_*
+        self._lock = threading.Lock()
+
+    def _add(self, key, value=False):
+        element = self.ids.get(key)
+        if element is None:
+            element = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.parent.append(element)
+            self.weight.append(1)
+            self.members[element] = [] if value else [element]
+            if not value:
+                self.least[element] = key
+        return element
+
+    def _find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def _union(self, a, b):
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return ra
+        if self.weight[ra] < self.weight[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.weight[ra] += self.weight[rb]
+        absorbed = self.members.pop(rb)
+        self._merge_ids(ra, rb, absorbed)
+        if len(absorbed) > len(self.members[ra]):
+            absorbed, self.members[ra] = self.members[ra], absorbed
+        self.members[ra].extend(absorbed)
+        return ra
+
+    def _merge_ids(self, ra, rb, absorbed):
+        """Keep the smaller id of two merged components; the other side's members change id."""
+        kept, lost = self.least.get(ra), self.least.pop(rb, None)
+        if lost is None:
+            return
+        if kept is not None and kept < lost:
+            changed = absorbed
+        else:
+            self.least[ra], changed = lost, self.members[ra]
+        if self._touched is not None and kept is not None:
+            self._touched.update(changed)
+
+    def _link_attributes(self, element, props, attributes):
+        for attr in attributes:
+            if props.get(attr) is not None:
+                self._union(element, self._add(f"{attr}:{props[attr]}", value=True))
+
+    def add_users(self, users):
+        """Add users; returns `{"key", "id", "size"}` rows for them and for members whose id changed."""
+        with self._lock:
+            self._touched = set()
+            for user in users:
+                element = self._add(user["user_id"])
+                self._touched.add(element)
+                self._link_attributes(element, user, USER_ATTRIBUTES)
+            return self._touched_rows()
+
+    def add_transactions(self, transactions):
+        """Add transactions; returns rows as add_users does."""
+        with self._lock:
+            self._touched = set()
+            for txn in transactions:
+                t = self._add(txn["txn_id"])
+                self._touched.add(t)
+                if txn.get("sender_id"):
+                    self._union(t, self._add(txn["sender_id"]))
+                self._link_attributes(t, txn, TRANSACTION_ATTRIBUTES)
+            return self._touched_rows()
+
+    def _touched_rows(self):
+        rows = []
+        for element in self._touched:
+            root = self._find(element)
+            rows.append({"key": self.keys[element], "id": self.least[root], "size": len(self.members[root])})
+        self._touched = None
+        return rows
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def component_of(self, key):
+        """`(component_id, size)` of a user or transaction."""
+        with self._lock:
+            root = self._find(self.ids[key])
+            return self.least[root], len(self.members[root])
+
+    def members_of(self, key, limit=None):
+        with self._lock:
+            root = self._find(self.ids[key])
+            members = self.members[root]
+            return {
+                "component_id": self.least[root],
+                "size": len(members),
+                "members": [self.keys[m] for m in (members[:limit] if limit else members)],
+            }
+
+    def top(self, limit=10, sample=10):
+        """Largest components, each with up to `sample` member ids."""
+        with self._lock:
+            largest = heapq.nlargest(limit, self.members.items(), key=lambda item: len(item[1]))
+            return [{"component_id": self.least[root], "size": len(members),
+                     "sample": [self.keys[m] for m in members[:sample]]}
+                    for root, members in largest if members]
+
+    def stats(self):
+        with self._lock:
+            sizes = [len(m) for m in self.members.values() if m]
+            return {"elements": len(self.keys), "components": len(sizes),
+                    "largest": max(sizes, default=0), "singletons": sizes.count(1)}
+
+    # -- full rebuild ----------------------------------------------------
+
+    def rebuild(self, conn=None, workers=None, shard_size=1_000_000):
+        """Rebuild from a snapshot of the database with a parallel reduction.
+
+        The union pairs are split into shards; each worker reduces its shard
+        to `(element, local root)` pairs, which are far fewer when many
+        nodes share a value, and the results are unioned here.
+        """
+        conn = conn or db
+        fresh = ComponentIndex()
+        pairs = []
+        for r in conn.stream("MATCH (u:User) RETURN u"):
+            pairs += fresh._pairs(r["u"], "user_id", USER_ATTRIBUTES)
+        for r in conn.stream("""
+            MATCH (t:Transaction)
+            OPTIONAL MATCH (s:User)-[:SENT]->(t)
+            RETURN t, s.user_id AS sender_id
+            """):
+            txn = r["t"]
+            pairs += fresh._pairs(txn, "txn_id", TRANSACTION_ATTRIBUTES)
+            if r["sender_id"] is not None:
+                pairs.append((fresh._add(txn["txn_id"]), fresh._add(r["sender_id"])))
+
+        shards = [pairs[i:i + shard_size] for i in range(0, len(pairs), shard_size)]
+        if len(shards) > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                reduced = list(pool.map(_reduce_pairs, shards))
+        else:
+            reduced = [_reduce_pairs(shard) for shard in shards]
+        for shard in reduced:
+            for x, root in shard:
+                fresh._union(x, root)
+
+        with self._lock:
+            self.ids, self.keys, self.parent = fresh.ids, fresh.keys, fresh.parent
+            self.weight, self.members, self.least = fresh.weight, fresh.members, fresh.least
+        return self
+
+    def _pairs(self, props, key, attributes):
+        element = self._add(props[key])
+        return [(element, self._add(f"{attr}:{props[attr]}", value=True))
+                for attr in attributes if props.get(attr) is not None]
+
+    def persist(self, conn=None, batch_size=INGEST_BATCH_SIZE):
+        """Write `component_id` / `component_size` onto every user and transaction."""
+        conn = conn or db
+        rows = []
+        with self._lock:
+            for root, members in self.members.items():
+                rows += [{"key": self.keys[m], "id": self.least[root], "size": len(members)} for m in members]
+        batches = (rows[i:i + batch_size] for i in range(0, len(rows), batch_size))
+        for _ in conn.write_batches(COMPONENT_IDS_QUERY, batches):
+            pass
+
+def _reduce_pairs(pairs):
+    """Union-find over one shard; returns `(element, root)` for every non-root element."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+    return [(x, root) for x in list(parent) if (root := find(x)) != x]
+
+components = ComponentIndex() if COMPONENTS_ENABLED else None
+
+def record_users(users):
+    """Add written users to the component index, if enabled: the rows to store (see add_users)."""
+    if components is None:
+        return []
+    return components.add_users(users)
+
+def record_transactions(transactions):
+    """Add written transactions to the component index, if enabled: the rows to store."""
+    if components is None:
+        return []
+    return components.add_transactions(transactions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the connected-component index")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=1_000_000)
+    parser.add_argument("--persist", action="store_true",
+                        help="write component_id / component_size onto the nodes")
+    args = parser.parse_args()
+    index = ComponentIndex().rebuild(workers=args.workers, shard_size=args.shard_size)
+    print(index.stats())
+    for component in index.top(10):
+        print(f"{component['component_id']:>20} {component['size']:>8}  {', '.join(component['sample'])}")
+    if args.persist:
+        index.persist()
@@ -1,72 +1,264 @@
-from .database import db
+from .database import db, INGEST_BATCH_SIZE, GRAPH_MODEL, LINK_WINDOW_MS
+from . import hubs, cache, projection, components, features, traversal, changes, similarity, plans
+from datetime import datetime, timezone
+import base64
+import json
+import time
 
-def create_user(user_data):
-    query = """
-    MERGE (u:User {user_id: $user_id})
-    SET u.name = $name,
-        u.email = $email,
-        u.phone = $phone,
-        u.address = $address,
-        u.payment_method = $payment_method
-    RETURN u
+HUB_MODEL = GRAPH_MODEL == "hub"
+
+CREATE_USER_QUERY = """
+MERGE (u:User {user_id: $user_id})
+SET u.name = $name,
+    u.email = $email,
+    u.phone = $phone,
+    u.address = $address,
+    u.payment_method = $payment_method
+RETURN u
+"""
+
+CREATE_TRANSACTION_QUERY = """
+MERGE (t:Transaction {txn_id: $txn_id})
+SET t.amount = $amount,
+    t.device_id = $device_id,
+    t.ip_address = $ip_address,
+    t.timestamp = $timestamp
+WITH t
+MATCH (s:User {user_id: $sender_id}), (r:User {user_id: $receiver_id})
+MERGE (s)-[:SENT]->(t)
+MERGE (t)-[:RECEIVED_BY]->(r)
+RETURN t
+"""
+
+# Writes and graph pages are plans (see plans.py): generators holding the
+# query and row logic, driven on `db` here and on `async_db` by async_crud.
+
+def create_user_plan(user_data, detect=True):
+    """Plan writing one user, with its shared attribute links unless `detect` is false.
+
+    Near-duplicate matching runs in process, so its links are written (and
+    logged) either way.
     """
-    db.query(query, user_data)
+    yield plans.query(CREATE_USER_QUERY, user_data)
+    if detect:
+        yield plans.query(DETECT_USERS_QUERY, {"rows": [user_data["user_id"]]})
+    yield from _link_similar_plan([user_data])
+    cache.invalidate_write(user_data)
+    projection.record_users([user_data])
+    yield from _store_components_plan(components.record_users([user_data]))
+    yield from log_changes_plan("User", [user_data], DETECTED_EDGES if detect else ("SIMILAR_ATTRIBUTE",))
+
+def create_user(user_data):
+    plans.run(create_user_plan(user_data), db)
+
+def epoch_ms(value):
+    """Epoch milliseconds of a datetime (naive means UTC), ISO 8601 string or epoch-ms number."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+def with_event_time(txn_data):
+    """The transaction with `timestamp` as epoch ms, stamped with the current time if missing."""
+    timestamp = txn_data.get("timestamp")
+    return {**txn_data, "timestamp": epoch_ms(timestamp) if timestamp is not None else int(time.time() * 1000)}
+
+def time_window(since=None, until=None):
+    """`{"since", "until"}` epoch-ms bounds of an event-time window, or None if unbounded."""
+    if since is None and until is None:
+        return None
+    return {"since": epoch_ms(since) if since is not None else None,
+            "until": epoch_ms(until) if until is not None else None}
 
-    # Detect and create shared attribute relationships
-    detect_user_relationships(user_data["user_id"])
+def _time_filter(var, window):
+    """Cypher condition keeping `var` inside `window` ($since inclusive, $until exclusive)."""
+    conditions = []
+    if window and window["since"] is not None:
+        conditions.append(f"{var}.timestamp >= $since")
+    if window and window["until"] is not None:
+        conditions.append(f"{var}.timestamp < $until")
+    return " AND ".join(conditions)
+
+def create_transaction_plan(txn_data, detect=True):
+    """Plan writing one transaction, linked unless `detect` is false; returns it stamped with event time."""
+    txn_data = with_event_time(txn_data)
+    yield plans.query(CREATE_TRANSACTION_QUERY, txn_data)
+    if detect:
+        yield plans.query(DETECT_TRANSACTIONS_QUERY, {"rows": [txn_data["txn_id"]]})
+    cache.invalidate_write(txn_data)
+    projection.record_transactions([txn_data])
+    yield from _store_components_plan(components.record_transactions([txn_data]))
+    features.record_transactions([txn_data])
+    yield from log_changes_plan("Transaction", [txn_data], STRUCTURAL_EDGES + (DETECTED_EDGES if detect else ()))
+    return txn_data
 
 def create_transaction(txn_data):
-    # Create the transaction node
-    query = """
-    MERGE (t:Transaction {txn_id: $txn_id})
-    SET t.amount = $amount,
-        t.device_id = $device_id,
-        t.ip_address = $ip_address
-    WITH t
-    MATCH (s:User {user_id: $sender_id}), (r:User {user_id: $receiver_id})
-    MERGE (s)-[:SENT]->(t)
-    MERGE (t)-[:RECEIVED_BY]->(r)
-    RETURN t
+    plans.run(create_transaction_plan(txn_data), db)
+
+UPSERT_USERS_QUERY = """
+UNWIND $rows AS row
+MERGE (u:User {user_id: row.user_id})
+SET u.name = row.name,
+    u.email = row.email,
+    u.phone = row.phone,
+    u.address = row.address,
+    u.payment_method = row.payment_method
+"""
+
+UPSERT_TRANSACTIONS_QUERY = """
+UNWIND $rows AS row
+MERGE (t:Transaction {txn_id: row.txn_id})
+SET t.amount = row.amount,
+    t.device_id = row.device_id,
+    t.ip_address = row.ip_address,
+    t.timestamp = row.timestamp
+WITH t, row
+MATCH (s:User {user_id: row.sender_id}), (r:User {user_id: row.receiver_id})
+MERGE (s)-[:SENT]->(t)
+MERGE (t)-[:RECEIVED_BY]->(r)
+"""
+
+# Each attribute is matched with its own indexed lookup (see schema.INDEXES),
+# so detection costs O(matches) instead of a scan over the whole label.
+USER_MATCH_ATTRIBUTES = ("email", "phone", "address", "payment_method")
+TRANSACTION_MATCH_ATTRIBUTES = ("device_id", "ip_address")
+
+def _detection_query(label, key, attributes, rel_type, window_ms=0):
+    # The window (LINK_WINDOW_MS) is a range on b.timestamp, served by the
+    # (attribute, timestamp) composite indexes in schema.INDEXES.
+    # The MERGE is undirected: a pair gets one edge whether both ends are in
+    # the same batch or the node is written again later, as with single inserts
+    window = (f" AND b.timestamp >= a.timestamp - {window_ms} AND b.timestamp <= a.timestamp + {window_ms}"
+              if window_ms else "")
+    lookups = "\n  UNION\n".join(
+        f"  WITH a MATCH (b:{label}) WHERE b.{attr} = a.{attr}{window} RETURN b"
+        for attr in attributes
+    )
+    return f"""
+UNWIND $rows AS key
+MATCH (a:{label} {{{key}: key}})
+CALL {{
+{lookups}
+}}
+WITH a, b WHERE a <> b
+MERGE (a)-[:{rel_type}]-(b)
+"""
+
+if HUB_MODEL:
+    DETECT_USERS_QUERY = hubs.LINK_USERS_QUERY
+    DETECT_TRANSACTIONS_QUERY = hubs.LINK_TRANSACTIONS_QUERY
+else:
+    DETECT_USERS_QUERY = _detection_query("User", "user_id", USER_MATCH_ATTRIBUTES, "SHARED_ATTRIBUTE")
+    DETECT_TRANSACTIONS_QUERY = _detection_query("Transaction", "txn_id", TRANSACTION_MATCH_ATTRIBUTES, "LINKED",
+                                                 LINK_WINDOW_MS)
+
+def _chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def _batch_timing(count, seconds):
+    return {
+        "rows": count,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(count / seconds, 1) if seconds else None,
+    }
+
+def _ingest_report(rows, batch_size, timings):
+    total = sum(t["seconds"] for t in timings)
+    return {
+        "rows": len(rows),
+        "batches": len(timings),
+        "batch_size": batch_size,
+        "seconds": round(total, 4),
+        "rows_per_sec": round(len(rows) / total, 1) if total else None,
+        "batch_timings": timings,
+    }
+
+def _ingest_plan(query, rows, batch_size=None):
+    """Plan writing `rows` through `query` in UNWIND batches; returns the throughput report."""
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    batches = yield plans.write(query, _chunks(rows, batch_size))
+    return _ingest_report(rows, batch_size, [_batch_timing(count, seconds) for count, seconds in batches])
+
+def _ingest(query, rows, batch_size=None):
+    """Write `rows` through `query` in UNWIND batches and report throughput."""
+    return plans.run(_ingest_plan(query, rows, batch_size), db)
+
+def create_users_bulk_plan(users, batch_size=None, detect=True):
+    """Plan upserting many users in batched write transactions.
+
+    Shared attribute detection runs afterwards in batches of its own so that
+    users inside the same payload are linked to each other as well.
     """
-    db.query(query, txn_data)
+    report = yield from _ingest_plan(UPSERT_USERS_QUERY, users, batch_size)
+    cache.invalidate_all()
+    projection.record_users(users)
+    yield from _store_components_plan(components.record_users(users), batch_size)
+    if detect:
+        user_ids = [u["user_id"] for u in users]
+        report["detection"] = yield from _ingest_plan(DETECT_USERS_QUERY, user_ids, batch_size)
+        yield from _link_similar_plan(users, batch_size)
+    yield from log_changes_plan("User", users, DETECTED_EDGES if detect else ())
+    return report
+
+def create_users_bulk(users, batch_size=None, detect=True):
+    """Upsert many users in batches, see create_users_bulk_plan."""
+    return plans.run(create_users_bulk_plan(users, batch_size, detect), db)
+
+def _store_components_plan(rows, batch_size=None):
+    """Write the component ids and sizes the component index reported for a write (components.py)."""
+    if rows:
+        yield plans.write(components.COMPONENT_IDS_QUERY, _chunks(rows, batch_size or INGEST_BATCH_SIZE))
+
+def _link_similar_plan(users, batch_size=None):
+    """Write SIMILAR_ATTRIBUTE edges for the near-duplicates of `users` (similarity.py), if enabled."""
+    rows, updated = similarity.record_users(users)
+    if updated:
+        yield plans.query(similarity.UNLINK_SIMILAR_QUERY, {"rows": updated})
+    if rows:
+        yield plans.write(similarity.SIMILAR_ATTRIBUTE_QUERY, _chunks(rows, batch_size or INGEST_BATCH_SIZE))
+
+def create_transactions_bulk_plan(transactions, batch_size=None, detect=True):
+    """Plan upserting many transactions (and their SENT/RECEIVED_BY edges) in batches."""
+    transactions = [with_event_time(t) for t in transactions]
+    report = yield from _ingest_plan(UPSERT_TRANSACTIONS_QUERY, transactions, batch_size)
+    cache.invalidate_all()
+    projection.record_transactions(transactions)
+    yield from _store_components_plan(components.record_transactions(transactions), batch_size)
+    features.record_transactions(transactions)
+    if detect:
+        txn_ids = [t["txn_id"] for t in transactions]
+        report["detection"] = yield from _ingest_plan(DETECT_TRANSACTIONS_QUERY, txn_ids, batch_size)
+    yield from log_changes_plan("Transaction", transactions, STRUCTURAL_EDGES + (DETECTED_EDGES if detect else ()))
+    return report
 
-    # Detect transaction-to-transaction links
-    detect_transaction_relationships(txn_data["txn_id"])
+def create_transactions_bulk(transactions, batch_size=None, detect=True):
+    """Upsert many transactions in batches, see create_transactions_bulk_plan."""
+    return plans.run(create_transactions_bulk_plan(transactions, batch_size, detect), db)
 
 def get_all_users(limit: int = 200):
     return db.query("MATCH (u:User) RETURN u LIMIT $limit", {"limit": limit})
 
-def get_all_transactions(limit: int = 200):
-    return db.query("MATCH (t:Transaction) RETURN t LIMIT $limit", {"limit": limit})
+def transactions_query(window):
+    """Transactions, newest first within `window` (served by the timestamp index)."""
+    if window is None:
+        return "MATCH (t:Transaction) RETURN t LIMIT $limit"
+    return f"MATCH (t:Transaction) WHERE {_time_filter('t', window)} RETURN t ORDER BY t.timestamp DESC LIMIT $limit"
+
+def get_all_transactions(limit: int = 200, window=None):
+    return db.query(transactions_query(window), {"limit": limit, **(window or {})})
 
 
 def detect_user_relationships(user_id):
-    """Find users with shared attributes and create edges."""
-    query = """
-    MATCH (u1:User {user_id: $user_id}), (u2:User)
-    WHERE u1 <> u2
-      AND (
-        (u1.email IS NOT NULL AND u1.email = u2.email) OR
-        (u1.phone IS NOT NULL AND u1.phone = u2.phone) OR
-        (u1.address IS NOT NULL AND u1.address = u2.address) OR
-        (u1.payment_method IS NOT NULL AND u1.payment_method = u2.payment_method)
-      )
-    MERGE (u1)-[:SHARED_ATTRIBUTE]->(u2)
-    """
-    db.query(query, {"user_id": user_id})
+    """Find users with shared attributes and create edges (or hub links in the hub model)."""
+    db.query(DETECT_USERS_QUERY, {"rows": [user_id]})
 
 def detect_transaction_relationships(txn_id):
-    """Link transactions that share same device or IP."""
-    query = """
-    MATCH (t1:Transaction {txn_id: $txn_id}), (t2:Transaction)
-    WHERE t1 <> t2
-      AND (
-        (t1.device_id IS NOT NULL AND t1.device_id = t2.device_id) OR
-        (t1.ip_address IS NOT NULL AND t1.ip_address = t2.ip_address)
-      )
-    MERGE (t1)-[:LINKED]->(t2)
-    """
-    db.query(query, {"txn_id": txn_id})
+    """Link transactions that share same device or IP (or their hubs in the hub model)."""
+    db.query(DETECT_TRANSACTIONS_QUERY, {"rows": [txn_id]})
 
 def get_users():
     """Get all users for the API"""
@@ -78,139 +270,331 @@ def get_transactions():
     result = db.query("MATCH (t:Transaction) RETURN t")
     return [dict(record["t"]) for record in result]
 
-def get_graph_data():
-    """Get all users, transactions and their relationships for visualization"""
-    query = """
-    MATCH (u:User)
-    OPTIONAL MATCH (u)-[:SENT]->(t:Transaction)
-    OPTIONAL MATCH (t)-[:RECEIVED_BY]->(r:User)
-    OPTIONAL MATCH (u)-[:SHARED_ATTRIBUTE]->(su:User)
-    OPTIONAL MATCH (t)-[:LINKED]->(lt:Transaction)
-    RETURN u, t, r, su, lt
+# (edge type, source label, source key, target label, target key, edge id infix)
+GRAPH_EDGES = [
+    ("SENT", "User", "user_id", "Transaction", "txn_id", "sent"),
+    ("RECEIVED_BY", "Transaction", "txn_id", "User", "user_id", "received"),
+    ("SHARED_ATTRIBUTE", "User", "user_id", "User", "user_id", "shared"),
+    ("LINKED", "Transaction", "txn_id", "Transaction", "txn_id", "linked"),
+] + ([("SIMILAR_ATTRIBUTE", "User", "user_id", "User", "user_id", "similar")] if similarity.SIMILARITY_ENABLED else [])
+
+NODE_KEYS = {"User": "user_id", "Transaction": "txn_id"}
+
+def _edge_query(rel_type, src_label, src_key, dst_label, dst_key, window=None):
+    """Edges of one type touching the `$src` / `$dst` keys, one row per edge.
+
+    In the hub model SHARED_ATTRIBUTE / LINKED are derived through the hubs
+    (LINKED only within LINK_WINDOW_MS); they are symmetric, so matching from
+    the source side is enough. With a
+    `window`, edges whose transaction endpoints fall outside it are skipped.
     """
-    result = db.query(query)
-    
+    conditions = [_time_filter(var, window) for var, label in (("a", src_label), ("b", dst_label))
+                  if label == "Transaction"]
+    in_window = " AND ".join(c for c in conditions if c)
+    if HUB_MODEL and rel_type in ("SHARED_ATTRIBUTE", "LINKED"):
+        pattern = hubs.shared_attribute_pattern if rel_type == "SHARED_ATTRIBUTE" else hubs.linked_pattern
+        if rel_type == "LINKED":
+            in_window = " AND ".join(c for c in (in_window, hubs.link_window("a", "b", LINK_WINDOW_MS)) if c)
+        return f"""
+        UNWIND $src AS k
+        MATCH {pattern(f"a:{src_label} {{{src_key}: k}}", "b")}
+        WHERE a <> b{" AND " + in_window if in_window else ""}
+        RETURN DISTINCT a, b LIMIT $limit
+        """
+    where = f"WHERE {in_window}\n      " if in_window else ""
+    return f"""
+    CALL {{
+      UNWIND $src AS k
+      MATCH (a:{src_label} {{{src_key}: k}})-[:{rel_type}]->(b:{dst_label})
+      {where}RETURN a, b
+      UNION
+      UNWIND $dst AS k
+      MATCH (a:{src_label})-[:{rel_type}]->(b:{dst_label} {{{dst_key}: k}})
+      {where}RETURN a, b
+    }}
+    RETURN a, b LIMIT $limit
+    """
+
+def _node_element(label, props):
+    if label == "User":
+        return {"group": "nodes", "data": {"id": props["user_id"], "label": props.get("name", props["user_id"]),
+                                           "type": "user", **props}}
+    return {"group": "nodes", "data": {"id": props["txn_id"], "label": f"${props.get('amount', 0)}",
+                                       "type": "transaction", **props}}
+
+def _edges_plan(keys, limit, status, visit, window=None):
+    """Stream edges of every type with an endpoint in `keys` ({label: [key, ...]}).
+
+    Runs one query per relationship type instead of one cartesian product
+    and calls `visit(("edges", type, infix, a, b), [(label, props), (label, props)])`
+    as rows arrive, emitting the items it returns. Sets `status["truncated"]`
+    when `limit` cut the edges short.
+    """
+    seen = set()
+    status["truncated"] = False
+    for spec in GRAPH_EDGES:
+        budget = limit - len(seen)
+        if budget <= 0:
+            status["truncated"] = True
+            return
+        query, params = _edge_query_params(spec, keys, budget, window)
+        row = yield plans.stream(query, params)
+        count = 0
+        while row is not None:
+            if count == budget:
+                status["truncated"] = True
+                yield plans.CLOSE
+                break
+            edge = _edge_from_row(spec, row, seen)
+            if edge:
+                for item in visit(*edge):
+                    yield plans.emit(item)
+            count += 1
+            row = yield plans.NEXT
+
+def _edge_query_params(spec, keys, budget, window=None):
+    rel_type, src_label, src_key, dst_label, dst_key, _ = spec
+    query = _edge_query(rel_type, src_label, src_key, dst_label, dst_key, window)
+    # One row over budget tells the caller the edges were truncated
+    return query, {"src": keys.get(src_label, []), "dst": keys.get(dst_label, []), "limit": budget + 1,
+                   **(window or {})}
+
+def _edge_from_row(spec, row, seen):
+    """`(edge row, endpoints)` for an edge row, or None if already in `seen`."""
+    rel_type, src_label, src_key, dst_label, dst_key, infix = spec
+    node_a, node_b = row["a"], row["b"]
+    a, b = node_a[src_key], node_b[dst_key]
+    if HUB_MODEL and src_label == dst_label and a > b:
+        a, b, node_a, node_b = b, a, node_b, node_a
+    edge_id = (infix, a, b)
+    if edge_id in seen:
+        return None
+    seen.add(edge_id)
+    return ("edges", rel_type, infix, a, b), [(src_label, node_a), (dst_label, node_b)]
+
+def _edge_element(rel_type, infix, a, b):
+    return {"group": "edges", "data": {"id": f"{a}-{infix}-{b}", "source": a, "target": b, "type": rel_type}}
+
+def _scan_nodes_plan(state, limit, window=None):
+    """Next `limit` nodes in (label, key) order, users first, via keyset pagination."""
     nodes = []
-    edges = []
-    node_ids = set()
-    
-    for record in result:
-        # Add user nodes
-        if record["u"] and record["u"]["user_id"] not in node_ids:
-            user_data = dict(record["u"])
-            nodes.append({
-                "data": {
-                    "id": user_data["user_id"],
-                    "label": user_data.get("name", user_data["user_id"]),
-                    "type": "user",
-                    **user_data
-                }
-            })
-            node_ids.add(user_data["user_id"])
-        
-        # Add receiver user nodes
-        if record["r"] and record["r"]["user_id"] not in node_ids:
-            user_data = dict(record["r"])
-            nodes.append({
-                "data": {
-                    "id": user_data["user_id"],
-                    "label": user_data.get("name", user_data["user_id"]),
-                    "type": "user",
-                    **user_data
-                }
-            })
-            node_ids.add(user_data["user_id"])
-        
-        # Add shared attribute user nodes
-        if record["su"] and record["su"]["user_id"] not in node_ids:
-            user_data = dict(record["su"])
-            nodes.append({
-                "data": {
-                    "id": user_data["user_id"],
-                    "label": user_data.get("name", user_data["user_id"]),
-                    "type": "user",
-                    **user_data
-                }
-            })
-            node_ids.add(user_data["user_id"])
-        
-        # Add transaction nodes
-        if record["t"] and record["t"]["txn_id"] not in node_ids:
-            txn_data = dict(record["t"])
-            nodes.append({
-                "data": {
-                    "id": txn_data["txn_id"],
-                    "label": f"${txn_data.get('amount', 0)}",
-                    "type": "transaction",
-                    **txn_data
-                }
-            })
-            node_ids.add(txn_data["txn_id"])
-        
-        # Add linked transaction nodes
-        if record["lt"] and record["lt"]["txn_id"] not in node_ids:
-            txn_data = dict(record["lt"])
-            nodes.append({
-                "data": {
-                    "id": txn_data["txn_id"],
-                    "label": f"${txn_data.get('amount', 0)}",
-                    "type": "transaction",
-                    **txn_data
-                }
-            })
-            node_ids.add(txn_data["txn_id"])
-        
-        # Add edges
-        if record["u"] and record["t"]:
-            edges.append({
-                "data": {
-                    "id": f"{record['u']['user_id']}-sent-{record['t']['txn_id']}",
-                    "source": record["u"]["user_id"],
-                    "target": record["t"]["txn_id"],
-                    "type": "SENT"
-                }
-            })
-        
-        if record["t"] and record["r"]:
-            edges.append({
-                "data": {
-                    "id": f"{record['t']['txn_id']}-received-{record['r']['user_id']}",
-                    "source": record["t"]["txn_id"],
-                    "target": record["r"]["user_id"],
-                    "type": "RECEIVED_BY"
-                }
-            })
-        
-        if record["u"] and record["su"]:
-            edges.append({
-                "data": {
-                    "id": f"{record['u']['user_id']}-shared-{record['su']['user_id']}",
-                    "source": record["u"]["user_id"],
-                    "target": record["su"]["user_id"],
-                    "type": "SHARED_ATTRIBUTE"
-                }
-            })
-        
-        if record["t"] and record["lt"]:
-            edges.append({
-                "data": {
-                    "id": f"{record['t']['txn_id']}-linked-{record['lt']['txn_id']}",
-                    "source": record["t"]["txn_id"],
-                    "target": record["lt"]["txn_id"],
-                    "type": "LINKED"
-                }
-            })
-    
-    return {"nodes": nodes, "edges": edges}
+    for current, after in _scan_labels(state):
+        rows = yield plans.query(_scan_query(current, after, window),
+                                 {"after": after, "limit": limit + 1 - len(nodes), **(window or {})})
+        nodes += [(current, row["n"]) for row in rows]
+        if len(nodes) > limit:
+            break
+    return _scan_page(nodes, limit)
+
+def _scan_labels(state):
+    """`(label, after)` pairs still to scan for a keyset cursor `state`."""
+    label, after = state.get("label", "User"), state.get("after")
+    if label == "Transaction":
+        return [("Transaction", after)]
+    return [("User", after), ("Transaction", None)]
+
+def _scan_query(label, after, window=None):
+    key = NODE_KEYS[label]
+    conditions = [f"n.{key} > $after"] if after is not None else []
+    if label == "Transaction" and window:
+        conditions.append(_time_filter("n", window))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"MATCH (n:{label}) {where} RETURN n ORDER BY n.{key} LIMIT $limit"
+
+def _scan_page(nodes, limit):
+    if len(nodes) <= limit:
+        return nodes, None
+    nodes = nodes[:limit]
+    last_label, last = nodes[-1]
+    return nodes, {"label": last_label, "after": last[NODE_KEYS[last_label]]}
+
+def _neighbourhood_nodes_plan(seed, depth, state, limit, window=None):
+    """Next `limit` nodes of the BFS order around `seed`, up to `depth` hops."""
+    offset = state.get("offset", 0)
+    wanted = offset + limit + 1
+    order = []
+    for label in NODE_KEYS:
+        rows = yield plans.query(_seed_query(label), {"seed": seed})
+        if rows:
+            order.append((label, rows[0]["n"]))
+            break
+    seen = {_node_key(label, props) for label, props in order}
+    frontier = list(order)
+    for _ in range(depth):
+        if not frontier or len(order) >= wanted:
+            break
+        endpoints = {}
+        yield from _edges_plan(_keys_by_label(frontier), wanted - len(order), {},
+                               lambda edge, nodes: _collect_endpoints(endpoints, nodes), window)
+        frontier = _new_frontier(endpoints, seen)
+        order += frontier
+    return _offset_page(order, offset, limit)
+
+def _collect_endpoints(endpoints, nodes):
+    for label, props in nodes:
+        endpoints[_node_key(label, props)] = props
+    return ()
+
+def _seed_query(label):
+    return f"MATCH (n:{label} {{{NODE_KEYS[label]}: $seed}}) RETURN n"
+
+def _node_key(label, props):
+    return label, props[NODE_KEYS[label]]
+
+def _keys_by_label(nodes):
+    keys = {}
+    for label, props in nodes:
+        keys.setdefault(label, []).append(props[NODE_KEYS[label]])
+    return keys
+
+def _new_frontier(endpoints, seen):
+    """Endpoints not seen yet, in a stable order, marked as seen."""
+    frontier = []
+    for node_key in sorted(endpoints):
+        if node_key not in seen:
+            seen.add(node_key)
+            frontier.append((node_key[0], endpoints[node_key]))
+    return frontier
+
+def _offset_page(order, offset, limit):
+    page = order[offset:offset + limit]
+    return page, {"offset": offset + limit} if len(order) > offset + limit else None
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode() if state else None
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode())) if cursor else {}
+
+def graph_rows_plan(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Plan emitting one bounded page of the graph as plain tuples.
+
+    Without `seed` pages through all users then all transactions; with
+    `seed` pages through the nodes within `depth` hops of that user or
+    transaction. The page nodes come first as `("nodes", label, props)`,
+    then the edges touching them (at most `edge_limit`) as
+    `("edges", type, infix, source, target)`, each preceded by its other
+    endpoint if that was not sent yet, so a page renders on its own. The
+    last row is `("end", truncated, next)`; `next` is the cursor for the
+    following page, None on the last one. A `window` (see time_window)
+    leaves out transactions outside it, and the edges that touch them.
+    """
+    state = decode_cursor(cursor)
+    if seed is None:
+        page, next_state = yield from _scan_nodes_plan(state, node_limit, window)
+    else:
+        page, next_state = yield from _neighbourhood_nodes_plan(seed, depth, state, node_limit, window)
+
+    sent = set()
+    for label, props in page:
+        sent.add(_node_key(label, props))
+        yield plans.emit(("nodes", label, props))
+
+    status = {}
+    yield from _edges_plan(_keys_by_label(page), edge_limit, status,
+                           lambda edge, endpoints: [*_unsent_endpoints(endpoints, sent), edge], window)
+    yield plans.emit(("end", status["truncated"], encode_cursor(next_state)))
+
+def iter_graph_rows(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Stream one bounded page of the graph as plain tuples (see graph_rows_plan)."""
+    return plans.iterate(graph_rows_plan(seed, depth, node_limit, edge_limit, cursor, window), db)
+
+def _unsent_endpoints(endpoints, sent):
+    for label, props in endpoints:
+        node_key = _node_key(label, props)
+        if node_key not in sent:
+            sent.add(node_key)
+            yield "nodes", label, props
+
+def graph_element(row):
+    """Cytoscape element (or the final `{"truncated", "next"}`) for a graph row."""
+    if row[0] == "nodes":
+        return _node_element(row[1], row[2])
+    if row[0] == "edges":
+        return _edge_element(*row[1:])
+    return {"truncated": row[1], "next": row[2]}
+
+def iter_graph_data(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Stream one bounded page of the graph as Cytoscape elements (see iter_graph_rows).
+
+    The last item is `{"truncated": ..., "next": ...}`.
+    """
+    for row in iter_graph_rows(seed, depth, node_limit, edge_limit, cursor, window):
+        yield graph_element(row)
+
+def get_graph_data(seed=None, depth=1, node_limit=500, edge_limit=2000, cursor=None, window=None):
+    """Get one bounded page of the graph for visualization (see iter_graph_data)."""
+    graph = {"nodes": [], "edges": []}
+    for item in iter_graph_data(seed, depth, node_limit, edge_limit, cursor, window):
+        collect_graph_item(graph, item)
+    return graph
+
+def collect_graph_item(graph, item):
+    if "group" in item:
+        graph[item["group"]].append(item)
+    else:
+        graph.update(item)
+
+USER_FIELDS = ["user_id", "name", "email", "phone", "address", "payment_method"]
+TRANSACTION_NODE_FIELDS = ["txn_id", "amount", "device_id", "ip_address", "timestamp"]
+
+# Edges logged with a write (changes.py): the transaction's own edges, and
+# the links relationship detection creates
+STRUCTURAL_EDGES = ("SENT", "RECEIVED_BY")
+DETECTED_EDGES = ("SHARED_ATTRIBUTE", "LINKED", "SIMILAR_ATTRIBUTE")
+
+def _stored_element(label, record):
+    """Graph element of a written record, with the properties the node stores."""
+    fields = USER_FIELDS if label == "User" else TRANSACTION_NODE_FIELDS
+    return _node_element(label, {f: record[f] for f in fields if record.get(f) is not None})
+
+def _change_edge_queries(label, keys, rel_types, limit):
+    """(spec, query, params) for the `rel_types` edges touching `keys` of `label`."""
+    for spec in GRAPH_EDGES:
+        if spec[0] in rel_types and label in (spec[1], spec[3]):
+            yield (spec,) + _edge_query_params(spec, {label: keys}, limit)
+
+def log_changes_plan(label, records, rel_types, keys=None):
+    """Append written nodes and the `rel_types` edges touching them to the change log."""
+    if changes.log is None:
+        return
+    keys = keys if keys is not None else [r[NODE_KEYS[label]] for r in records]
+    limit = changes.CHANGES_EDGE_LIMIT
+    seen, edges = set(), []
+    for spec, query, params in _change_edge_queries(label, keys, rel_types, limit):
+        for row in (yield plans.query(query, params)):
+            edge = _edge_from_row(spec, row, seen)
+            if edge:
+                edges.append(graph_element(edge[0]))
+    changes.record([_stored_element(label, r) for r in records] + edges[:limit], len(edges) <= limit)
+
+def export_query(label, limit, window=None):
+    where = f" WHERE {_time_filter('n', window)}" if label == "Transaction" and window else ""
+    return f"MATCH (n:{label}){where} RETURN n" + (" LIMIT $limit" if limit else "")
+
+def iter_users(limit=None):
+    """Stream every user (or the first `limit`) straight from the driver cursor."""
+    return (record["n"] for record in db.stream(export_query("User", limit), {"limit": limit}))
+
+def iter_transactions(limit=None, window=None):
+    """Stream every transaction (or the first `limit`) in `window` straight from the driver cursor."""
+    return (record["n"] for record in db.stream(export_query("Transaction", limit, window),
+                                                 {"limit": limit, **(window or {})}))
+
+USER_TRANSACTIONS_QUERY = """
+MATCH (u:User {user_id: $user_id})
+OPTIONAL MATCH (u)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(r:User)
+RETURN u, t, r
+"""
+
+TRANSACTION_DETAILS_QUERY = """
+MATCH (s:User)-[:SENT]->(t:Transaction {txn_id: $txn_id})-[:RECEIVED_BY]->(r:User)
+RETURN s, t, r
+"""
 
 def get_user_transactions(user_id):
     """Get all transactions for a specific user"""
-    query = """
-    MATCH (u:User {user_id: $user_id})
-    OPTIONAL MATCH (u)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(r:User)
-    RETURN u, t, r
-    """
-    result = db.query(query, {"user_id": user_id})
+    result = db.query(USER_TRANSACTIONS_QUERY, {"user_id": user_id})
     return [{
         "user": dict(record["u"]) if record["u"] else None,
         "transaction": dict(record["t"]) if record["t"] else None,
@@ -219,17 +603,21 @@ def get_user_transactions(user_id):
 
 def get_transaction_details(txn_id):
     """Get details of a specific transaction"""
-    query = """
-    MATCH (s:User)-[:SENT]->(t:Transaction {txn_id: $txn_id})-[:RECEIVED_BY]->(r:User)
-    RETURN s, t, r
-    """
-    result = db.query(query, {"txn_id": txn_id})
+    result = db.query(TRANSACTION_DETAILS_QUERY, {"txn_id": txn_id})
     return [{
         "sender": dict(record["s"]) if record["s"] else None,
         "transaction": dict(record["t"]) if record["t"] else None,
         "receiver": dict(record["r"]) if record["r"] else None
     } for record in result]
 
+def shortest_path(u1, u2, **limits):
+    """Bounded shortest path between two nodes, see traversal (hubs show up by value)."""
+    return traversal.run(traversal.shortest_path_search(u1, u2, **limits), db)
+
+def neighbourhood(key, depth=1, **limits):
+    """Bounded neighbourhood of a user or transaction, see traversal."""
+    return traversal.run(traversal.neighbourhood_search(key, depth, **limits), db)
+
 def load_sample_data():
     """Load sample data into the database"""
     # Clear existing data
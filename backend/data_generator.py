@@ -1,60 +1,312 @@
+"""Synthetic users and transactions for scale testing.
+
+Records are built in chunks by a process pool. Pools of Faker values are
+generated once up front and the workers fill their chunks by vectorized
+NumPy sampling from them, so Faker is not called per record. Every chunk has its
+own RNG derived from the seed and the chunk index, so the output does not
+depend on the number of workers.
+
+Skew knobs:
+- `sender_alpha` / `receiver_alpha`: power-law exponent of the sender and
+  receiver degree distribution (0 is uniform)
+- `devices` / `ips`: number of distinct device ids and IP addresses
+- `collision_rate`: probability that a user attribute comes from a small
+  shared pool instead of being unique, i.e. the SHARED_ATTRIBUTE density
+- `variant_rate`: probability that a user is a near-duplicate of another
+  user in the same chunk: the same email, phone and address, reformatted
+  and sometimes with a typo (what `similarity.py` should link)
+- `days` / `end`: event times are uniform over the `days` before `end`
+  (epoch ms, default midnight UTC today, so pass it to reproduce a run)
+
+    python -m backend.data_generator --users 100000 --transactions 10000000 --output csv --out-dir data/
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import csv
+import os
+
+import numpy as np
 from faker import Faker
-import random
-import uuid
-from tqdm import tqdm
-from .database import db
-
-fake = Faker()
-
-def seed_data(num_users=50, num_txns=100000):
-    print(f"Generating {num_users} users...")
-    users = []
-
-    for _ in range(num_users):
-        user = {
-            "user_id": str(uuid.uuid4())[:8],
-            "name": fake.name(),
-            "email": fake.email(),
-            "phone": fake.phone_number(),
-            "address": fake.address(),
-            "payment_method": random.choice(["visa", "paypal", "bank", "mastercard"])
-        }
-        users.append(user)
-
-        db.query("""
-        MERGE (u:User {user_id: $user_id})
-        SET u.name = $name, u.email = $email, u.phone = $phone,
-            u.address = $address, u.payment_method = $payment_method
-        """, user)
-
-    print("Users created successfully.")
-    print(f"Generating {num_txns} transactions...")
-    for _ in tqdm(range(num_txns)):
-        sender, receiver = random.sample(users, 2)
-        txn = {
-            "txn_id": str(uuid.uuid4())[:8],
-            "sender_id": sender["user_id"],
-            "receiver_id": receiver["user_id"],
-            "amount": round(random.uniform(5, 5000), 2),
-            "device_id": random.choice(["d1", "d2", "d3", "d4", "d5"]),
-            "ip_address": random.choice([
-                "192.168.0.10", "192.168.0.20",
-                "10.0.0.1", "10.0.0.2", "172.16.0.5"
-            ])
-        }
-
-        db.query("""
-        MERGE (t:Transaction {txn_id: $txn_id})
-        SET t.amount = $amount, t.device_id = $device_id, t.ip_address = $ip_address
-        WITH t
-        MATCH (s:User {user_id: $sender_id}), (r:User {user_id: $receiver_id})
-        MERGE (s)-[:SENT]->(t)
-        MERGE (t)-[:RECEIVED_BY]->(r)
-        """, txn)
-
-    print("Transactions created successfully.")
+
+PAYMENT_METHODS = np.array(["visa", "paypal", "bank", "mastercard"])
+FAKER_POOL_SIZE = 2_000
+CHUNK_SIZE = 50_000
+
+# Per-process state set by _init_worker
+_pools = {}
+_sender_cdf = None
+_receiver_cdf = None
+
+def faker_pools(seed, size=FAKER_POOL_SIZE):
+    """Pools of Faker values, built once in the parent and shipped to the workers."""
+    fake = Faker()
+    Faker.seed(seed)
+    return {
+        "name": np.array([fake.name() for _ in range(size)]),
+        "email_user": np.array([fake.user_name() for _ in range(size)]),
+        "email_domain": np.array([fake.free_email_domain() for _ in range(100)]),
+        "street": np.array([fake.street_address() for _ in range(size)]),
+        "city": np.array([f"{fake.city()}, {fake.state_abbr()} {fake.zipcode()}" for _ in range(size)]),
+    }
+
+def _init_worker(pools, seed, num_users, sender_alpha, receiver_alpha):
+    global _sender_cdf, _receiver_cdf
+    _pools.update(pools)
+    _sender_cdf = _power_law_cdf(num_users, sender_alpha, seed + 1)
+    _receiver_cdf = _power_law_cdf(num_users, receiver_alpha, seed + 2)
+
+def _power_law_cdf(n, alpha, seed):
+    """CDF over user indices where the rank-r user has weight 1 / r^alpha.
+
+    Ranks are shuffled so the heaviest users are spread over the id range.
+    """
+    ranks = np.random.default_rng(seed).permutation(n) + 1
+    weights = ranks.astype(np.float64) ** -alpha
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+def _sample(rng, cdf, size):
+    return np.minimum(np.searchsorted(cdf, rng.random(size)), len(cdf) - 1)
+
+def _chunk_rng(seed, kind, index):
+    return np.random.default_rng([seed, kind, index])
+
+# Street suffixes and unit words, both ways round, for address variants
+ADDRESS_SPELLINGS = {"Street": "St.", "Avenue": "Ave", "Road": "Rd", "Drive": "Dr.", "Lane": "Ln",
+                     "Court": "Ct", "Boulevard": "Blvd", "Suite": "Ste", "Apt.": "#"}
+ADDRESS_SPELLINGS.update({short: long for long, short in list(ADDRESS_SPELLINGS.items())})
+
+def _typo(text, rng):
+    # Swap two adjacent characters, drop one, or double one
+    if len(text) < 3:
+        return text
+    i = int(rng.integers(1, max(2, len(text) - 1)))
+    kind = rng.integers(3)
+    if kind == 0:
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    return text[:i] + text[i + 1:] if kind == 1 else text[:i] + text[i] + text[i:]
+
+def email_variant(email, rng, typo_rate=0.3):
+    """`email` with other casing, a +tag, or a typo in the local part."""
+    local, _, domain = email.partition("@")
+    kind = rng.integers(3)
+    if kind == 0:
+        local = local.capitalize() if rng.random() < 0.5 else local.upper()
+    elif kind == 1:
+        local += "+" + ("shop", "news", "pay")[rng.integers(3)]
+    if rng.random() < typo_rate or kind == 2:
+        local = _typo(local, rng)
+    return f"{local}@{domain.upper() if rng.random() < 0.2 else domain}"
+
+def phone_variant(phone, rng):
+    """A +1 E.164 `phone` written another way, sometimes with an extension."""
+    digits = phone[-10:]
+    area, exchange, line = digits[:3], digits[3:6], digits[6:]
+    formats = (f"({area}) {exchange}-{line}", f"{area}.{exchange}.{line}", f"1-{area}-{exchange}-{line}",
+               f"+1 {area} {exchange} {line}", f"{area}{exchange}{line}", f"001{digits}")
+    variant = formats[rng.integers(len(formats))]
+    return variant + f" ext. {rng.integers(10, 999)}" if rng.random() < 0.1 else variant
+
+def address_variant(address, rng, typo_rate=0.3):
+    """`address` with suffixes spelled out or abbreviated, other casing or punctuation, maybe a typo."""
+    words = [ADDRESS_SPELLINGS.get(w, w) if rng.random() < 0.7 else w for w in address.split(" ")]
+    variant = " ".join(words)
+    kind = rng.integers(3)
+    if kind == 0:
+        variant = variant.upper()
+    elif kind == 1:
+        variant = variant.replace(",", "")
+    if rng.random() < typo_rate:
+        variant = _typo(variant, rng)
+    return variant
+
+def _add_variants(columns, count, rng, variant_rate):
+    """Turn a `variant_rate` share of the rows into near-duplicates of earlier rows."""
+    rows = np.flatnonzero(rng.random(count) < variant_rate)
+    rows = rows[rows > 0]
+    sources = (rng.random(len(rows)) * rows).astype(np.int64)
+    for name, variant in (("email", email_variant), ("phone", phone_variant), ("address", address_variant)):
+        column = columns[name]
+        for row, source in zip(rows.tolist(), sources.tolist()):
+            column[row] = variant(str(column[source]), rng)
+
+def _user_chunk(args):
+    seed, index, start, count, num_users, collision_rate, variant_rate = args
+    rng = _chunk_rng(seed, 0, index)
+    ids = np.arange(start, start + count)
+    pick = lambda pool: _pools[pool][rng.integers(len(_pools[pool]), size=count)]
+    shared_pool = max(1, int(num_users * collision_rate / 10))
+
+    def maybe_shared(unique, prefix):
+        # A colliding value is drawn from a small pool that many users share
+        shared = rng.random(count) < collision_rate
+        values = unique.astype(object)
+        values[shared] = np.char.add(prefix, rng.integers(shared_pool, size=shared.sum()).astype(str))
+        return values
+
+    emails = np.char.add(np.char.add(np.char.add(pick("email_user"), ids.astype(str)), "@"), pick("email_domain"))
+    phones = np.char.add("+1", np.char.zfill((5550000000 + ids).astype(str), 10))
+    addresses = np.char.add(np.char.add(pick("street"), ", "), pick("city"))
+    columns = {
+        "user_id": np.char.add("u", ids.astype(str)),
+        "name": pick("name"),
+        "email": maybe_shared(emails, "shared"),
+        "phone": maybe_shared(phones, "+1999"),
+        "address": maybe_shared(addresses, "1 Shared Way #"),
+        "payment_method": PAYMENT_METHODS[rng.integers(len(PAYMENT_METHODS), size=count)],
+    }
+    if variant_rate:
+        # Own RNG stream, so the other columns do not depend on the rate
+        _add_variants(columns, count, _chunk_rng(seed, 2, index), variant_rate)
+    return _rows(columns, count)
+
+def _txn_chunk(args):
+    seed, index, start, count, num_users, devices, ips, end, span = args
+    rng = _chunk_rng(seed, 1, index)
+    senders = _sample(rng, _sender_cdf, count)
+    receivers = _sample(rng, _receiver_cdf, count)
+    same = senders == receivers
+    receivers[same] = (receivers[same] + 1) % num_users
+    ip = rng.integers(ips, size=count)
+    columns = {
+        "txn_id": np.char.add("t", np.arange(start, start + count).astype(str)),
+        "sender_id": np.char.add("u", senders.astype(str)),
+        "receiver_id": np.char.add("u", receivers.astype(str)),
+        "amount": np.round(np.clip(rng.lognormal(4.5, 1.2, count), 1, 50_000), 2),
+        "device_id": np.char.add("d", rng.integers(devices, size=count).astype(str)),
+        "ip_address": [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in ip.tolist()],
+        "timestamp": end - rng.integers(1, span + 1, size=count),
+    }
+    return _rows(columns, count)
+
+def _rows(columns, count):
+    lists = {name: (col.tolist() if isinstance(col, np.ndarray) else col) for name, col in columns.items()}
+    return [{name: values[i] for name, values in lists.items()} for i in range(count)]
+
+def _chunks(total, chunk_size):
+    for index, start in enumerate(range(0, total, chunk_size)):
+        yield index, start, min(chunk_size, total - start)
+
+def _midnight_ms():
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(today.timestamp() * 1000)
+
+def generate(num_users, num_txns, seed=42, workers=None, chunk_size=CHUNK_SIZE,
+             sender_alpha=1.0, receiver_alpha=1.0, devices=None, ips=None, collision_rate=0.01,
+             days=30, end=None, variant_rate=0.0):
+    """Yield ("users", rows) chunks, then ("transactions", rows) chunks, in order."""
+    devices = devices or max(1, num_txns // 20)
+    ips = ips or max(1, num_txns // 20)
+    end = end or _midnight_ms()
+    span = max(1, int(days * 86_400_000))
+    initargs = (faker_pools(seed), seed, num_users, sender_alpha, receiver_alpha)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+        user_jobs = [(seed, i, start, count, num_users, collision_rate, variant_rate)
+                     for i, start, count in _chunks(num_users, chunk_size)]
+        for rows in pool.map(_user_chunk, user_jobs):
+            yield "users", rows
+        txn_jobs = [(seed, i, start, count, num_users, devices, ips, end, span)
+                    for i, start, count in _chunks(num_txns, chunk_size)]
+        for rows in pool.map(_txn_chunk, txn_jobs):
+            yield "transactions", rows
+
+def _print_report(kind, report):
+    print(f"{report['rows']} {kind} written in {report['batches']} batches "
+          f"({report['seconds']}s, {report['rows_per_sec']} rows/sec).")
+
+def write_db(chunks, batch_size=None, detect=False):
+    from . import crud
+
+    for kind, rows in chunks:
+        if kind == "users":
+            report = crud.create_users_bulk(rows, batch_size, detect=detect)
+        else:
+            report = crud.create_transactions_bulk(rows, batch_size, detect=detect)
+        _print_report(kind, report)
+
+# neo4j-admin database import headers, one file per node label / relationship type
+IMPORT_FILES = {
+    "users": ("users", ["user_id:ID(User)", "name", "email", "phone", "address", "payment_method", ":LABEL"],
+              lambda r: [r["user_id"], r["name"], r["email"], r["phone"], r["address"], r["payment_method"], "User"]),
+    "transactions": ("transactions", ["txn_id:ID(Transaction)", "amount:float", "device_id", "ip_address",
+                                      "timestamp:long", ":LABEL"],
+                     lambda r: [r["txn_id"], r["amount"], r["device_id"], r["ip_address"], r["timestamp"],
+                                "Transaction"]),
+    "sent": ("transactions", [":START_ID(User)", ":END_ID(Transaction)", ":TYPE"],
+             lambda r: [r["sender_id"], r["txn_id"], "SENT"]),
+    "received_by": ("transactions", [":START_ID(Transaction)", ":END_ID(User)", ":TYPE"],
+                    lambda r: [r["txn_id"], r["receiver_id"], "RECEIVED_BY"]),
+}
+
+def write_files(chunks, out_dir, fmt="csv"):
+    """Write neo4j-admin import files (CSV, or Parquet with pyarrow) into `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+    writers, handles = {}, []
+    for kind, rows in chunks:
+        for name, (source, header, row_of) in IMPORT_FILES.items():
+            if source != kind:
+                continue
+            path = os.path.join(out_dir, f"{name}.{fmt}")
+            values = [row_of(r) for r in rows]
+            if fmt == "csv":
+                if name not in writers:
+                    handle = open(path, "w", newline="")
+                    handles.append(handle)
+                    writers[name] = csv.writer(handle)
+                    writers[name].writerow(header)
+                writers[name].writerows(values)
+            else:
+                table = pa.table({col: [v[i] for v in values] for i, col in enumerate(header)})
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(path, table.schema, compression="zstd")
+                    handles.append(writers[name])
+                writers[name].write_table(table)
+        print(f"{len(rows)} {kind} written to {out_dir}")
+    for handle in handles:
+        handle.close()
+    nodes = " ".join(f"--nodes={os.path.join(out_dir, f'{n}.{fmt}')}" for n in ("users", "transactions"))
+    rels = " ".join(f"--relationships={os.path.join(out_dir, f'{n}.{fmt}')}" for n in ("sent", "received_by"))
+    print(f"Import offline with: neo4j-admin database import full {nodes} {rels} neo4j")
+
+def seed_data(num_users=50, num_txns=100000, batch_size=None, **options):
+    """Generate data and write it to the database through the bulk ingest path."""
+    write_db(generate(num_users, num_txns, **options), batch_size)
     print("✅ Database seeding complete!")
 
 
 if __name__ == "__main__":
-    seed_data(num_users=10, num_txns=100)
+    parser = argparse.ArgumentParser(description="Generate synthetic users and transactions")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sender-alpha", type=float, default=1.0)
+    parser.add_argument("--receiver-alpha", type=float, default=1.0)
+    parser.add_argument("--devices", type=int, default=None, help="distinct device ids (default transactions / 20)")
+    parser.add_argument("--ips", type=int, default=None, help="distinct IP addresses (default transactions / 20)")
+    parser.add_argument("--collision-rate", type=float, default=0.01)
+    parser.add_argument("--variant-rate", type=float, default=0.0,
+                        help="share of users that are reformatted near-duplicates of another user")
+    parser.add_argument("--days", type=float, default=30, help="spread of transaction event times")
+    parser.add_argument("--end", type=int, default=None, help="latest event time, epoch ms (default today)")
+    parser.add_argument("--output", choices=["db", "csv", "parquet"], default="db")
+    parser.add_argument("--out-dir", default="import")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--detect", action="store_true", help="run relationship detection on db writes")
+    args = parser.parse_args()
+
+    chunks = generate(args.users, args.transactions, args.seed, args.workers, args.chunk_size,
+                      args.sender_alpha, args.receiver_alpha, args.devices, args.ips, args.collision_rate,
+                      args.days, args.end, args.variant_rate)
+    if args.output == "db":
+        write_db(chunks, args.batch_size, args.detect)
+    else:
+        write_files(chunks, args.out_dir, args.output)
@@ -1,21 +1,196 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase, Query
+from neo4j.exceptions import ServiceUnavailable
+import asyncio
 import os
+import threading
+import time
+
+from .metrics import QueryTimer
 
 class Neo4jConnection:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    """Sync connection; the driver is created on first use and dropped by `close`.
+
+    Nothing connects at import time, so a process that forks (gunicorn
+    workers) never shares a driver with its parent.
+    """
+    def __init__(self, uri, user, password, **pool_config):
+        self.uri, self.auth, self.pool_config = uri, (user, password), pool_config
+        self._driver = None
+        self._lock = threading.Lock()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    self._driver = GraphDatabase.driver(self.uri, auth=self.auth, **self.pool_config)
+        return self._driver
 
     def close(self):
-        self.driver.close()
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+    def wait_until_available(self, timeout=60.0):
+        """Retry connectivity until the server answers, e.g. while Neo4j is still starting."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.driver.verify_connectivity()
+            except (ServiceUnavailable, OSError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(1)
+
+    def query(self, query, parameters=None, timeout=None):
+        """All rows of `query`; `timeout` (seconds) makes the server abort it after that long."""
+        timer = QueryTimer(query)
+        with self.driver.session() as session:
+            result = session.run(Query(timer.statement, timeout=timeout), parameters or {})
+            rows = [r.data() for r in result]
+            timer.finish(len(rows), result.consume())
+            return rows
+
+    def stream(self, query, parameters=None):
+        """Yield records one at a time as the driver fetches them.
 
-    def query(self, query, parameters=None):
+        Unlike `query` nothing is materialised: the session stays open until
+        the generator is exhausted or closed, and memory stays bounded by the
+        driver's fetch size whatever the result size.
+        """
+        timer = QueryTimer(query)
+        rows = 0
         with self.driver.session() as session:
-            result = session.run(query, parameters or {})
-            return [r.data() for r in result]
+            result = session.run(timer.statement, parameters or {})
+            for record in result:
+                rows += 1
+                yield record.data()
+            timer.finish(rows, result.consume())
+
+    def write_batches(self, query, batches):
+        """Run `query` once per batch with the batch bound to `$rows`.
+
+        Every batch is committed in its own explicit write transaction on a
+        single session, so a failing batch does not roll back the ones before
+        it. Yields `(rows, seconds)` for each committed batch.
+        """
+        with self.driver.session() as session:
+            for batch in batches:
+                timer = QueryTimer(query)
+                summary = session.execute_write(_run_and_consume, timer.statement, {"rows": batch})
+                timer.finish(len(batch), summary)
+                yield len(batch), time.perf_counter() - timer.start
+
+
+class AsyncNeo4jConnection:
+    """asyncio counterpart of Neo4jConnection for the async route handlers.
+
+    Sessions borrow connections from the driver's pool, so concurrency is
+    bounded by `max_connection_pool_size` instead of the threadpool size.
+    """
+    def __init__(self, uri, user, password, **pool_config):
+        self.uri, self.auth, self.pool_config = uri, (user, password), pool_config
+        self._driver = None
+
+    @property
+    def driver(self):
+        # Created inside the worker's event loop, on first use
+        if self._driver is None:
+            self._driver = AsyncGraphDatabase.driver(self.uri, auth=self.auth, **self.pool_config)
+        return self._driver
+
+    async def close(self):
+        if self._driver is not None:
+            await self._driver.close()
+            self._driver = None
+
+    async def warm_up(self, connections=1, timeout=60.0):
+        """Wait for the server, then open `connections` pooled connections up front.
+
+        Each concurrent session holds a connection of its own, so after the
+        pings return the pool keeps that many idle connections and the first
+        requests skip the TCP, TLS and Bolt handshakes.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                await self.driver.verify_connectivity()
+                break
+            except (ServiceUnavailable, OSError):
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(1)
+
+        async def ping():
+            async with self.driver.session() as session:
+                await (await session.run("RETURN 1")).consume()
+
+        await asyncio.gather(*(ping() for _ in range(connections)))
+
+    async def query(self, query, parameters=None, timeout=None):
+        timer = QueryTimer(query)
+        async with self.driver.session() as session:
+            result = await session.run(Query(timer.statement, timeout=timeout), parameters or {})
+            rows = [r.data() async for r in result]
+            timer.finish(len(rows), await result.consume())
+            return rows
+
+    async def stream(self, query, parameters=None):
+        """Async version of Neo4jConnection.stream."""
+        timer = QueryTimer(query)
+        rows = 0
+        async with self.driver.session() as session:
+            result = await session.run(timer.statement, parameters or {})
+            async for record in result:
+                rows += 1
+                yield record.data()
+            timer.finish(rows, await result.consume())
+
+    async def write_batches(self, query, batches):
+        """Async version of Neo4jConnection.write_batches."""
+        async with self.driver.session() as session:
+            for batch in batches:
+                timer = QueryTimer(query)
+                summary = await session.execute_write(_async_run_and_consume, timer.statement, {"rows": batch})
+                timer.finish(len(batch), summary)
+                yield len(batch), time.perf_counter() - timer.start
+
+
+def _run_and_consume(tx, query, parameters):
+    return tx.run(query, parameters).consume()
+
+async def _async_run_and_consume(tx, query, parameters):
+    result = await tx.run(query, parameters)
+    return await result.consume()
 
 # Load from environment or defaults
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+# Only link transactions whose event times are this close (0 = no limit)
+LINK_WINDOW_MS = int(float(os.getenv("LINK_WINDOW_HOURS", "0")) * 3600 * 1000)
+# "pairwise" materialises SHARED_ATTRIBUTE/LINKED edges; "hub" links nodes to
+# shared attribute nodes instead (see hubs.py)
+GRAPH_MODEL = os.getenv("GRAPH_MODEL", "pairwise")
+# Snapshot directory to serve read-only from memory, without Neo4j (see snapshot.py)
+SNAPSHOT_READONLY = os.getenv("SNAPSHOT_READONLY", "")
+
+# API worker processes (gunicorn / uvicorn --workers); each has its own pools
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Connections the server should see from the whole box, split across workers
+NEO4J_TOTAL_POOL_SIZE = int(os.getenv("NEO4J_TOTAL_POOL_SIZE", "100"))
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", str(max(4, NEO4J_TOTAL_POOL_SIZE // WEB_CONCURRENCY))))
+# Connections opened per worker at startup, and how long to wait for Neo4j
+NEO4J_POOL_PREFILL = int(os.getenv("NEO4J_POOL_PREFILL", str(min(10, NEO4J_POOL_SIZE))))
+NEO4J_STARTUP_TIMEOUT = float(os.getenv("NEO4J_STARTUP_TIMEOUT", "60"))
+
+# Connection pool tuning, shared by the sync and async drivers
+POOL_CONFIG = {
+    "max_connection_pool_size": NEO4J_POOL_SIZE,
+    "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60")),
+    "max_connection_lifetime": float(os.getenv("NEO4J_CONNECTION_LIFETIME", "3600")),
+}
 
-db = Neo4jConnection(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+db = Neo4jConnection(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, **POOL_CONFIG)
+async_db = AsyncNeo4jConnection(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, **POOL_CONFIG)
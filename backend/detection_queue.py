@@ -0,0 +1,175 @@
+"""Background relationship detection for the async ingest path.
+
+`create_user` / `create_transaction` only upsert the node and enqueue its
+id here. Worker tasks coalesce pending ids (an id queued twice is detected
+once) and run them through the batched detection query once
+DETECTION_BATCH_SIZE ids are waiting or the oldest has waited
+DETECTION_MAX_DELAY seconds, so links converge within about that delay.
+The queue is bounded: when DETECTION_QUEUE_SIZE ids are pending, `put`
+waits for room (backpressure) and raises QueueFull after
+DETECTION_PUT_TIMEOUT seconds.
+
+After each batch `on_detected(kind, ids)`, if given, is awaited; failures
+there are logged and do not requeue the batch.
+
+DETECTION_MODE=sync restores detection inside the request.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from .database import async_db
+from . import cache
+
+DETECTION_MODE = os.getenv("DETECTION_MODE", "async")
+DETECTION_QUEUE_SIZE = int(os.getenv("DETECTION_QUEUE_SIZE", "100000"))
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "500"))
+DETECTION_MAX_DELAY = float(os.getenv("DETECTION_MAX_DELAY", "1.0"))
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "2"))
+DETECTION_PUT_TIMEOUT = float(os.getenv("DETECTION_PUT_TIMEOUT", "5"))
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+class DetectionQueue:
+    def __init__(self, queries, maxsize=DETECTION_QUEUE_SIZE, batch_size=DETECTION_BATCH_SIZE,
+                 max_delay=DETECTION_MAX_DELAY, workers=DETECTION_WORKERS, on_detected=None):
+        self.queries = queries  # kind -> detection query taking $rows of ids
+        self.on_detected = on_detected
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.workers = workers
+        # kind -> {id: (enqueued_at, record)}; dicts keep insertion order, oldest first
+        self.pending = {kind: {} for kind in queries}
+        self._changed = asyncio.Condition()
+        self._tasks = []
+        self._stopping = False
+        self.counters = {"enqueued": 0, "coalesced": 0, "processed": 0, "batches": 0,
+                         "failures": 0, "rejected": 0}
+        self.last_batch = None
+
+    def depth(self):
+        return sum(len(p) for p in self.pending.values())
+
+    def _oldest(self):
+        """(enqueued_at, kind) of the oldest pending id, or None."""
+        heads = [(next(iter(p.values()))[0], kind) for kind, p in self.pending.items() if p]
+        return min(heads) if heads else None
+
+    async def put(self, kind, key, record):
+        async with self._changed:
+            pending = self.pending[kind]
+            if key in pending:
+                # Keep the original enqueue time so lag is measured from the first write
+                pending[key] = (pending[key][0], record)
+                self.counters["coalesced"] += 1
+                return
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.depth() < self.maxsize),
+                    DETECTION_PUT_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"detection queue full ({self.maxsize} pending)")
+            if key in pending:
+                pending[key] = (pending[key][0], record)
+                self.counters["coalesced"] += 1
+                return
+            pending[key] = (time.monotonic(), record)
+            self.counters["enqueued"] += 1
+            self._changed.notify_all()
+
+    async def _take(self):
+        """Wait for a full batch or an old enough id, then pop one batch of one kind."""
+        async with self._changed:
+            while True:
+                oldest = self._oldest()
+                if oldest is not None:
+                    enqueued_at, kind = oldest
+                    wait = enqueued_at + self.max_delay - time.monotonic()
+                    if self._stopping or wait <= 0 or len(self.pending[kind]) >= self.batch_size:
+                        break
+                elif self._stopping:
+                    return None, []
+                else:
+                    wait = None
+                try:
+                    await asyncio.wait_for(self._changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            pending = self.pending[kind]
+            keys = list(pending)[:self.batch_size]
+            batch = [(key,) + pending.pop(key) for key in keys]
+            self._changed.notify_all()
+            return kind, batch
+
+    async def _run(self):
+        while True:
+            kind, batch = await self._take()
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                async for _ in async_db.write_batches(self.queries[kind], [[key for key, _, _ in batch]]):
+                    pass
+            except Exception:
+                self.counters["failures"] += 1
+                if self._stopping:
+                    logger.exception("detection batch of %d %s failed during shutdown; dropped", len(batch), kind)
+                    continue
+                logger.exception("detection batch of %d %s failed; requeueing", len(batch), kind)
+                await self._requeue(kind, batch)
+                await asyncio.sleep(min(self.max_delay, 1.0))
+                continue
+            cache.invalidate_write(*(record for _, _, record in batch))
+            if self.on_detected is not None:
+                try:
+                    await self.on_detected(kind, [key for key, _, _ in batch])
+                except Exception:
+                    logger.exception("on_detected hook failed for a batch of %d %s", len(batch), kind)
+            self.counters["processed"] += len(batch)
+            self.counters["batches"] += 1
+            self.last_batch = {
+                "kind": kind,
+                "size": len(batch),
+                "seconds": round(time.perf_counter() - start, 4),
+                "lag_seconds": round(time.monotonic() - batch[0][1], 4),
+            }
+
+    async def _requeue(self, kind, batch):
+        async with self._changed:
+            pending = self.pending[kind]
+            for key, enqueued_at, record in batch:
+                pending.setdefault(key, (enqueued_at, record))
+            self._changed.notify_all()
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Flush everything still pending, then stop the workers."""
+        async with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        oldest = self._oldest()
+        return {
+            "mode": DETECTION_MODE,
+            "depth": {kind: len(p) for kind, p in self.pending.items()},
+            "capacity": self.maxsize,
+            "lag_seconds": round(time.monotonic() - oldest[0], 4) if oldest else 0.0,
+            "max_delay": self.max_delay,
+            "batch_size": self.batch_size,
+            "workers": len(self._tasks),
+            **self.counters,
+            "last_batch": self.last_batch,
+        }
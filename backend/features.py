@@ -0,0 +1,316 @@
+"""Rolling per-user, per-device and per-IP velocity features, kept on ingest.
+
+For every user, `record_transactions` keeps the transactions they sent
+and received over 1h / 24h / 7d windows. For each window it tracks the
+count, the amount sum and the distinct counterparties. It also keeps the
+distinct senders seen per device and per IP over the same windows
+(fan-out). Each window is a set of time buckets
+(WINDOWS: 5 min / 1h / 6h) with running totals. Reads expire the buckets
+that slid out and return the totals, so a read is O(1) amortised. A
+window therefore covers up to one bucket more than its nominal width.
+Windows end at the current wall-clock time, and transactions are placed
+by event time, so late events still land in the right bucket.
+
+Transactions are counted once per `txn_id`: the ids inside the 7d
+horizon are kept, so a bulk retry, replay or snapshot restore that writes
+a transaction again does not count it twice.
+
+The store lives in memory. It is snapshotted to FEATURES_SNAPSHOT every
+FEATURES_SNAPSHOT_INTERVAL seconds and at shutdown, and is reloaded from
+there at startup, or rebuilt from the database when there is no
+snapshot. Saving pickles shallow copies of the tables outside the lock,
+and windows written to meanwhile are copied first, so ingest does not
+wait for the pickling.
+
+    python -m backend.features            # recompute from the database, compare with the snapshot
+
+recomputes every feature from the last 7 days of transactions and lists
+the differences. GET /features/check runs the same check against the
+live store.
+
+Enabled with FEATURES_ENABLED=1.
+"""
+import argparse
+import asyncio
+import heapq
+import os
+import pickle
+import threading
+import time
+
+from .database import db
+
+FEATURES_ENABLED = os.getenv("FEATURES_ENABLED", "0") == "1"
+FEATURES_SNAPSHOT = os.getenv("FEATURES_SNAPSHOT", "features.pickle")
+FEATURES_SNAPSHOT_INTERVAL = float(os.getenv("FEATURES_SNAPSHOT_INTERVAL", "300"))
+
+HOUR = 3_600_000
+# window name -> (width, bucket size), in ms
+WINDOWS = {"1h": (HOUR, 5 * 60_000), "24h": (24 * HOUR, HOUR), "7d": (7 * 24 * HOUR, 6 * HOUR)}
+HORIZON = max(width for width, _ in WINDOWS.values())
+TABLES = ("sent", "received", "devices", "ips")
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+class Rolling:
+    """Count, sum and distinct keys over a sliding window of time buckets."""
+    __slots__ = ("width", "step", "buckets", "order", "count", "total", "keys")
+
+    def __init__(self, width, step):
+        self.width, self.step = width, step
+        self.buckets = {}   # bucket index -> [count, total, {key: count}]
+        self.order = []     # heap of bucket indices, oldest first
+        self.count, self.total = 0, 0.0
+        self.keys = {}      # key -> occurrences in the window
+
+    def add(self, ts, amount, key, now):
+        self.expire(now)
+        index = ts // self.step
+        if index < self._first(now):
+            return
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = [0, 0.0, {}]
+            heapq.heappush(self.order, index)
+        bucket[0] += 1
+        bucket[1] += amount
+        self.count += 1
+        self.total += amount
+        if key is not None:
+            bucket[2][key] = bucket[2].get(key, 0) + 1
+            self.keys[key] = self.keys.get(key, 0) + 1
+
+    def _first(self, now):
+        """Oldest bucket index still inside the window ending at `now`."""
+        return (now - self.width) // self.step + 1
+
+    def expire(self, now):
+        first = self._first(now)
+        while self.order and self.order[0] < first:
+            count, total, keys = self.buckets.pop(heapq.heappop(self.order))
+            self.count -= count
+            self.total -= total
+            for key, n in keys.items():
+                left = self.keys[key] - n
+                if left:
+                    self.keys[key] = left
+                else:
+                    del self.keys[key]
+
+    def copy(self):
+        other = Rolling(self.width, self.step)
+        other.buckets = {index: [count, total, keys.copy()] for index, (count, total, keys) in self.buckets.items()}
+        other.order = self.order[:]
+        other.count, other.total, other.keys = self.count, self.total, self.keys.copy()
+        return other
+
+    def read(self, now):
+        self.expire(now)
+        # Float error from removing buckets; amounts are cents
+        return self.count, round(self.total, 2) if self.count else 0.0, len(self.keys)
+
+def _windows():
+    return {name: Rolling(width, step) for name, (width, step) in WINDOWS.items()}
+
+class FeatureStore:
+    def __init__(self):
+        self.sent = {}       # user_id -> {window: Rolling keyed by receiver}
+        self.received = {}   # user_id -> {window: Rolling keyed by sender}
+        self.devices = {}    # device_id -> {window: Rolling keyed by sender}
+        self.ips = {}        # ip_address -> {window: Rolling keyed by sender}
+        self.seen = {}       # txn_id -> timestamp, for the transactions counted inside HORIZON
+        self._seen_order = []  # heap of (timestamp, txn_id)
+        self._saving = None  # table copies being pickled by `save`
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def add_transactions(self, transactions, now=None):
+        now = now or _now_ms()
+        with self._lock:
+            self._forget(now - HORIZON)
+            for txn in transactions:
+                ts = txn.get("timestamp")
+                if ts is None or ts < now - HORIZON:
+                    continue
+                txn_id = txn.get("txn_id")
+                if txn_id is not None:
+                    if txn_id in self.seen:
+                        continue
+                    self.seen[txn_id] = ts
+                    heapq.heappush(self._seen_order, (ts, txn_id))
+                amount = txn.get("amount") or 0.0
+                sender, receiver = txn.get("sender_id"), txn.get("receiver_id")
+                for table, entity, key in (("sent", sender, receiver), ("received", receiver, sender),
+                                           ("devices", txn.get("device_id"), sender),
+                                           ("ips", txn.get("ip_address"), sender)):
+                    if entity is None:
+                        continue
+                    for rolling in self._windows(table, entity, create=True).values():
+                        rolling.add(ts, amount, key, now)
+
+    def _forget(self, before):
+        """Drop the ids of transactions older than `before`; they are out of every window."""
+        order = self._seen_order
+        while order and order[0][0] < before:
+            ts, txn_id = heapq.heappop(order)
+            if self.seen.get(txn_id) == ts:
+                del self.seen[txn_id]
+
+    def _windows(self, table, entity, create=False):
+        """The windows of `entity` in `table`, safe to update (None if it has none).
+
+        While `save` pickles copies of the tables, windows shared with those
+        copies are replaced by a copy of their own before they change.
+        """
+        entities = getattr(self, table)
+        windows = entities.get(entity)
+        if windows is None:
+            if create:
+                windows = entities[entity] = _windows()
+            return windows
+        if self._saving is not None and self._saving[table].get(entity) is windows:
+            windows = entities[entity] = {name: rolling.copy() for name, rolling in windows.items()}
+        return windows
+
+    def _read(self, table, entity, now):
+        windows = self._windows(table, entity)
+        if windows is None:
+            return {name: (0, 0.0, 0) for name in WINDOWS}
+        return {name: rolling.read(now) for name, rolling in windows.items()}
+
+    def user_features(self, user_id, now=None):
+        now = now or _now_ms()
+        with self._lock:
+            sent, received = self._read("sent", user_id, now), self._read("received", user_id, now)
+        return {name: {
+            "sent_count": sent[name][0], "sent_sum": sent[name][1], "distinct_receivers": sent[name][2],
+            "received_count": received[name][0], "received_sum": received[name][1],
+            "distinct_senders": received[name][2],
+        } for name in WINDOWS}
+
+    def fan_out(self, kind, value, now=None):
+        """Transactions and distinct senders per window for a device id or IP address."""
+        now = now or _now_ms()
+        with self._lock:
+            windows = self._read("devices" if kind == "device" else "ips", value, now)
+        return {name: {"count": count, "distinct_senders": distinct}
+                for name, (count, _, distinct) in windows.items()}
+
+    def __contains__(self, user_id):
+        return user_id in self.sent or user_id in self.received
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self.sent.keys() | self.received.keys()), "devices": len(self.devices),
+                    "ips": len(self.ips)}
+
+    # -- persistence and recompute -----------------------------------------
+
+    def save(self, path=FEATURES_SNAPSHOT):
+        """Pickle the store to `path`; only the shallow copies are taken under the lock."""
+        with self._save_lock:
+            with self._lock:
+                tables = self._saving = {table: dict(getattr(self, table)) for table in TABLES}
+                seen = dict(self.seen)
+            try:
+                data = pickle.dumps(tuple(tables[table] for table in TABLES) + (seen,), pickle.HIGHEST_PROTOCOL)
+            finally:
+                with self._lock:
+                    self._saving = None
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp, path)
+
+    def load(self, path=FEATURES_SNAPSHOT):
+        with open(path, "rb") as handle:
+            state = pickle.load(handle)
+        # Snapshots from before the txn ids were kept have four tables only
+        sent, received, devices, ips = state[:4]
+        seen = state[4] if len(state) > 4 else {}
+        with self._lock:
+            self.sent, self.received, self.devices, self.ips = sent, received, devices, ips
+            self.seen, self._seen_order = seen, sorted((ts, txn_id) for txn_id, ts in seen.items())
+        return self
+
+    def rebuild(self, conn=None, now=None):
+        """Recompute from the transactions of the last 7 days in the database."""
+        conn = conn or db
+        now = now or _now_ms()
+        fresh = FeatureStore()
+        batch = []
+        for record in conn.stream(RECENT_TRANSACTIONS_QUERY, {"since": now - HORIZON}):
+            batch.append(dict(record))
+            if len(batch) == 10000:
+                fresh.add_transactions(batch, now)
+                batch = []
+        fresh.add_transactions(batch, now)
+        with self._lock:
+            self.sent, self.received = fresh.sent, fresh.received
+            self.devices, self.ips = fresh.devices, fresh.ips
+            self.seen, self._seen_order = fresh.seen, fresh._seen_order
+        return self
+
+    def compare(self, other, now=None, limit=100):
+        """Entities whose features differ between this store and `other`."""
+        now = now or _now_ms()
+        differences = []
+        with self._lock:
+            for table in TABLES:
+                for entity in getattr(self, table).keys() | getattr(other, table).keys():
+                    a, b = self._read(table, entity, now), other._read(table, entity, now)
+                    if a != b:
+                        differences.append({"table": table, "id": entity, "store": a, "recomputed": b})
+                        if len(differences) >= limit:
+                            return differences
+        return differences
+
+RECENT_TRANSACTIONS_QUERY = """
+MATCH (s:User)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(r:User)
+WHERE t.timestamp >= $since
+RETURN t.txn_id AS txn_id, s.user_id AS sender_id, r.user_id AS receiver_id, t.amount AS amount,
+       t.timestamp AS timestamp, t.device_id AS device_id, t.ip_address AS ip_address
+"""
+
+features = FeatureStore() if FEATURES_ENABLED else None
+
+def record_transactions(transactions):
+    """Add written transactions to the feature store, if enabled."""
+    if features is not None:
+        features.add_transactions(transactions)
+
+def load_or_rebuild(path=FEATURES_SNAPSHOT):
+    """Startup: the snapshot if there is one, otherwise a recompute from the database."""
+    if os.path.exists(path):
+        return features.load(path)
+    return features.rebuild()
+
+async def snapshot_periodically(path=FEATURES_SNAPSHOT, interval=FEATURES_SNAPSHOT_INTERVAL):
+    """Save the store every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(features.save, path)
+
+def check(store, conn=None):
+    """Recompute from the database and compare against `store` (which is not modified)."""
+    start = time.perf_counter()
+    now = _now_ms()
+    fresh = FeatureStore().rebuild(conn, now)
+    differences = store.compare(fresh, now)
+    return {"seconds": round(time.perf_counter() - start, 3), "checked": fresh.stats(),
+            "mismatches": len(differences), "differences": differences}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute velocity features and compare with a snapshot")
+    parser.add_argument("--snapshot", default=FEATURES_SNAPSHOT)
+    parser.add_argument("--write", action="store_true", help="replace the snapshot with the recomputed store")
+    args = parser.parse_args()
+    if args.write:
+        FeatureStore().rebuild().save(args.snapshot)
+    else:
+        report = check(FeatureStore().load(args.snapshot))
+        print(f"{report['mismatches']} mismatches, recompute took {report['seconds']}s ({report['checked']})")
+        for difference in report["differences"][:20]:
+            print(difference)
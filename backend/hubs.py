@@ -0,0 +1,68 @@
+"""Hub-node attribute model.
+
+Instead of materialising a SHARED_ATTRIBUTE / LINKED edge between every pair
+of nodes that share a value, each distinct value becomes a hub node
+(`:Email`, `:Device`, ...) that users and transactions point to. Edge count
+is then linear in the number of nodes, and pairwise links are derived on
+demand by going through a hub.
+
+Enabled with GRAPH_MODEL=hub.
+"""
+
+# (property, hub label, relationship type)
+USER_HUBS = [
+    ("email", "Email", "HAS_EMAIL"),
+    ("phone", "Phone", "HAS_PHONE"),
+    ("address", "Address", "HAS_ADDRESS"),
+    ("payment_method", "PaymentMethod", "USES_PAYMENT_METHOD"),
+]
+
+TRANSACTION_HUBS = [
+    ("device_id", "Device", "USED_DEVICE"),
+    ("ip_address", "IPAddress", "FROM_IP"),
+]
+
+HUB_LABELS = [label for _, label, _ in USER_HUBS + TRANSACTION_HUBS]
+
+def _rel_types(hubs):
+    return "|".join(rel for _, _, rel in hubs)
+
+USER_HUB_RELS = _rel_types(USER_HUBS)
+TRANSACTION_HUB_RELS = _rel_types(TRANSACTION_HUBS)
+
+def _link_query(label, key, hubs):
+    # Drop the node's current hub edges first so an update that changes an
+    # attribute does not leave it attached to the old value.
+    merges = "\n".join(
+        f"FOREACH (v IN CASE WHEN a.{attr} IS NULL THEN [] ELSE [a.{attr}] END |\n"
+        f"  MERGE (h:{hub} {{value: v}})\n"
+        f"  MERGE (a)-[:{rel}]->(h))"
+        for attr, hub, rel in hubs
+    )
+    return f"""
+UNWIND $rows AS key
+MATCH (a:{label} {{{key}: key}})
+OPTIONAL MATCH (a)-[old:{_rel_types(hubs)}]->()
+WITH a, collect(old) AS stale
+FOREACH (r IN stale | DELETE r)
+{merges}
+"""
+
+LINK_USERS_QUERY = _link_query("User", "user_id", USER_HUBS)
+LINK_TRANSACTIONS_QUERY = _link_query("Transaction", "txn_id", TRANSACTION_HUBS)
+
+def shared_attribute_pattern(a, b):
+    """Cypher pattern deriving a SHARED_ATTRIBUTE link between users `a` and `b`."""
+    return f"({a})-[:{USER_HUB_RELS}]->()<-[:{USER_HUB_RELS}]-({b}:User)"
+
+def linked_pattern(a, b):
+    """Cypher pattern deriving a LINKED link between transactions `a` and `b`."""
+    return f"({a})-[:{TRANSACTION_HUB_RELS}]->()<-[:{TRANSACTION_HUB_RELS}]-({b}:Transaction)"
+
+def link_window(a, b, window_ms):
+    """Cypher condition keeping transactions `a` and `b` within `window_ms` of each other ("" if 0).
+
+    LINKED links are derived, not stored, in this model, so LINK_WINDOW_HOURS
+    is applied where they are read. A missing timestamp never matches.
+    """
+    return f"abs({a}.timestamp - {b}.timestamp) <= {window_ms}" if window_ms else ""
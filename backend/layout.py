@@ -0,0 +1,299 @@
+"""Server-side graph layout and level-of-detail tiles.
+
+The layout is computed offline:
+
+    python -m backend.layout --iterations 60 --out layout.npz [--persist]
+
+It reads the whole graph through `crud.iter_graph_data` and runs a
+vectorised Fruchterman-Reingold layout. Springs pull along every edge
+and are summed with `np.bincount`. Node repulsion is all-pairs, which
+would cost O(n^2); instead it uses a particle-mesh approximation. The
+nodes are binned into a `grid` x `grid` density map, and the map is
+convolved with the 1/r force kernel by FFT. Each iteration therefore
+costs O(nodes + edges + grid^2 log grid), which scales to millions of
+nodes.
+
+Positions are saved to LAYOUT_PATH. With `--persist` they are also
+written to the nodes as `x` / `y`. At startup the API loads the file
+into a `LayoutIndex`. The index orders nodes by Morton (Z-order) code,
+so each quadtree tile `(z, x, y)` is a contiguous slice found with two
+binary searches. A tile holding at most `limit` nodes returns them, plus
+the edges touching them. A larger tile returns super-nodes instead: one
+per non-empty cell, CLUSTER_BITS levels below the tile, with a count
+and a centroid. Cells are joined by weighted super-edges.
+
+Needs numpy.
+"""
+import argparse
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for the layout endpoints
+    np = None
+
+from . import crud
+from .database import db, INGEST_BATCH_SIZE
+
+LAYOUT_PATH = os.getenv("LAYOUT_PATH", "layout.npz")
+# Cytoscape coordinates span [0, LAYOUT_SCALE) on both axes
+LAYOUT_SCALE = float(os.getenv("LAYOUT_SCALE", "10000"))
+TILE_NODE_LIMIT = int(os.getenv("LAYOUT_TILE_NODE_LIMIT", "2000"))
+
+LEVELS = 16          # Morton code resolution: 2**16 cells per axis
+CLUSTER_BITS = 4     # a clustered tile is split into 16 x 16 cells
+NODE_TYPES = ["user", "transaction"]
+EDGE_TYPES = [spec[0] for spec in crud.GRAPH_EDGES]
+EDGE_INFIXES = [spec[5] for spec in crud.GRAPH_EDGES]
+
+# -- reading the graph ---------------------------------------------------
+
+def read_graph(page_size=50000, edges_per_node=20):
+    """Nodes and edges of the whole graph as arrays, paging through `crud.iter_graph_data`.
+
+    A page whose edges were cut short by its edge limit is read again with
+    twice the limit, so no edge is left out of the layout.
+    """
+    ids, keys, labels, types = {}, [], [], []
+    src, dst, etype, seen = [], [], [], set()
+
+    def intern(data):
+        node = ids.get(data["id"])
+        if node is None:
+            node = ids[data["id"]] = len(keys)
+            keys.append(data["id"])
+            labels.append(str(data.get("label", data["id"])))
+            types.append(NODE_TYPES.index(data["type"]))
+        return node
+
+    cursor, edge_limit = None, page_size * edges_per_node
+    while True:
+        page = list(crud.iter_graph_data(node_limit=page_size, edge_limit=edge_limit, cursor=cursor))
+        end = page.pop()
+        if end["truncated"]:
+            edge_limit *= 2
+            continue
+        for item in page:
+            if item["group"] == "nodes":
+                intern(item["data"])
+            else:
+                data = item["data"]
+                if data["id"] not in seen:
+                    seen.add(data["id"])
+                    src.append(ids[data["source"]])
+                    dst.append(ids[data["target"]])
+                    etype.append(EDGE_TYPES.index(data["type"]))
+        cursor = end["next"]
+        if cursor is None:
+            break
+    return {
+        "keys": np.array(keys, dtype=str),
+        "labels": np.array(labels, dtype=str),
+        "types": np.array(types, dtype=np.int8),
+        "src": np.array(src, dtype=np.int32),
+        "dst": np.array(dst, dtype=np.int32),
+        "etype": np.array(etype, dtype=np.int8),
+    }
+
+# -- force-directed layout -----------------------------------------------
+
+def _repulsion_kernel(grid):
+    """FFT of the 2D repulsive force field r / |r|^2 on a zero-padded 2*grid mesh."""
+    offsets = np.fft.fftfreq(2 * grid, d=1 / (2 * grid)) / grid  # cell offsets in unit lengths
+    dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+    r2 = dx * dx + dy * dy
+    r2[0, 0] = np.inf
+    return np.fft.rfft2(dx / r2), np.fft.rfft2(dy / r2)
+
+def force_layout(n, src, dst, iterations=60, grid=256, seed=42, gravity=0.05):
+    """Positions in [0, 1)^2 for `n` nodes joined by edges `src[i]-dst[i]`."""
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if n < 2:
+        return pos
+    k = 1 / np.sqrt(n)           # ideal edge length for a unit area
+    kernel_x, kernel_y = _repulsion_kernel(grid)
+    temperature, cooling = 0.1, (0.002 / 0.1) ** (1 / max(iterations, 1))
+    for _ in range(iterations):
+        lo, hi = pos.min(axis=0), pos.max(axis=0)
+        span = max(hi[0] - lo[0], hi[1] - lo[1], 1e-9)
+        cell = np.minimum(((pos - lo) / span * grid).astype(np.int64), grid - 1)
+        flat = cell[:, 0] * (2 * grid) + cell[:, 1]
+        density = np.bincount(flat, minlength=4 * grid * grid).reshape(2 * grid, 2 * grid)
+        rho = np.fft.rfft2(density)
+        field_x = np.fft.irfft2(rho * kernel_x, s=density.shape).ravel()[flat]
+        field_y = np.fft.irfft2(rho * kernel_y, s=density.shape).ravel()[flat]
+        # Kernel lengths are in units of the bounding box
+        disp = (k * k / span) * np.column_stack([field_x, field_y])
+
+        delta = pos[dst] - pos[src]
+        pull = delta * (np.hypot(delta[:, 0], delta[:, 1]) / k)[:, None]
+        for axis in (0, 1):
+            disp[:, axis] += np.bincount(src, weights=pull[:, axis], minlength=n)
+            disp[:, axis] -= np.bincount(dst, weights=pull[:, axis], minlength=n)
+        disp += gravity * ((lo + hi) / 2 - pos) / k
+
+        length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-12)
+        pos += disp / length[:, None] * np.minimum(length, temperature * span)[:, None]
+        temperature *= cooling
+
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    span = max(hi[0] - lo[0], hi[1] - lo[1], 1e-9)
+    return np.clip((pos - lo) / span * 0.98 + 0.01, 0, np.nextafter(1, 0))
+
+def save(path, graph, pos):
+    np.savez(path, pos=pos.astype(np.float32), **graph)
+
+def persist_positions(graph, pos, conn=None, batch_size=INGEST_BATCH_SIZE):
+    """Write `x` / `y` (in Cytoscape coordinates) onto every user and transaction."""
+    conn = conn or db
+    for code, (label, key) in enumerate(crud.NODE_KEYS.items()):
+        mask = graph["types"] == code
+        rows = [{"key": k, "x": float(x), "y": float(y)}
+                for k, (x, y) in zip(graph["keys"][mask].tolist(), pos[mask] * LAYOUT_SCALE)]
+        query = f"""
+        UNWIND $rows AS row
+        MATCH (n:{label} {{{key}: row.key}})
+        SET n.x = row.x, n.y = row.y
+        """
+        batches = (rows[i:i + batch_size] for i in range(0, len(rows), batch_size))
+        for _ in conn.write_batches(query, batches):
+            pass
+
+# -- tiles ---------------------------------------------------------------
+
+def _spread_bits(v):
+    v = v.astype(np.uint64) & np.uint64(0xFFFF)
+    for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+def morton(x, y):
+    """Z-order code of integer cell coordinates."""
+    return _spread_bits(np.asarray(x)) | (_spread_bits(np.asarray(y)) << np.uint64(1))
+
+class LayoutIndex:
+    def __init__(self, graph, pos):
+        cells = np.clip((pos * (1 << LEVELS)).astype(np.int64), 0, (1 << LEVELS) - 1)
+        codes = morton(cells[:, 0], cells[:, 1])
+        order = np.argsort(codes, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        self.codes = codes[order]
+        self.pos = pos[order].astype(np.float32)
+        self.keys = graph["keys"][order]
+        self.labels = graph["labels"][order]
+        self.types = graph["types"][order]
+        self.src = rank[graph["src"]].astype(np.int32)
+        self.dst = rank[graph["dst"]].astype(np.int32)
+        self.etype = graph["etype"]
+
+        # Incident edges per node, in node order, so a tile's edges are one slice
+        ends = np.concatenate([self.src, self.dst])
+        by_node = np.argsort(ends, kind="stable")
+        self.incident = np.concatenate([np.arange(len(self.src))] * 2)[by_node].astype(np.int32)
+        self.offsets = np.searchsorted(ends[by_node], np.arange(len(self.codes) + 1))
+        self._clustered = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=LAYOUT_PATH):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files if name != "pos"}, data["pos"])
+
+    def stats(self):
+        return {"nodes": len(self.codes), "edges": len(self.src), "levels": LEVELS,
+                "scale": LAYOUT_SCALE, "tile_node_limit": TILE_NODE_LIMIT}
+
+    def _range(self, z, x, y):
+        shift = np.uint64(2 * (LEVELS - z))
+        prefix = morton(x, y)
+        return np.searchsorted(self.codes, [prefix << shift, (prefix + np.uint64(1)) << shift])
+
+    def tile(self, z, x, y, limit=TILE_NODE_LIMIT):
+        """Cytoscape elements of tile `(z, x, y)`: real nodes, or clusters when over `limit`."""
+        if not (0 <= z <= LEVELS and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError("tile out of range")
+        lo, hi = self._range(z, x, y)
+        if hi - lo <= limit or z == LEVELS:
+            return self._detail(lo, hi, limit)
+        with self._lock:
+            key = (z, x, y)
+            if key not in self._clustered:
+                self._clustered[key] = self._clusters(z, lo, hi)
+            return self._clustered[key]
+
+    def _node(self, i, ghost=False):
+        x, y = self.pos[i] * LAYOUT_SCALE
+        data = {"id": str(self.keys[i]), "label": str(self.labels[i]), "type": NODE_TYPES[self.types[i]]}
+        if ghost:
+            data["ghost"] = True
+        return {"group": "nodes", "data": data, "position": {"x": float(x), "y": float(y)}}
+
+    def _edge(self, e):
+        a, b = str(self.keys[self.src[e]]), str(self.keys[self.dst[e]])
+        return {"group": "edges", "data": {"id": f"{a}-{EDGE_INFIXES[self.etype[e]]}-{b}",
+                                           "source": a, "target": b, "type": EDGE_TYPES[self.etype[e]]}}
+
+    def _detail(self, lo, hi, limit):
+        hi = min(hi, lo + limit)
+        edges = np.unique(self.incident[self.offsets[lo]:self.offsets[hi]])[:limit * 4]
+        ends = np.concatenate([self.src[edges], self.dst[edges]])
+        outside = np.unique(ends[(ends < lo) | (ends >= hi)])
+        nodes = [self._node(i) for i in range(lo, hi)] + [self._node(i, ghost=True) for i in outside]
+        return {"clustered": False, "nodes": nodes, "edges": [self._edge(e) for e in edges]}
+
+    def _clusters(self, z, lo, hi):
+        level = min(z + CLUSTER_BITS, LEVELS)
+        cells = self.codes[lo:hi] >> np.uint64(2 * (LEVELS - level))
+        cell_ids, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        cx = np.bincount(inverse, weights=self.pos[lo:hi, 0]) / counts * LAYOUT_SCALE
+        cy = np.bincount(inverse, weights=self.pos[lo:hi, 1]) / counts * LAYOUT_SCALE
+        nodes = [{"group": "nodes", "position": {"x": float(x), "y": float(y)},
+                  "data": {"id": f"c{level}-{cell}", "label": str(count), "type": "cluster",
+                           "count": int(count), "level": level}}
+                 for cell, count, x, y in zip(cell_ids.tolist(), counts.tolist(), cx, cy)]
+
+        edges = np.unique(self.incident[self.offsets[lo]:self.offsets[hi]])
+        a, b = self.src[edges], self.dst[edges]
+        inside = (a >= lo) & (a < hi) & (b >= lo) & (b < hi)
+        a, b = inverse[a[inside] - lo], inverse[b[inside] - lo]
+        pairs = np.unique(np.column_stack([np.minimum(a, b), np.maximum(a, b)])[a != b],
+                          axis=0, return_counts=True)
+        edges = [{"group": "edges", "data": {
+                    "id": f"c{level}-{cell_ids[i]}-{cell_ids[j]}", "type": "CLUSTER", "weight": int(w),
+                    "source": f"c{level}-{cell_ids[i]}", "target": f"c{level}-{cell_ids[j]}"}}
+                 for (i, j), w in zip(pairs[0].tolist(), pairs[1].tolist())]
+        return {"clustered": True, "nodes": nodes, "edges": edges}
+
+index = None
+
+def load_index(path=LAYOUT_PATH):
+    """Load the saved layout into `index`; leaves it None if it was never computed."""
+    global index
+    if np is not None and os.path.exists(path):
+        index = LayoutIndex.load(path)
+    return index
+
+
+if __name__ == "__main__":
+    import time
+    parser = argparse.ArgumentParser(description="Compute and save the graph layout")
+    parser.add_argument("--iterations", type=int, default=60)
+    parser.add_argument("--grid", type=int, default=256, help="repulsion mesh resolution")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=LAYOUT_PATH)
+    parser.add_argument("--persist", action="store_true", help="also write x / y onto the nodes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = read_graph()
+    print(f"read {len(graph['keys'])} nodes, {len(graph['src'])} edges in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    pos = force_layout(len(graph["keys"]), graph["src"], graph["dst"], args.iterations, args.grid, args.seed)
+    print(f"layout in {time.perf_counter() - start:.1f}s")
+    save(args.out, graph, pos)
+    if args.persist:
+        persist_positions(graph, pos)
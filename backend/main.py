@@ -1,15 +1,78 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi import Request
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .models import User, Transaction
-from . import crud
-from .database import db
+from . import crud, async_crud, async_relationships, streaming, cache, metrics, wire
+from .projection import projection
+from .components import components
+from . import layout, features, traversal, relationships, changes, similarity, snapshot
+from .detection_queue import QueueFull, DETECTION_MODE
+from .schema import bootstrap_schema_once
+from .database import db, async_db, NEO4J_POOL_PREFILL, NEO4J_STARTUP_TIMEOUT, SNAPSHOT_READONLY, WEB_CONCURRENCY
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from datetime import datetime
+import asyncio
 import os
-import io
-import csv
+import time
 
-app = FastAPI(title="User & Transaction Graph API")
+def per_worker_state():
+    """Enabled features whose state lives in each worker and only follows the writes it serves."""
+    return [name for name, enabled in (
+        ("CACHE_BACKEND=memory", cache.CACHE_BACKEND == "memory"),
+        ("PROJECTION_ENABLED", projection is not None),
+        ("COMPONENTS_ENABLED", components is not None),
+        ("SIMILARITY_ENABLED", similarity.index is not None),
+        ("FEATURES_ENABLED", features.features is not None),
+    ) if enabled]
+
+def check_workers(workers=WEB_CONCURRENCY):
+    """Refuse to run several workers when some would serve state that misses other workers' writes."""
+    state = per_worker_state()
+    if workers > 1 and state:
+        raise RuntimeError(f"{', '.join(state)} keep state in each worker, so with WEB_CONCURRENCY={workers} "
+                           "workers would serve stale data. Run one worker, or use CACHE_BACKEND=redis "
+                           "and turn the in-memory indexes off.")
+
+@asynccontextmanager
+async def lifespan(app):
+    if SNAPSHOT_READONLY:
+        # No database: the in-memory indexes are filled from the snapshot files
+        app.state.snapshot = await asyncio.to_thread(snapshot.serve, SNAPSHOT_READONLY)
+        await asyncio.to_thread(layout.load_index)
+        yield
+        return
+    check_workers()
+    # Per worker: connect (waiting for Neo4j if it is still starting), fill
+    # the pool and compile the hot queries before accepting requests
+    await async_db.warm_up(NEO4J_POOL_PREFILL, NEO4J_STARTUP_TIMEOUT)
+    await asyncio.to_thread(bootstrap_schema_once)
+    await async_crud.warm_up()
+    if projection is not None:
+        await asyncio.to_thread(projection.load)
+    if components is not None:
+        await asyncio.to_thread(components.rebuild)
+    await asyncio.to_thread(layout.load_index)
+    if similarity.index is not None:
+        await asyncio.to_thread(similarity.index.rebuild)
+    if DETECTION_MODE == "async":
+        async_crud.detection.start()
+    snapshots = None
+    if features.features is not None:
+        await asyncio.to_thread(features.load_or_rebuild)
+        snapshots = asyncio.create_task(features.snapshot_periodically())
+    yield
+    await async_crud.detection.stop()
+    if snapshots is not None:
+        snapshots.cancel()
+    if features.features is not None:
+        await asyncio.to_thread(features.features.save)
+    await async_db.close()
+    db.close()
+
+app = FastAPI(title="User & Transaction Graph API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,84 +83,225 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Routes that read Neo4j; with SNAPSHOT_READONLY they answer 503 instead of failing to connect
+DATABASE_ROUTES = ("/users", "/transactions", "/graph", "/relationships", "/export", "/sample-data",
+                   "/features/check", "/detection")
+IN_MEMORY_SUFFIXES = ("/features", "/similar")
+
+@app.middleware("http")
+async def read_only_guard(request: Request, call_next):
+    if SNAPSHOT_READONLY:
+        path = request.url.path
+        writes = request.method not in ("GET", "HEAD", "OPTIONS")
+        if writes or (path.startswith(DATABASE_ROUTES) and not path.endswith(IN_MEMORY_SUFFIXES)):
+            return JSONResponse({"detail": f"Read-only snapshot mode ({SNAPSHOT_READONLY}): no database"},
+                                status_code=503)
+    return await call_next(request)
+
+@app.middleware("http")
+async def route_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /users/{user_id} is one series
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    metrics.record_request(request.method, path, response.status_code, time.perf_counter() - start)
+    return response
+
+
 @app.post("/users")
-def add_user(user: User):
-    crud.create_user(user.dict())
+async def add_user(user: User):
+    try:
+        await async_crud.create_user(user.dict())
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     return {"message": f"User {user.user_id} added or updated."}
 
 @app.post("/transactions")
-def add_transaction(txn: Transaction):
+async def add_transaction(txn: Transaction):
     try:
-        result = crud.create_transaction(txn.dict())
+        result = await async_crud.create_transaction(txn.dict())
         return {"message": f"Transaction {txn.txn_id} added successfully.", "data": result}
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/users/bulk")
+async def add_users_bulk(users: List[User], batch_size: Optional[int] = None, detect: bool = True):
+    """Upsert many users in UNWIND batches; returns per-batch timings"""
+    try:
+        report = await async_crud.create_users_bulk([u.dict() for u in users], batch_size, detect)
+        return {"message": f"{len(users)} users added or updated.", "report": report}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/transactions/bulk")
+async def add_transactions_bulk(txns: List[Transaction], batch_size: Optional[int] = None, detect: bool = True):
+    """Upsert many transactions in UNWIND batches; returns per-batch timings"""
+    try:
+        report = await async_crud.create_transactions_bulk([t.dict() for t in txns], batch_size, detect)
+        return {"message": f"{len(txns)} transactions added successfully.", "report": report}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/users")
-def list_users():
+async def list_users():
     try:
-        users = crud.get_all_users()
+        users = await async_crud.get_all_users()
         return [record.get("u", record) for record in users]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _window(since, until):
+    # Compared as epoch ms, so a naive bound (UTC) and an aware one can be mixed
+    window = crud.time_window(since, until)
+    if window and window["since"] is not None and window["until"] is not None and window["since"] >= window["until"]:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    return window
+
 @app.get("/transactions")
-def list_transactions():
+async def list_transactions(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Transactions; with `since` / `until` only that event-time window, newest first"""
+    window = _window(since, until)
     try:
-        transactions = crud.get_all_transactions()
+        transactions = await async_crud.get_all_transactions(window=window)
         return [record.get("t", record) for record in transactions]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _wants_msgpack(request: Request):
+    """Content negotiation for the binary format; 406 if msgpack is not installed."""
+    if not wire.wants_msgpack(request.headers.get("accept")):
+        return False
+    if not wire.available():
+        raise HTTPException(status_code=406, detail="MessagePack responses need msgpack installed")
+    return True
+
 @app.get("/graph")
-def get_graph():
-    """Get complete graph data for visualization"""
+async def get_graph(request: Request, seed: Optional[str] = None, depth: int = Query(1, ge=0, le=5),
+              node_limit: int = Query(500, ge=1, le=10000),
+              edge_limit: int = Query(2000, ge=1, le=50000),
+              cursor: Optional[str] = None, format: str = "json",
+              since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Get one page of graph data for visualization; follow `next` for more.
+
+    `format=ndjson` streams one Cytoscape element per line as it is read,
+    followed by a final `{"truncated", "next"}` line. `Accept: application/msgpack`
+    returns the page as columnar MessagePack (see backend/wire.py). `since` /
+    `until` leave out transactions outside that event-time window.
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
     try:
-        return crud.get_graph_data()
+        crud.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+    window = _window(since, until)
+    if _wants_msgpack(request):
+        rows = async_crud.iter_graph_rows(seed, depth, node_limit, edge_limit, cursor, window)
+        return Response(await wire.aencode_graph(rows), media_type=wire.MEDIA_TYPE)
+    if format == "ndjson":
+        items = async_crud.iter_graph_data(seed, depth, node_limit, edge_limit, cursor, window)
+        return StreamingResponse(streaming.ndjson_chunks(items), media_type="application/x-ndjson")
+    try:
+        return await async_crud.get_graph_data(seed, depth, node_limit, edge_limit, cursor, window)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _require_changes():
+    if changes.log is None:
+        raise HTTPException(status_code=503, detail="Change log is disabled (CHANGES_ENABLED=1)")
+    return changes.log
+
+def _changes_since(log, since):
+    """`since` (the head when None), or 410 when the log cannot continue from it."""
+    first, head = log.bounds()
+    if since is None:
+        return head, head
+    if since > head or (first is not None and since < first - 1):
+        raise HTTPException(status_code=410, detail=f"Changes after {since} are not in the log "
+                                                    f"({first}..{head}); reload /graph")
+    return since, head
+
+@app.get("/graph/changes")
+async def graph_changes(since: Optional[int] = Query(None, ge=0),
+                        limit: int = Query(changes.CHANGES_PAGE, ge=0, le=100_000)):
+    """Change log entries after sequence number `since`; pass `next` as `since` for the following page.
+
+    Without `since` only the current `head` is returned, to follow the log from there.
+    """
+    log = _require_changes()
+    since, head = _changes_since(log, since)
+    lines = await asyncio.to_thread(log.read, since, limit)
+    return Response(changes.page(lines, since, head), media_type="application/json")
+
+@app.get("/graph/changes/stream")
+async def stream_graph_changes(request: Request, since: Optional[int] = Query(None, ge=0)):
+    """Server-Sent Events with each change log entry after `since` (or Last-Event-ID) as it is written"""
+    log = _require_changes()
+    last_event = request.headers.get("last-event-id", "")
+    since, _ = _changes_since(log, int(last_event) if last_event.isdigit() else since)
+    return StreamingResponse(changes.events(log, since, request.is_disconnected), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/users/{user_id}/transactions")
-def get_user_transactions(user_id: str):
+async def get_user_transactions(user_id: str):
     """Get all transactions for a specific user"""
     try:
-        query = """
-        MATCH (u:User {user_id: $user_id})
-        OPTIONAL MATCH (u)-[:SENT]->(t:Transaction)-[:RECEIVED_BY]->(r:User)
-        RETURN u, t, r
-        """
-        result = db.query(query, {"user_id": user_id})
-        return [{
-            "u": dict(record["u"]) if record["u"] else None,
-            "t": dict(record["t"]) if record["t"] else None,
-            "r": dict(record["r"]) if record["r"] else None
-        } for record in result]
+        return await async_crud.get_user_transactions(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _require_features():
+    if features.features is None:
+        raise HTTPException(status_code=503, detail="Feature store is disabled (FEATURES_ENABLED=1)")
+    return features.features
+
+@app.get("/users/{user_id}/features")
+async def user_features(user_id: str):
+    """Sent/received counts, sums and distinct counterparties over 1h / 24h / 7d"""
+    return {"user_id": user_id, "windows": _require_features().user_features(user_id)}
+
+@app.get("/features/device/{device_id}")
+async def device_features(device_id: str):
+    """Transactions and distinct senders on a device over 1h / 24h / 7d"""
+    return {"device_id": device_id, "windows": _require_features().fan_out("device", device_id)}
+
+@app.get("/features/ip/{ip_address}")
+async def ip_features(ip_address: str):
+    """Transactions and distinct senders from an IP address over 1h / 24h / 7d"""
+    return {"ip_address": ip_address, "windows": _require_features().fan_out("ip", ip_address)}
+
+@app.get("/features/check")
+async def check_features():
+    """Recompute every feature from the database and list where the live store differs"""
+    return await asyncio.to_thread(features.check, _require_features())
+
+@app.get("/users/{user_id}/similar")
+async def similar_users(user_id: str):
+    """Users whose email, phone or address nearly matches this user's, with scores"""
+    if similarity.index is None:
+        raise HTTPException(status_code=503, detail="Similarity matching is disabled (SIMILARITY_ENABLED=1)")
+    if user_id not in similarity.index:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    return {"user_id": user_id, "similar": similarity.index.similar(user_id), "stats": similarity.index.stats()}
+
 @app.get("/transactions/{txn_id}")
-def get_transaction(txn_id: str):
+async def get_transaction(txn_id: str):
     """Get details of a specific transaction"""
     try:
-        query = """
-        MATCH (s:User)-[:SENT]->(t:Transaction {txn_id: $txn_id})-[:RECEIVED_BY]->(r:User)
-        RETURN s, t, r
-        """
-        result = db.query(query, {"txn_id": txn_id})
+        result = await async_crud.get_transaction_details(txn_id)
         if not result:
             raise HTTPException(status_code=404, detail="Transaction not found")
-        return [{
-            "s": dict(record["s"]) if record["s"] else None,
-            "t": dict(record["t"]) if record["t"] else None,
-            "r": dict(record["r"]) if record["r"] else None
-        } for record in result]
+        return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/sample-data")
-def load_sample_data():
+async def load_sample_data():
     """Load sample users and transactions for testing"""
     try:
         # Sample users
@@ -119,62 +323,184 @@ def load_sample_data():
         
         # Create users
         for user_data in sample_users:
-            crud.create_user(user_data)
+            await async_crud.create_user(user_data)
         
         # Create transactions
         for txn_data in sample_transactions:
-            crud.create_transaction(txn_data)
+            await async_crud.create_transaction(txn_data)
         
         return {"message": "Sample data loaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Serve frontend
-frontend_path = os.path.join(os.path.dirname(__file__), '../frontend')
-app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
+@app.get("/export/users/csv")
+async def export_users_csv(request: Request, limit: Optional[int] = None):
+    rows = async_crud.iter_users(limit)
+    if _wants_msgpack(request):
+        return StreamingResponse(wire.export_chunks(rows, crud.USER_FIELDS), media_type=wire.MEDIA_TYPE)
+    return StreamingResponse(streaming.csv_chunks(crud.USER_FIELDS, rows), media_type="text/csv",
+                             headers={"Content-Disposition": "attachment; filename=users.csv"})
 
-@app.get("/")
-def read_index():
-    return FileResponse(os.path.join(frontend_path, "index.html"))
+@app.get("/export/transactions/json")
+async def export_transactions_json(request: Request, limit: Optional[int] = None, format: str = "json",
+                                   since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Stream transactions as one JSON array, or one object per line with `format=ndjson`"""
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    rows = async_crud.iter_transactions(limit, _window(since, until))
+    if _wants_msgpack(request):
+        return StreamingResponse(wire.export_chunks(rows), media_type=wire.MEDIA_TYPE)
+    if format == "ndjson":
+        return StreamingResponse(streaming.ndjson_chunks(rows), media_type="application/x-ndjson")
+    return StreamingResponse(streaming.json_array_chunks(rows), media_type="application/json")
 
+def _require_projection(*keys):
+    if projection is None:
+        raise HTTPException(status_code=503, detail="Graph projection is disabled (PROJECTION_ENABLED=1)")
+    for key in keys:
+        if key not in projection:
+            raise HTTPException(status_code=404, detail=f"{key} not found")
 
-@app.get("/export/users/csv")
-def export_users_csv(limit: int = 1000):
-    rows = crud.get_all_users(limit)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["user_id","name","email","phone","address","payment_method"])
-    for r in rows:
-        u = r.get("u") or r
-        writer.writerow([u.get("user_id"), u.get("name"), u.get("email"), u.get("phone"), u.get("address"), u.get("payment_method")])
-    output.seek(0)
-    return StreamingResponse(io.StringIO(output.getvalue()), media_type="text/csv", headers={"Content-Disposition":"attachment; filename=users.csv"})
+def _limits(types, budget, timeout, degree_cap):
+    """Traversal limits from query parameters (400 on an unknown relationship type)."""
+    if SNAPSHOT_READONLY:
+        raise HTTPException(status_code=400, detail="Read-only snapshot mode serves the projection, without types")
+    try:
+        return {"types": traversal.rel_types(types), "budget": budget, "timeout": timeout,
+                "degree_cap": degree_cap}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/export/transactions/json")
-def export_transactions_json(limit: int = 1000):
-    rows = crud.get_all_transactions(limit)
-    txns = [ (r.get("t") or r) for r in rows ]
-    return JSONResponse(content=txns)
+def _projection_result(**fields):
+    # The projection holds the whole graph in memory, so nothing is cut short
+    return {**fields, "truncated": False, "reason": None, "visited": None, "capped": []}
 
 @app.get("/analytics/shortest_path")
-def shortest_path(u1: str, u2: str):
-    # returns node id sequence between two users (if exists)
-    query = """
-    MATCH (a:User {user_id:$u1}), (b:User {user_id:$u2})
-    CALL gds.alpha.shortestPath.stream({
-      sourceNode: id(a),
-      targetNode: id(b),
-      relationshipWeightProperty: null
-    }) YIELD nodeId
-    RETURN nodeId
-    """
-    # NOTE: gds.alpha requires Graph Data Science lib; simpler fallback:
-    fallback = """
-    MATCH p=shortestPath((a:User {user_id:$u1})-[*]-(b:User {user_id:$u2}))
-    RETURN [n IN nodes(p) | coalesce(n.user_id, n.txn_id)] AS path
+async def shortest_path(u1: str, u2: str, max_depth: int = Query(traversal.MAX_DEPTH, ge=1, le=20),
+                        types: Optional[List[str]] = Query(None),
+                        budget: int = Query(traversal.NODE_BUDGET, ge=1, le=1_000_000),
+                        timeout: float = Query(traversal.TIMEOUT, gt=0, le=60),
+                        degree_cap: int = Query(traversal.DEGREE_CAP, ge=1)):
+    """Shortest path between two users or transactions, within the traversal limits.
+
+    `truncated` (with `reason`) is set when a limit stopped the search before it was decided.
     """
-    res = db.query(fallback, {"u1": u1, "u2": u2})
-    return res
+    if projection is not None and not types:
+        _require_projection(u1, u2)
+        path = projection.shortest_path(u1, u2, max_depth)
+        return _projection_result(path=path, length=len(path) - 1 if path else None)
+    result = await async_crud.shortest_path(u1, u2, max_depth=max_depth,
+                                            **_limits(types, budget, timeout, degree_cap))
+    if result is None:
+        raise HTTPException(status_code=404, detail="User or transaction not found")
+    return result
+
+@app.get("/analytics/neighbourhood")
+async def neighbourhood(id: str, k: int = Query(1, ge=1, le=6), types: Optional[List[str]] = Query(None),
+                        budget: int = Query(traversal.NODE_BUDGET, ge=1, le=1_000_000),
+                        timeout: float = Query(traversal.TIMEOUT, gt=0, le=60),
+                        degree_cap: int = Query(traversal.DEGREE_CAP, ge=1)):
+    """Ids within `k` hops of `id` with their distance, from the projection or a bounded traversal"""
+    if projection is not None and not types:
+        _require_projection(id)
+        return _projection_result(nodes=projection.k_hop(id, k))
+    result = await async_crud.neighbourhood(id, k, **_limits(types, budget, timeout, degree_cap))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{id} not found")
+    return result
+
+@app.get("/analytics/degree")
+async def degree(id: str):
+    """Number of neighbours of `id`, from the in-memory projection"""
+    _require_projection(id)
+    return {"id": id, "degree": projection.degree(id)}
 
+@app.get("/analytics/projection")
+async def projection_stats():
+    _require_projection()
+    return projection.stats()
 
+def _require_components(*keys):
+    if components is None:
+        raise HTTPException(status_code=503, detail="Component index is disabled (COMPONENTS_ENABLED=1)")
+    for key in keys:
+        if key not in components:
+            raise HTTPException(status_code=404, detail=f"{key} not found")
+
+def _require_layout():
+    if layout.index is None:
+        raise HTTPException(status_code=503, detail="No layout computed (python -m backend.layout)")
+    return layout.index
+
+@app.get("/layout")
+async def layout_info():
+    """Node/edge counts, coordinate scale and tile node limit of the precomputed layout"""
+    return _require_layout().stats()
+
+@app.get("/layout/tiles/{z}/{x}/{y}")
+async def layout_tile(z: int, x: int, y: int, limit: int = Query(layout.TILE_NODE_LIMIT, ge=1, le=20000)):
+    """Elements of quadtree tile (z, x, y) with preset positions; clustered when over `limit` nodes"""
+    try:
+        return _require_layout().tile(z, x, y, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/components/top")
+async def top_components(limit: int = Query(10, ge=1, le=1000), sample: int = Query(10, ge=0, le=100)):
+    """Largest fraud rings by member count, with a sample of member ids"""
+    _require_components()
+    return {"stats": components.stats(), "components": components.top(limit, sample)}
+
+@app.get("/components/{id}")
+async def component(id: str, limit: Optional[int] = Query(None, ge=1)):
+    """The component (users and transactions) that user or transaction `id` belongs to"""
+    _require_components(id)
+    return components.members_of(id, limit)
+
+@app.get("/relationships/user/{user_id}")
+async def user_relationships(user_id: str, limit: int = Query(relationships.RELATIONSHIPS_LIMIT, ge=1, le=100_000),
+                             degree_cap: int = Query(traversal.DEGREE_CAP, ge=1)):
+    return await async_relationships.get_user_relationships(user_id, limit, degree_cap)
+
+@app.get("/relationships/transaction/{txn_id}")
+async def transaction_relationships(txn_id: str,
+                                    limit: int = Query(relationships.RELATIONSHIPS_LIMIT, ge=1, le=100_000),
+                                    degree_cap: int = Query(traversal.DEGREE_CAP, ge=1)):
+    return await async_relationships.get_transaction_relationships(txn_id, limit, degree_cap)
+
+@app.get("/snapshot")
+async def snapshot_manifest():
+    """Manifest of the snapshot being served in read-only mode"""
+    if not SNAPSHOT_READONLY:
+        raise HTTPException(status_code=404, detail="Not in read-only snapshot mode (SNAPSHOT_READONLY)")
+    return app.state.snapshot
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters of the read-through cache"""
+    return cache.cache.stats()
+
+@app.get("/detection/queue")
+async def detection_queue():
+    """Pending detection work: depth per kind, lag of the oldest id and throughput counters"""
+    return async_crud.detection.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Query, route latency and cache metrics in Prometheus text format"""
+    stats = {f"cache_{k}": v for k, v in cache.cache.stats().items()}
+    return PlainTextResponse(metrics.render_prometheus(stats), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/slow-queries")
+async def slow_queries(limit: int = Query(50, ge=1, le=1000), min_ms: float = 0.0):
+    """Slowest recent statements from the query ring buffer"""
+    return metrics.slow_queries(limit, min_ms)
+
+# Serve frontend; mounted last so it does not shadow the API routes
+frontend_path = os.path.join(os.path.dirname(__file__), '../frontend')
+
+@app.get("/")
+def read_index():
+    return FileResponse(os.path.join(frontend_path, "index.html"))
+
+app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
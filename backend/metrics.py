@@ -0,0 +1,130 @@
+"""Query instrumentation and route latency metrics.
+
+Every statement run through the database layer is recorded with a stable
+fingerprint (hash of the whitespace-normalised Cypher), wall time, the
+server-side `result_available_after` / `result_consumed_after` timings and
+the row count. A PROFILE_SAMPLE_RATE share of read statements run under
+PROFILE and also record their total db hits. Records go to a fixed-size
+ring buffer (`/debug/slow-queries`) and into per-fingerprint histograms
+that `/metrics` renders in Prometheus text format, next to per-route
+request latency histograms fed by the HTTP middleware.
+"""
+from collections import deque
+import functools
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+QUERY_LOG_SIZE = int(os.getenv("QUERY_LOG_SIZE", "2000"))
+
+# Seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# PROFILE only for plain read/write statements, not schema or procedure calls
+_PROFILABLE = re.compile(r"^\s*(MATCH|OPTIONAL|UNWIND|MERGE|WITH)\b", re.I)
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    normalised = " ".join(query.split())
+    return hashlib.sha1(normalised.encode()).hexdigest()[:12], normalised[:300]
+
+def should_profile(query):
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE and bool(_PROFILABLE.match(query))
+
+def db_hits(profile):
+    """Total db hits of a driver profile tree."""
+    if not profile:
+        return None
+    return profile.get("dbHits", 0) + sum(db_hits(child) or 0 for child in profile.get("children", []))
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.series = {}  # label tuple -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self, name, label_names):
+        with self._lock:
+            items = list(self.series.items())
+        lines = [f"# TYPE {name} histogram"]
+        for labels, series in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f"{name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{name}_count{{{base}}} {series[-1]}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+query_log = deque(maxlen=QUERY_LOG_SIZE)
+query_seconds = Histogram()
+route_seconds = Histogram()
+_query_rows = {}
+_query_text = {}
+
+def record_query(query, seconds, rows, summary=None, profiled=False):
+    fp, text = fingerprint(query)
+    entry = {
+        "fingerprint": fp,
+        "query": text,
+        "wall_ms": round(seconds * 1000, 3),
+        "rows": rows,
+        "available_after_ms": getattr(summary, "result_available_after", None),
+        "consumed_after_ms": getattr(summary, "result_consumed_after", None),
+        "db_hits": db_hits(getattr(summary, "profile", None)) if profiled else None,
+        "at": time.time(),
+    }
+    query_log.append(entry)
+    query_seconds.observe((fp,), seconds)
+    _query_rows[fp] = _query_rows.get(fp, 0) + rows
+    _query_text[fp] = text
+
+def record_request(method, route, status, seconds):
+    route_seconds.observe((method, route, str(status)), seconds)
+
+class QueryTimer:
+    """Times one statement; `finish(rows, summary)` records it."""
+    def __init__(self, query):
+        self.profiled = should_profile(query)
+        self.query = query
+        self.statement = "PROFILE " + query if self.profiled else query
+        self.start = time.perf_counter()
+
+    def finish(self, rows, summary=None):
+        record_query(self.query, time.perf_counter() - self.start, rows, summary, self.profiled)
+
+def slow_queries(limit=50, min_ms=0.0):
+    entries = [e for e in list(query_log) if e["wall_ms"] >= min_ms]
+    return sorted(entries, key=lambda e: e["wall_ms"], reverse=True)[:limit]
+
+def render_prometheus(extra=None):
+    lines = query_seconds.render("graph_query_duration_seconds", ["fingerprint"])
+    lines.append("# TYPE graph_query_rows_total counter")
+    lines += [f'graph_query_rows_total{{fingerprint="{fp}"}} {rows}' for fp, rows in list(_query_rows.items())]
+    lines.append("# TYPE graph_query_info gauge")
+    lines += [f'graph_query_info{{fingerprint="{fp}",query="{_escape(text[:120])}"}} 1'
+              for fp, text in list(_query_text.items())]
+    lines += route_seconds.render("http_request_duration_seconds", ["method", "route", "status"])
+    for name, value in (extra or {}).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
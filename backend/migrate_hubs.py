@@ -0,0 +1,86 @@
+"""Collapse materialised LINKED / SHARED_ATTRIBUTE edges into the hub model.
+
+    python -m backend.migrate_hubs [--batch-size 1000] [--keep-edges]
+
+Every user and transaction is linked to its attribute hubs in UNWIND
+batches, then the pairwise edges are deleted in bounded batches. Edge
+counts and store size are printed before and after. Run the API with
+GRAPH_MODEL=hub afterwards.
+"""
+import argparse
+
+from .database import db
+from . import crud, hubs
+
+PAIRWISE_TYPES = ("LINKED", "SHARED_ATTRIBUTE")
+
+REL_TYPES_QUERY = "CALL db.relationshipTypes()"
+NODE_COUNT_QUERY = "MATCH (n) RETURN count(n) AS count"
+STORE_SIZE_QUERY = "CALL apoc.monitor.store() YIELD totalStoreSize"
+USER_KEYS_QUERY = "MATCH (u:User) RETURN u.user_id AS key"
+TRANSACTION_KEYS_QUERY = "MATCH (t:Transaction) RETURN t.txn_id AS key"
+
+def edge_count_query(rel_type):
+    return f"MATCH ()-[r:`{rel_type}`]->() RETURN count(r) AS count"
+
+def delete_edges_query(rel_type):
+    return f"MATCH ()-[r:{rel_type}]->() WITH r LIMIT $limit DELETE r RETURN count(r) AS deleted"
+
+def graph_stats():
+    """Node count, relationship count per type and store size in bytes.
+
+    Counts come from the count store. Store size needs APOC and is None
+    when it is not installed.
+    """
+    types = [r["relationshipType"] for r in db.query(REL_TYPES_QUERY)]
+    edges = {t: db.query(edge_count_query(t))[0]["count"] for t in types}
+    try:
+        store_size = db.query(STORE_SIZE_QUERY)[0]["totalStoreSize"]
+    except Exception:
+        store_size = None
+    return {
+        "nodes": db.query(NODE_COUNT_QUERY)[0]["count"],
+        "edges": sum(edges.values()),
+        "edges_by_type": edges,
+        "store_size_bytes": store_size,
+    }
+
+def _delete_edges(rel_type, batch_size):
+    deleted = 0
+    while True:
+        count = db.query(delete_edges_query(rel_type), {"limit": batch_size})[0]["deleted"]
+        if not count:
+            return deleted
+        deleted += count
+
+def migrate(batch_size=None, keep_edges=False):
+    batch_size = batch_size or crud.INGEST_BATCH_SIZE
+    before = graph_stats()
+
+    user_ids = [r["key"] for r in db.query(USER_KEYS_QUERY)]
+    txn_ids = [r["key"] for r in db.query(TRANSACTION_KEYS_QUERY)]
+    linked = {
+        "users": crud._ingest(hubs.LINK_USERS_QUERY, user_ids, batch_size),
+        "transactions": crud._ingest(hubs.LINK_TRANSACTIONS_QUERY, txn_ids, batch_size),
+    }
+    deleted = {} if keep_edges else {t: _delete_edges(t, batch_size) for t in PAIRWISE_TYPES}
+
+    return {"before": before, "after": graph_stats(), "linked": linked, "deleted": deleted}
+
+def _print_stats(name, stats):
+    size = stats["store_size_bytes"]
+    size = f"{size / 2**20:.1f} MiB" if size is not None else "n/a (APOC not installed)"
+    print(f"{name}: {stats['nodes']} nodes, {stats['edges']} edges, store size {size}")
+    for rel_type, count in sorted(stats["edges_by_type"].items()):
+        print(f"  {rel_type:<20} {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate pairwise edges to the hub model")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--keep-edges", action="store_true",
+                        help="create hub links but keep the LINKED/SHARED_ATTRIBUTE edges")
+    args = parser.parse_args()
+    report = migrate(args.batch_size, args.keep_edges)
+    _print_stats("Before", report["before"])
+    _print_stats("After", report["after"])
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 class User(BaseModel):
     user_id: str
@@ -16,3 +17,5 @@ class Transaction(BaseModel):
     amount: float
     device_id: Optional[str] = None
     ip_address: Optional[str] = None
+    # Event time; defaults to the time of ingest
+    timestamp: Optional[datetime] = None
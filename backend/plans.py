@@ -0,0 +1,112 @@
+"""Drive crud's query plans on a sync or an async connection.
+
+A plan is a generator holding the query and row logic of an operation.
+It yields requests and is sent their results, so `crud` and
+`async_crud` share one implementation and differ only in the connection
+that serves the requests (as with traversal.run / arun):
+
+- `query(q, params)`: sent the list of rows;
+- `write(q, batches)`: sent `[(rows, seconds), ...]`, one per committed
+  batch (see Neo4jConnection.write_batches);
+- `stream(q, params)`: sent the first row, then the next one for each
+  NEXT, or None once the result is exhausted. CLOSE drops the rest.
+  Other requests may be made while a stream is open;
+- `emit(item)`: `item` is yielded to whoever iterates the plan.
+
+The plan's return value is the result of `run` / `arun`.
+"""
+QUERY, WRITE, STREAM, EMIT = "query", "write", "stream", "emit"
+NEXT, CLOSE = ("next",), ("close",)
+
+def query(q, params=None):
+    return QUERY, q, params
+
+def write(q, batches):
+    return WRITE, q, batches
+
+def stream(q, params=None):
+    return STREAM, q, params
+
+def emit(item):
+    return EMIT, item
+
+def iterate(plan, conn):
+    """Drive `plan` on a Neo4jConnection, yielding what it emits; returns what it returns."""
+    rows, reply = None, None
+    try:
+        while True:
+            try:
+                request = plan.send(reply)
+            except StopIteration as done:
+                return done.value
+            op = request[0]
+            if op == EMIT:
+                reply = None
+                yield request[1]
+            elif op == QUERY:
+                reply = conn.query(request[1], request[2])
+            elif op == WRITE:
+                reply = list(conn.write_batches(request[1], request[2]))
+            elif op == STREAM:
+                if rows is not None:
+                    rows.close()
+                rows = iter(conn.stream(request[1], request[2]))
+                reply = next(rows, None)
+            elif request is NEXT:
+                reply = next(rows, None)
+            else:
+                rows.close()
+                rows, reply = None, None
+    finally:
+        if rows is not None:
+            rows.close()
+
+def run(plan, conn):
+    """Drive `plan` on a Neo4jConnection and return its result; emitted items are dropped."""
+    items = iterate(plan, conn)
+    while True:
+        try:
+            next(items)
+        except StopIteration as done:
+            return done.value
+
+async def aiterate(plan, conn):
+    """Async version of `iterate`, on an AsyncNeo4jConnection (the return value is dropped)."""
+    rows, reply = None, None
+    try:
+        while True:
+            try:
+                request = plan.send(reply)
+            except StopIteration:
+                return
+            op = request[0]
+            if op == EMIT:
+                reply = None
+                yield request[1]
+            elif op == QUERY:
+                reply = await conn.query(request[1], request[2])
+            elif op == WRITE:
+                reply = [batch async for batch in conn.write_batches(request[1], request[2])]
+            elif op == STREAM:
+                if rows is not None:
+                    await rows.aclose()
+                rows = conn.stream(request[1], request[2])
+                reply = await anext(rows, None)
+            elif request is NEXT:
+                reply = await anext(rows, None)
+            else:
+                await rows.aclose()
+                rows, reply = None, None
+    finally:
+        if rows is not None:
+            await rows.aclose()
+
+async def arun(plan, conn):
+    """Async version of `run`."""
+    result = []
+    async for _ in aiterate(_returning(plan, result), conn):
+        pass
+    return result[0]
+
+def _returning(plan, result):
+    result.append((yield from plan))
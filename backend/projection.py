@@ -0,0 +1,257 @@
+"""In-process compact projection of the user/transaction graph.
+
+Vertices are users, transactions and attribute hubs (`email:<value>`,
+`device_id:<value>`, ...), interned to int32 ids. Adjacency is stored as
+CSR arrays: `offsets[i]:offsets[i + 1]` slices `targets` for vertex i.
+Every edge is stored in both directions, so an edge costs 8 bytes (two
+int32 targets) plus 4 bytes per vertex for the offsets. Inserts go to a
+small delta adjacency that is folded into the CSR arrays once it reaches
+COMPACT_THRESHOLD edges. See benchmarks/projection_memory.py for the
+comparison against a dict-of-sets.
+
+In the pairwise model hubs are transparent: a user reaches every user
+sharing an attribute in one hop, as over SHARED_ATTRIBUTE / LINKED edges.
+In the hub model they are ordinary vertices, as in the database.
+
+Enabled with PROJECTION_ENABLED=1; needs numpy.
+"""
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed with PROJECTION_ENABLED=1
+    np = None
+
+from .database import db, GRAPH_MODEL, SNAPSHOT_READONLY
+from .hubs import USER_HUBS, TRANSACTION_HUBS
+
+# On by default when serving a snapshot read-only
+PROJECTION_ENABLED = os.getenv("PROJECTION_ENABLED", "1" if SNAPSHOT_READONLY else "0") == "1"
+COMPACT_THRESHOLD = int(os.getenv("PROJECTION_COMPACT_THRESHOLD", "100000"))
+
+USER_ATTRIBUTES = [attr for attr, _, _ in USER_HUBS]
+TRANSACTION_ATTRIBUTES = [attr for attr, _, _ in TRANSACTION_HUBS]
+
+class GraphProjection:
+    def __init__(self, transparent_hubs=GRAPH_MODEL != "hub"):
+        if np is None:
+            raise RuntimeError("The graph projection requires numpy (pip install numpy)")
+        self.transparent_hubs = transparent_hubs
+        self.ids = {}      # vertex key -> int id
+        self.keys = []     # int id -> vertex key
+        self.is_hub = bytearray()
+        # (offsets, targets), replaced as a whole so readers never see a mix
+        self.csr = (np.zeros(1, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        self.delta = {}    # int id -> list of int ids added since the last compaction
+        self.delta_edges = 0
+        self.removed = set()  # (a, b) pairs deleted since the last compaction
+        self._lock = threading.Lock()
+
+    # -- building --------------------------------------------------------
+
+    def _intern(self, key, hub=False):
+        vertex = self.ids.get(key)
+        if vertex is None:
+            vertex = self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.is_hub.append(hub)
+        return vertex
+
+    def _add_edge(self, a, b):
+        for x, y in ((a, b), (b, a)):
+            self.removed.discard((x, y))
+            self.delta.setdefault(x, []).append(y)
+        self.delta_edges += 1
+
+    def _hub_edges(self, vertex, props, attributes):
+        """Point `vertex` at the hubs of its current attribute values, dropping stale ones."""
+        wanted = {self._intern(f"{attr}:{props[attr]}", hub=True)
+                  for attr in attributes if props.get(attr) is not None}
+        current = {n for n in self._neighbours(vertex) if self.is_hub[n]}
+        for hub in current - wanted:
+            self.removed.update({(vertex, hub), (hub, vertex)})
+        for hub in wanted - current:
+            self._add_edge(vertex, hub)
+
+    def add_users(self, users):
+        with self._lock:
+            for user in users:
+                self._hub_edges(self._intern(user["user_id"]), user, USER_ATTRIBUTES)
+            self._maybe_compact()
+
+    def add_transactions(self, transactions):
+        with self._lock:
+            for txn in transactions:
+                t = self._intern(txn["txn_id"])
+                if txn.get("sender_id"):
+                    self._add_edge(self._intern(txn["sender_id"]), t)
+                if txn.get("receiver_id"):
+                    self._add_edge(t, self._intern(txn["receiver_id"]))
+                self._hub_edges(t, txn, TRANSACTION_ATTRIBUTES)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self.delta_edges >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        """Fold the delta adjacency and removals into fresh CSR arrays."""
+        n = len(self.keys)
+        offsets, targets = self.csr
+        src = [np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))]
+        dst = [targets]
+        for vertex, added in self.delta.items():
+            src.append(np.full(len(added), vertex, dtype=np.int64))
+            dst.append(np.asarray(added, dtype=np.int32))
+        # Encode (src, dst) as one int64 so sorting and dedup are a single np.unique
+        pairs = np.unique(np.concatenate(src) * n + np.concatenate(dst))
+        if self.removed:
+            gone = np.array([a * n + b for a, b in self.removed], dtype=np.int64)
+            pairs = pairs[~np.isin(pairs, gone)]
+        src = pairs // n
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        self.csr = (offsets, (pairs % n).astype(np.int32))
+        self.delta, self.delta_edges, self.removed = {}, 0, set()
+
+    # -- queries ---------------------------------------------------------
+
+    def _neighbours(self, vertex):
+        offsets, targets = self.csr
+        if vertex + 1 < len(offsets):
+            base = targets[offsets[vertex]:offsets[vertex + 1]].tolist()
+        else:
+            base = []
+        extra = self.delta.get(vertex, [])
+        if self.removed:
+            return [n for n in base + extra if (vertex, n) not in self.removed]
+        return base + extra
+
+    def _hops(self, vertex, seen_hubs):
+        """Vertices one logical hop away; transparent hubs are expanded in place."""
+        for n in self._neighbours(vertex):
+            if self.transparent_hubs and self.is_hub[n]:
+                if n not in seen_hubs:
+                    seen_hubs.add(n)
+                    for m in self._neighbours(n):
+                        if m != vertex:
+                            yield m, n
+            else:
+                yield n, None
+
+    def __contains__(self, key):
+        return key in self.ids
+
+    def degree(self, key):
+        """Number of logical neighbours of `key`."""
+        vertex = self.ids[key]
+        return len({n for n, _ in self._hops(vertex, set())})
+
+    def k_hop(self, key, k):
+        """Keys within `k` logical hops of `key`, mapped to their distance."""
+        start = self.ids[key]
+        dist = {start: 0}
+        seen_hubs = set()
+        frontier = [start]
+        for depth in range(1, k + 1):
+            nxt = []
+            for vertex in frontier:
+                for n, _ in self._hops(vertex, seen_hubs):
+                    if n not in dist:
+                        dist[n] = depth
+                        nxt.append(n)
+            frontier = nxt
+        return {self.keys[v]: d for v, d in dist.items() if not self.is_hub[v]}
+
+    def shortest_path(self, a, b, max_depth=None):
+        """Keys on a shortest path from `a` to `b`, or None.
+
+        Bidirectional BFS: each round expands one full layer of the smaller
+        frontier, and stops at the first vertex reached from both sides.
+        """
+        start, goal = self.ids[a], self.ids[b]
+        if start == goal:
+            return [a]
+        parents = ({start: None}, {goal: None})
+        frontiers = ([start], [goal])
+        seen_hubs = (set(), set())
+        depth = 0
+        while frontiers[0] and frontiers[1] and (max_depth is None or depth < max_depth):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parent, other = parents[side], parents[1 - side]
+            nxt = []
+            meet = None
+            for vertex in frontiers[side]:
+                for n, _ in self._hops(vertex, seen_hubs[side]):
+                    if n not in parent:
+                        parent[n] = vertex
+                        nxt.append(n)
+                        if n in other:
+                            meet = n
+                            break
+                if meet is not None:
+                    break
+            depth += 1
+            if meet is not None:
+                return self._join(parents, meet)
+            frontiers = (nxt, frontiers[1]) if side == 0 else (frontiers[0], nxt)
+        return None
+
+    def _join(self, parents, meet):
+        path = []
+        vertex = meet
+        while vertex is not None:
+            path.append(self.keys[vertex])
+            vertex = parents[0][vertex]
+        path.reverse()
+        vertex = parents[1][meet]
+        while vertex is not None:
+            path.append(self.keys[vertex])
+            vertex = parents[1][vertex]
+        return path
+
+    def memory_bytes(self):
+        """Bytes held by the CSR arrays (excludes the key interning tables and delta)."""
+        offsets, targets = self.csr
+        return offsets.nbytes + targets.nbytes
+
+    def stats(self):
+        return {
+            "vertices": len(self.keys),
+            "hubs": sum(self.is_hub),
+            "csr_edges": len(self.csr[1]) // 2,
+            "delta_edges": self.delta_edges,
+            "csr_bytes": self.memory_bytes(),
+        }
+
+    # -- loading ---------------------------------------------------------
+
+    def load(self, conn=None):
+        """Rebuild from the database by streaming users and transactions once."""
+        conn = conn or db
+        self.add_users(r["u"] for r in conn.stream("MATCH (u:User) RETURN u"))
+        self.add_transactions(
+            {**r["t"], "sender_id": r["sender_id"], "receiver_id": r["receiver_id"]}
+            for r in conn.stream("""
+            MATCH (t:Transaction)
+            OPTIONAL MATCH (s:User)-[:SENT]->(t)
+            OPTIONAL MATCH (t)-[:RECEIVED_BY]->(r:User)
+            RETURN t, s.user_id AS sender_id, r.user_id AS receiver_id
+            """)
+        )
+        with self._lock:
+            self.compact()
+        return self
+
+projection = GraphProjection() if PROJECTION_ENABLED else None
+
+def record_users(users):
+    """Mirror written users into the projection, if enabled."""
+    if projection is not None:
+        projection.add_users(users)
+
+def record_transactions(transactions):
+    """Mirror written transactions into the projection, if enabled."""
+    if projection is not None:
+        projection.add_transactions(transactions)
@@ -1,15 +1,76 @@
-from .database import db
+from .database import db, GRAPH_MODEL, LINK_WINDOW_MS
+from . import hubs, cache
+from .traversal import DEGREE_CAP
+import os
 
-def get_user_relationships(user_id: str):
-    query = """
-    MATCH (u:User {user_id: $user_id})-[r]-(connected)
-    RETURN type(r) as relation, connected
-    """
-    return db.query(query, {"user_id": user_id})
+HUB_MODEL = GRAPH_MODEL == "hub"
+# Relationships returned per node; more than that sets `truncated`
+RELATIONSHIPS_LIMIT = int(os.getenv("RELATIONSHIPS_LIMIT", "1000"))
+
+# The node itself comes back with every row (and alone, with a null
+# relation, when it has none) so cache entries are tagged with its attributes
+USER_RELATIONSHIPS_QUERY = """
+MATCH (u:User {user_id: $user_id})
+OPTIONAL MATCH (u)-[r]-(connected)
+RETURN u as node, type(r) as relation, connected
+LIMIT $limit
+"""
+
+TRANSACTION_RELATIONSHIPS_QUERY = """
+MATCH (t:Transaction {txn_id: $txn_id})
+OPTIONAL MATCH (t)-[r]-(connected)
+RETURN t as node, type(r) as relation, connected
+LIMIT $limit
+"""
+
+if HUB_MODEL:
+    # Pairwise links are not stored; derive them through the hubs, skipping
+    # hubs shared by more than $degree_cap nodes (the hub itself is still
+    # listed by the first branch) and, for LINKED, pairs outside LINK_WINDOW_MS
+    USER_RELATIONSHIPS_QUERY += f"""
+UNION
+MATCH (u:User {{user_id: $user_id}})-[:{hubs.USER_HUB_RELS}]->(h)
+WHERE COUNT {{ (h)<-[:{hubs.USER_HUB_RELS}]-() }} <= $degree_cap
+MATCH (h)<-[:{hubs.USER_HUB_RELS}]-(connected:User)
+WHERE connected.user_id <> $user_id
+RETURN u as node, 'SHARED_ATTRIBUTE' as relation, connected
+LIMIT $limit
+"""
+    TRANSACTION_RELATIONSHIPS_QUERY += f"""
+UNION
+MATCH (t:Transaction {{txn_id: $txn_id}})-[:{hubs.TRANSACTION_HUB_RELS}]->(h)
+WHERE COUNT {{ (h)<-[:{hubs.TRANSACTION_HUB_RELS}]-() }} <= $degree_cap
+MATCH (h)<-[:{hubs.TRANSACTION_HUB_RELS}]-(connected:Transaction)
+WHERE connected.txn_id <> $txn_id{" AND " + hubs.link_window("t", "connected", LINK_WINDOW_MS) if LINK_WINDOW_MS else ""}
+RETURN t as node, 'LINKED' as relation, connected
+LIMIT $limit
+"""
 
-def get_transaction_relationships(txn_id: str):
-    query = """
-    MATCH (t:Transaction {txn_id: $txn_id})-[r]-(connected)
-    RETURN type(r) as relation, connected
+def relationships_params(key, value, limit, degree_cap):
+    # One row over the limit tells a full page from a cut one
+    return {key: value, "limit": limit + 1, "degree_cap": degree_cap}
+
+def bounded(rows, limit):
+    """The node, at most `limit` of its relationships, and whether there were more.
+
+    The node is part of the cached value, so the entry is tagged with its
+    attribute values and a new node sharing one of them invalidates it.
     """
-    return db.query(query, {"txn_id": txn_id})
+    rels = [{"relation": r["relation"], "connected": r["connected"]} for r in rows if r["relation"] is not None]
+    return {"node": rows[0]["node"] if rows else None, "relationships": rels[:limit], "truncated": len(rels) > limit}
+
+def get_user_relationships(user_id: str, limit=RELATIONSHIPS_LIMIT, degree_cap=DEGREE_CAP):
+    return cache.read_through(
+        f"user_rels:{user_id}:{limit}:{degree_cap}",
+        lambda: bounded(db.query(USER_RELATIONSHIPS_QUERY,
+                                 relationships_params("user_id", user_id, limit, degree_cap)), limit),
+        [f"User:{user_id}"],
+    )
+
+def get_transaction_relationships(txn_id: str, limit=RELATIONSHIPS_LIMIT, degree_cap=DEGREE_CAP):
+    return cache.read_through(
+        f"txn_rels:{txn_id}:{limit}:{degree_cap}",
+        lambda: bounded(db.query(TRANSACTION_RELATIONSHIPS_QUERY,
+                                 relationships_params("txn_id", txn_id, limit, degree_cap)), limit),
+        [f"Transaction:{txn_id}"],
+    )
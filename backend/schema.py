@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; every worker bootstraps instead
+    fcntl = None
+
+from .database import db, WEB_CONCURRENCY
+
+# Lock shared by the API workers of one server, see bootstrap_schema_once
+SCHEMA_LOCK = os.getenv("SCHEMA_LOCK", os.path.join(tempfile.gettempdir(), "graph-api-schema.lock"))
+SCHEMA_BOOTSTRAP = os.getenv("SCHEMA_BOOTSTRAP", "1") == "1"
+from .hubs import USER_HUBS, TRANSACTION_HUBS
+
+# Uniqueness constraints double as the lookup index for MERGE on the id keys.
+CONSTRAINTS = [
+    ("user_id_unique", "User", "user_id"),
+    ("txn_id_unique", "Transaction", "txn_id"),
+] + [
+    (f"{label.lower()}_value_unique", label, "value")
+    for _, label, _ in USER_HUBS + TRANSACTION_HUBS
+]
+
+# Range indexes backing the per-attribute relationship detection lookups.
+INDEXES = [
+    ("user_email", "User", "email"),
+    ("user_phone", "User", "phone"),
+    ("user_address", "User", "address"),
+    ("user_payment_method", "User", "payment_method"),
+    ("txn_device_id", "Transaction", "device_id"),
+    ("txn_ip_address", "Transaction", "ip_address"),
+    # Event-time windows, and pairwise LINKED detection limited to LINK_WINDOW_HOURS
+    ("txn_timestamp", "Transaction", "timestamp"),
+    ("txn_device_time", "Transaction", ("device_id", "timestamp")),
+    ("txn_ip_time", "Transaction", ("ip_address", "timestamp")),
+]
+
+def _properties(prop):
+    """`n.a` or, for a composite index, `n.a, n.b`."""
+    props = prop if isinstance(prop, tuple) else (prop,)
+    return ", ".join(f"n.{p}" for p in props)
+
+def schema_statements():
+    statements = [
+        f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+        for name, label, prop in CONSTRAINTS
+    ]
+    statements += [
+        f"CREATE RANGE INDEX {name} IF NOT EXISTS FOR (n:{label}) ON ({_properties(prop)})"
+        for name, label, prop in INDEXES
+    ]
+    return statements
+
+def bootstrap_schema(conn=None):
+    """Create missing constraints and indexes, then wait for them to come online."""
+    conn = conn or db
+    for statement in schema_statements():
+        conn.query(statement)
+    conn.query("CALL db.awaitIndexes(300)")
+
+def bootstrap_schema_once(conn=None, lock_path=SCHEMA_LOCK):
+    """`bootstrap_schema` from one worker only; the others wait for it to finish.
+
+    Workers of the same server share a parent process (the gunicorn arbiter
+    or the uvicorn supervisor). The first to take the file lock runs the
+    bootstrap and records the parent pid; the rest block on the lock, see
+    the pid and skip. A single worker (WEB_CONCURRENCY=1) always runs it.
+    Returns True if this process ran it.
+    """
+    if not SCHEMA_BOOTSTRAP:
+        return False
+    if fcntl is None or WEB_CONCURRENCY <= 1:
+        bootstrap_schema(conn)
+        return True
+    parent = str(os.getppid())
+    with open(lock_path, "a+") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            handle.seek(0)
+            if handle.read().strip() == parent:
+                return False
+            bootstrap_schema(conn)
+            handle.seek(0)
+            handle.truncate()
+            handle.write(parent)
+            handle.flush()
+            return True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
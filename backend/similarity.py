@@ -0,0 +1,492 @@
+"""Approximate matching of user attributes, kept as SIMILAR_ATTRIBUTE edges.
+
+Exact detection (SHARED_ATTRIBUTE) only links equal strings, so
+"12 Main Street, Apt. 4" and "12 main st apt 4" never meet. Here each
+value is normalized first (`normalize_email`, `normalize_phone` to
+E.164, `normalize_address`), then:
+
+- phone: users with the same E.164 number match, with score 1;
+- email, address: a MinHash signature of the value's character 3-grams
+  (NUM_PERM hashes, 8 bits of each kept) is cut into BANDS bands. Users
+  that share a band are candidates. A candidate matches when the
+  Jaccard similarity estimated from the signatures is at least
+  SIMILARITY_THRESHOLD, and that estimate is its score.
+
+Band hashes live in one sorted array (binary search), plus a small
+sorted array of recent inserts merged into it every
+SIMILARITY_COMPACT_THRESHOLD users. A lookup therefore costs
+O(BANDS log N) plus the candidates, instead of a comparison with every
+user; writes are matched a batch at a time, with NumPy. Buckets are cut
+at SIMILARITY_MAX_BUCKET users, so one value shared by thousands of
+users cannot blow up an insert. Pairs with equal raw values are skipped, because exact detection
+links them already.
+
+Matches are written from the write paths as
+`(a)-[:SIMILAR_ATTRIBUTE {attribute, score}]->(b)`, with a < b by
+user_id.
+
+    python -m backend.similarity            # index the database, count the pairs
+    python -m backend.similarity --write    # ... and write their edges (backfill)
+
+`python -m benchmarks.similarity` measures recall and throughput on
+synthetic near-duplicates. Enabled with SIMILARITY_ENABLED=1; needs
+numpy, and stays off without it. Phone
+numbers are parsed with `phonenumbers` when it is installed. Otherwise
+a fallback assumes numbers without a country code are in
+PHONE_COUNTRY_CODE.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed with SIMILARITY_ENABLED=1
+    np = None
+
+try:
+    import phonenumbers
+except ImportError:  # optional, see normalize_phone
+    phonenumbers = None
+
+from .database import db, INGEST_BATCH_SIZE
+
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "0") == "1" and np is not None
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+SIMILARITY_MAX_BUCKET = int(os.getenv("SIMILARITY_MAX_BUCKET", "100"))
+SIMILARITY_MAX_MATCHES = int(os.getenv("SIMILARITY_MAX_MATCHES", "50"))
+SIMILARITY_COMPACT_THRESHOLD = int(os.getenv("SIMILARITY_COMPACT_THRESHOLD", "20000"))
+PHONE_REGION = os.getenv("PHONE_REGION", "US")
+PHONE_COUNTRY_CODE = os.getenv("PHONE_COUNTRY_CODE", "1")
+
+NUM_PERM, BANDS = 64, 16
+ROWS = NUM_PERM // BANDS
+NGRAM = 3
+SIGNATURE_BATCH = 2048  # values hashed per NumPy pass
+MATCH_BATCH = 256       # users looked up per NumPy pass
+
+# -- normalization -------------------------------------------------------
+
+def normalize_email(value):
+    """Lowercased, without a +tag; Gmail addresses also without dots."""
+    value = value.strip().lower()
+    local, at, domain = value.rpartition("@")
+    if not at:
+        return value or None
+    local = local.split("+", 1)[0]
+    if domain in ("gmail.com", "googlemail.com"):
+        local, domain = local.replace(".", ""), "gmail.com"
+    return f"{local}@{domain}"
+
+_EXTENSION = re.compile(r"\s*(?:ext\.?|x|#)\s*\d+\s*$", re.IGNORECASE)
+
+def normalize_phone(value):
+    """E.164 (`+15550100123`), without any extension; None if there are no digits."""
+    if phonenumbers is not None:
+        try:
+            number = phonenumbers.parse(value, PHONE_REGION)
+            return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+        except phonenumbers.NumberParseException:
+            pass
+    text = _EXTENSION.sub("", value.strip())
+    digits = re.sub(r"\D", "", text)
+    if not digits:
+        return None
+    if text.startswith("+"):
+        return "+" + digits
+    if text.startswith("00"):
+        return "+" + digits[2:]
+    if text.startswith("011"):
+        return "+" + digits[3:]
+    if len(digits) == 10 and PHONE_COUNTRY_CODE == "1":
+        return "+1" + digits
+    if len(digits) == 11 and digits.startswith(PHONE_COUNTRY_CODE):
+        return "+" + digits
+    return "+" + PHONE_COUNTRY_CODE + digits
+
+# USPS-style abbreviations, so "Street" and "St." agree
+ADDRESS_WORDS = {
+    "street": "st", "avenue": "ave", "av": "ave", "road": "rd", "drive": "dr", "lane": "ln",
+    "boulevard": "blvd", "court": "ct", "place": "pl", "square": "sq", "terrace": "ter",
+    "parkway": "pkwy", "highway": "hwy", "circle": "cir", "trail": "trl", "crossing": "xing",
+    "expressway": "expy", "freeway": "fwy", "heights": "hts", "junction": "jct", "mount": "mt",
+    "mountain": "mtn", "point": "pt", "port": "prt", "ridge": "rdg", "spring": "spg",
+    "springs": "spgs", "station": "sta", "valley": "vly", "view": "vw", "village": "vlg",
+    "suite": "ste", "apartment": "apt", "building": "bldg", "floor": "fl", "room": "rm",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+    "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+}
+
+def normalize_address(value):
+    """Lowercase words and numbers only, abbreviated, with repeats collapsed ("apt #4" -> "apt 4")."""
+    text = value.lower().replace("&", " and ").replace("#", " apt ")
+    words = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        word = ADDRESS_WORDS.get(word, word)
+        if not words or words[-1] != word:
+            words.append(word)
+    return " ".join(words) or None
+
+# attribute -> (normalizer, uses MinHash; otherwise exact on the normalized value)
+ATTRIBUTES = {
+    "email": (normalize_email, True),
+    "phone": (normalize_phone, False),
+    "address": (normalize_address, True),
+}
+
+# -- hashing -------------------------------------------------------------
+
+if np is not None:
+    _rng = np.random.default_rng(0x51D)
+    # Multiply-shift hash functions h(x) = (a * x + b) >> 32, with 64-bit wraparound
+    _A = (_rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1))[:, None]
+    _B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)[:, None]
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+    _FNV = np.uint64(0x100000001B3)
+    # Separates the bands inside the one sorted array
+    _BAND_SALT = (np.arange(BANDS, dtype=np.uint64) + np.uint64(1)) * np.uint64(0xD6E8FEB86659FD93)
+
+def value_hashes(values):
+    """Stable 64-bit hashes of strings (None -> 0)."""
+    return np.fromiter((0 if v is None else int.from_bytes(hashlib.blake2b(v.encode(), digest_size=8).digest(), "little")
+                        for v in values), np.uint64, len(values))
+
+def signatures(values):
+    """MinHash signatures (len(values) x NUM_PERM, low 8 bits) of the padded character 3-grams."""
+    out = np.empty((len(values), NUM_PERM), np.uint8)
+    for start in range(0, len(values), SIGNATURE_BATCH):
+        padded = [f" {v} " for v in values[start:start + SIGNATURE_BATCH]]
+        lengths = np.fromiter(map(len, padded), np.int64, len(padded))
+        codes = np.frombuffer("".join(padded).encode("utf-32-le"), np.uint32).astype(np.uint64)
+        grams = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+        # Keep only the grams that start and end inside one value
+        counts = lengths - (NGRAM - 1)
+        firsts = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(firsts - (np.cumsum(lengths) - lengths), counts)
+        hashed = (grams[positions] * _MIX) >> np.uint64(32)
+        permuted = ((hashed * _A + _B) >> np.uint64(32)).astype(np.uint32)
+        out[start:start + len(padded)] = np.minimum.reduceat(permuted, firsts, axis=1).T.astype(np.uint8)
+    return out
+
+def _band_keys(sigs):
+    """One hash per band of each signature (n x BANDS), salted by band."""
+    bands = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    keys = np.zeros(bands.shape[:2], np.uint64)
+    for row in range(ROWS):
+        keys = (keys ^ bands[..., row]) * _FNV
+    return keys ^ _BAND_SALT
+
+def estimate(sigs, others):
+    """Jaccard estimates of `sigs` against `others`, row by row (or one against each), corrected for the 8-bit hashes."""
+    agree = (others == sigs).mean(axis=-1)
+    return np.clip((agree - 1 / 256) / (1 - 1 / 256), 0.0, 1.0)
+
+# -- index ---------------------------------------------------------------
+
+class _Grow:
+    """Append-only NumPy array with amortised doubling."""
+    def __init__(self, width, dtype):
+        self.data = np.zeros((1024, width) if width else 1024, dtype)
+        self.n = 0
+
+    def extend(self, rows):
+        need = self.n + len(rows)
+        if need > len(self.data):
+            bigger = np.zeros((max(need, 2 * len(self.data)),) + self.data.shape[1:], self.data.dtype)
+            bigger[:self.n] = self.data[:self.n]
+            self.data = bigger
+        self.data[self.n:need] = rows
+        self.n = need
+
+    def view(self):
+        return self.data[:self.n]
+
+def _merge(keys, slots, new_keys, new_slots):
+    """Sorted (keys, slots) with the new pairs inserted after equal keys."""
+    order = np.argsort(new_keys, kind="stable")
+    at = np.searchsorted(keys, new_keys[order], side="right")
+    return np.insert(keys, at, new_keys[order]), np.insert(slots, at, new_slots[order].astype(np.int32))
+
+def _ranges(keys, slots, wanted, limit):
+    """(index into `wanted`, slot) for each slot stored under a wanted key, at most `limit` per key."""
+    lo = np.searchsorted(keys, wanted, side="left")
+    sizes = np.minimum(np.searchsorted(keys, wanted, side="right"), lo + limit) - lo
+    starts = np.cumsum(sizes) - sizes
+    positions = np.arange(sizes.sum()) - np.repeat(starts - lo, sizes)
+    return np.repeat(np.arange(len(wanted)), sizes), slots[positions]
+
+class _Buckets:
+    """Slots by band key, in a large sorted array plus a small sorted one for recent inserts.
+
+    Inserts are merged into the small array; it is merged into the large
+    one every SIMILARITY_COMPACT_THRESHOLD users, so an insert costs
+    O(threshold) copying, not O(N).
+    """
+    def __init__(self):
+        self.keys, self.slots = np.empty(0, np.uint64), np.empty(0, np.int32)
+        self.recent_keys, self.recent_slots = np.empty(0, np.uint64), np.empty(0, np.int32)
+        self.pending = 0
+
+    def add(self, keys, slots):
+        """Add `slots` under their rows of band `keys`."""
+        self.recent_keys, self.recent_slots = _merge(self.recent_keys, self.recent_slots, keys.ravel(),
+                                                     np.repeat(slots, keys.shape[1]))
+        self.pending += len(slots)
+        if self.pending >= SIMILARITY_COMPACT_THRESHOLD:
+            self.compact()
+
+    def bulk(self, keys, slots):
+        """Merge (key, slot) pairs straight into the large array."""
+        self.keys, self.slots = _merge(self.keys, self.slots, keys, slots)
+
+    def compact(self):
+        self.bulk(self.recent_keys, self.recent_slots)
+        self.recent_keys, self.recent_slots = np.empty(0, np.uint64), np.empty(0, np.int32)
+        self.pending = 0
+
+    def lookup(self, keys, limit=SIMILARITY_MAX_BUCKET):
+        """(row, slot) arrays: the slots sharing a band with each row of `keys`, at most `limit` per band."""
+        flat = keys.ravel()
+        old_rows, old_slots = _ranges(self.keys, self.slots, flat, limit)
+        new_rows, new_slots = _ranges(self.recent_keys, self.recent_slots, flat, limit)
+        rows = np.concatenate((old_rows, new_rows)) // keys.shape[1]
+        return rows, np.concatenate((old_slots, new_slots))
+
+    def groups(self, limit=SIMILARITY_MAX_BUCKET):
+        """Slot arrays of the buckets with 2 to `limit` members, for a full self-join."""
+        self.compact()
+        edges = np.flatnonzero(np.diff(self.keys)) + 1
+        starts = np.concatenate(([0], edges))
+        ends = np.concatenate((edges, [len(self.keys)]))
+        for a, b in zip(starts.tolist(), ends.tolist()):
+            if 2 <= b - a <= limit:
+                yield self.slots[a:b]
+
+    def nbytes(self):
+        return self.keys.nbytes + self.slots.nbytes + self.recent_keys.nbytes + self.recent_slots.nbytes
+
+class SimilarityIndex:
+    """Normalized attribute values of every user, with LSH buckets to find near-duplicates."""
+    def __init__(self, attributes=ATTRIBUTES, threshold=SIMILARITY_THRESHOLD):
+        if np is None:
+            raise RuntimeError("Similarity matching requires numpy (pip install numpy)")
+        self.attributes, self.threshold = attributes, threshold
+        self.keys = []          # slot -> user_id
+        self.slot_of = {}       # user_id -> current slot
+        self.alive = _Grow(0, np.bool_)
+        self.raw = {name: _Grow(0, np.uint64) for name in attributes}    # raw value hashes
+        self.sigs = {name: _Grow(NUM_PERM, np.uint8) for name, (_, fuzzy) in attributes.items() if fuzzy}
+        self.exact = {name: _Grow(0, np.uint64) for name, (_, fuzzy) in attributes.items() if not fuzzy}
+        self.buckets = {name: _Buckets() for name in attributes}
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        return user_id in self.slot_of
+
+    def _append(self, users):
+        """Store `users` in new slots; returns the first slot and, per attribute, (slots, band keys).
+
+        Only users with a value for the attribute are listed.
+        """
+        first = len(self.keys)
+        for i, user in enumerate(users):
+            old = self.slot_of.get(user["user_id"])
+            if old is not None:
+                self.alive.data[old] = False
+            self.slot_of[user["user_id"]] = first + i
+            self.keys.append(user["user_id"])
+        self.alive.extend(np.ones(len(users), np.bool_))
+        keys = {}
+        for name, (normalize, fuzzy) in self.attributes.items():
+            raw = [user.get(name) or None for user in users]
+            normalized = [normalize(v) if v else None for v in raw]
+            present = np.flatnonzero([v is not None for v in normalized])
+            values = [normalized[i] for i in present.tolist()]
+            self.raw[name].extend(value_hashes(raw))
+            if fuzzy:
+                sigs = np.zeros((len(users), NUM_PERM), np.uint8)
+                sigs[present] = signatures(values)
+                self.sigs[name].extend(sigs)
+                band_keys = _band_keys(sigs[present])
+            else:
+                hashes = value_hashes(normalized)
+                self.exact[name].extend(hashes)
+                band_keys = hashes[present, None]
+            keys[name] = (present + first, band_keys)
+        return first, keys
+
+    def _matches(self, name, slots, others):
+        """(slot, other, score) arrays of the distinct candidate pairs that match on attribute `name`.
+
+        Keeps the SIMILARITY_MAX_MATCHES best per slot.
+        """
+        pairs = np.unique((slots.astype(np.int64) << 32) | others.astype(np.int64))
+        slots, others = pairs >> 32, pairs & 0xFFFFFFFF
+        alive, raw = self.alive.data, self.raw[name].data
+        keep = (slots != others) & alive[slots] & alive[others] & (raw[slots] != raw[others])
+        slots, others = slots[keep], others[keep]
+        scores = np.empty(len(slots))
+        if name in self.sigs:
+            sigs = self.sigs[name].data
+            for i in range(0, len(slots), 100_000):
+                scores[i:i + 100_000] = estimate(sigs[slots[i:i + 100_000]], sigs[others[i:i + 100_000]])
+        else:
+            exact = self.exact[name].data
+            scores = (exact[slots] == exact[others]).astype(np.float64)
+        keep = scores >= self.threshold
+        slots, others, scores = slots[keep], others[keep], scores[keep]
+        # Rank within each slot, best first
+        order = np.lexsort((-scores, slots))
+        slots, others, scores = slots[order], others[order], scores[order]
+        firsts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+        rank = np.arange(len(slots)) - np.repeat(firsts, np.diff(np.r_[firsts, len(slots)]))
+        keep = rank < SIMILARITY_MAX_MATCHES
+        return slots[keep], others[keep], scores[keep]
+
+    def _rows(self, name, slots, others, scores):
+        keys = self.keys
+        return [_row(keys[a], keys[b], name, score)
+                for a, b, score in zip(slots.tolist(), others.tolist(), scores.tolist())]
+
+    def add_users(self, users):
+        """Index written users; returns their SIMILAR_ATTRIBUTE rows and the ids already indexed.
+
+        Each user is matched against everything indexed before it, users
+        earlier in the same batch included.
+        """
+        with self._lock:
+            replaced = [u["user_id"] for u in users if u["user_id"] in self.slot_of]
+            _, keys = self._append(users)
+            rows = []
+            for name, (slots, band_keys) in keys.items():
+                buckets = self.buckets[name]
+                buckets.add(band_keys, slots)
+                for start in range(0, len(slots), MATCH_BATCH):
+                    chunk = slice(start, start + MATCH_BATCH)
+                    found, others = buckets.lookup(band_keys[chunk])
+                    found = slots[chunk][found]
+                    earlier = others < found
+                    rows += self._rows(name, *self._matches(name, found[earlier], others[earlier]))
+            return rows, replaced
+
+    def build(self, users):
+        """Bulk-index `users` without matching them (see `pairs` for that)."""
+        with self._lock:
+            _, keys = self._append(users)
+            for name, (slots, band_keys) in keys.items():
+                self.buckets[name].bulk(band_keys.ravel(), np.repeat(slots, band_keys.shape[1]))
+        return self
+
+    def pairs(self):
+        """SIMILAR_ATTRIBUTE rows for every matching pair in the index (a full self-join)."""
+        rows = []
+        with self._lock:
+            for name, buckets in self.buckets.items():
+                slots, others = [], []
+                for members in buckets.groups():
+                    a, b = np.triu_indices(len(members), 1)
+                    # Larger slot first, as in add_users
+                    slots.append(np.maximum(members[a], members[b]))
+                    others.append(np.minimum(members[a], members[b]))
+                if slots:
+                    rows += self._rows(name, *self._matches(name, np.concatenate(slots), np.concatenate(others)))
+        return rows
+
+    def similar(self, user_id):
+        """Current matches of one user, best first."""
+        with self._lock:
+            slot = self.slot_of[user_id]
+            matches = []
+            for name, (_, fuzzy) in self.attributes.items():
+                if fuzzy:
+                    sig = self.sigs[name].data[slot:slot + 1]
+                    band_keys = _band_keys(sig) if sig.any() else None
+                else:
+                    band_keys = self.exact[name].data[slot:slot + 1, None]
+                    band_keys = band_keys if band_keys.any() else None
+                if band_keys is None:
+                    continue
+                _, others = self.buckets[name].lookup(band_keys)
+                _, others, scores = self._matches(name, np.full(len(others), slot), others)
+                matches += [{"user_id": self.keys[other], "attribute": name, "score": round(score, 3)}
+                            for other, score in zip(others.tolist(), scores.tolist())]
+        return sorted(matches, key=lambda m: -m["score"])
+
+    def rebuild(self, conn=None):
+        """Index every user in the database."""
+        conn = conn or db
+        fresh = SimilarityIndex(self.attributes, self.threshold)
+        batch = []
+        for record in conn.stream(ALL_USERS_QUERY):
+            batch.append(record)
+            if len(batch) == 100_000:
+                fresh.build(batch)
+                batch = []
+        fresh.build(batch)
+        with self._lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self.slot_of), "slots": len(self.keys), "threshold": self.threshold,
+                    "bucket_bytes": {name: b.nbytes() for name, b in self.buckets.items()},
+                    "signature_bytes": {name: s.data.nbytes for name, s in self.sigs.items()}}
+
+def _row(a, b, attribute, score):
+    a, b = min(a, b), max(a, b)
+    return {"a": a, "b": b, "attribute": attribute, "score": round(score, 3)}
+
+ALL_USERS_QUERY = "MATCH (u:User) RETURN u.user_id AS user_id, u.email AS email, u.phone AS phone, u.address AS address"
+
+# Drops the links of updated users before their new matches are written
+UNLINK_SIMILAR_QUERY = """
+UNWIND $rows AS key
+MATCH (:User {user_id: key})-[r:SIMILAR_ATTRIBUTE]-()
+DELETE r
+"""
+
+SIMILAR_ATTRIBUTE_QUERY = """
+UNWIND $rows AS row
+MATCH (a:User {user_id: row.a}), (b:User {user_id: row.b})
+MERGE (a)-[r:SIMILAR_ATTRIBUTE {attribute: row.attribute}]->(b)
+SET r.score = row.score
+"""
+
+index = SimilarityIndex() if SIMILARITY_ENABLED else None
+
+def record_users(users):
+    """Match written users against the index, if enabled: (SIMILAR_ATTRIBUTE rows, updated user ids)."""
+    if index is None:
+        return [], []
+    return index.add_users(users)
+
+def _chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def write_pairs(rows, conn=None, batch_size=INGEST_BATCH_SIZE):
+    conn = conn or db
+    for _ in conn.write_batches(SIMILAR_ATTRIBUTE_QUERY, _chunks(rows, batch_size)):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate user attributes in the database")
+    parser.add_argument("--write", action="store_true", help="write SIMILAR_ATTRIBUTE edges for every pair found")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    found = SimilarityIndex(threshold=args.threshold).rebuild()
+    indexed = time.perf_counter()
+    rows = found.pairs()
+    print(f"{found.stats()['users']} users indexed in {indexed - start:.1f}s, "
+          f"{len(rows)} pairs in {time.perf_counter() - indexed:.1f}s")
+    for attribute in ATTRIBUTES:
+        print(f"  {attribute}: {sum(1 for r in rows if r['attribute'] == attribute)}")
+    if args.write:
+        write_pairs(rows)
+        print("SIMILAR_ATTRIBUTE edges written")
@@ -0,0 +1,321 @@
+"""Columnar snapshots of the graph: export, restore, and read-only serving.
+
+A snapshot is a directory with one file per node label and per stored
+relationship type, in Hive-style partitions, plus a manifest:
+
+    snapshot/
+      manifest.json
+      nodes/label=User/part-0.parquet          user_id, name, email, ...
+      nodes/label=Transaction/part-0.parquet   txn_id, ..., sender_id, receiver_id
+      edges/type=SENT/part-0.parquet           source, target
+      edges/type=SIMILAR_ATTRIBUTE/part-0.parquet   source, target, attribute, score
+      ...
+
+Files are Parquet (zstd) or Arrow IPC (SNAPSHOT_FORMAT=arrow). Arrow IPC
+is larger but is read without decoding; use it with SNAPSHOT_COMPRESSION=none
+for zero-copy memory mapping. Export streams every label and
+relationship type from the driver cursor in SNAPSHOT_BATCH record batches,
+so memory stays bounded. The streams are separate read transactions, so
+pause writes for an exact snapshot. In the hub model the hub nodes and
+HAS_* relationships are exported instead of SHARED_ATTRIBUTE / LINKED.
+Properties the analytics jobs add later (component ids, layout
+positions) are not included.
+
+Restore goes through the bulk ingest path: users and transactions
+through `create_*_bulk` without detection (SENT / RECEIVED_BY come from
+the transactions' sender_id / receiver_id), then every other
+relationship type straight from its file in UNWIND batches. Nothing is
+recomputed. The manifest records the graph model, and a restore into
+the other model is refused.
+
+With SNAPSHOT_READONLY=<dir> the API does not connect to Neo4j. At
+startup it memory-maps the snapshot files and fills the in-memory
+indexes from them (projection, components, similarity, features). The
+analytics endpoints are served from those, and routes that need the
+database return 503.
+
+    python -m backend.snapshot export snapshots/today [--format arrow] [--compression none]
+    python -m backend.snapshot restore snapshots/today [--batch-size 10000]
+    python -m backend.snapshot info snapshots/today
+
+Needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for snapshots
+    pa = None
+
+from .database import db, GRAPH_MODEL, SNAPSHOT_READONLY
+from .hubs import USER_HUBS, TRANSACTION_HUBS, HUB_LABELS
+from . import crud
+
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "parquet")
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "zstd")
+SNAPSHOT_BATCH = int(os.getenv("SNAPSHOT_BATCH", "100000"))
+VERSION = 1
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Snapshots require pyarrow (pip install pyarrow)")
+
+# -- what is stored --------------------------------------------------------
+
+# label -> [(column, arrow type)]; transactions carry their sender and receiver
+NODE_COLUMNS = {
+    "User": [("user_id", "string"), ("name", "string"), ("email", "string"), ("phone", "string"),
+             ("address", "string"), ("payment_method", "string")],
+    "Transaction": [("txn_id", "string"), ("amount", "float64"), ("device_id", "string"),
+                    ("ip_address", "string"), ("timestamp", "int64"), ("sender_id", "string"),
+                    ("receiver_id", "string")],
+}
+if crud.HUB_MODEL:
+    NODE_COLUMNS.update({label: [("value", "string")] for label in HUB_LABELS})
+
+# Relationship properties kept per type; "attribute" also tells apart parallel edges
+EDGE_PROPERTIES = {"SIMILAR_ATTRIBUTE": [("attribute", "string"), ("score", "float64")]}
+
+def stored_edges():
+    """(type, source label, source key, target label, target key) of every relationship type stored."""
+    edges = [spec[:5] for spec in crud.GRAPH_EDGES
+             if not (crud.HUB_MODEL and spec[0] in ("SHARED_ATTRIBUTE", "LINKED"))]
+    if crud.HUB_MODEL:
+        edges += [(rel, "User", "user_id", hub, "value") for _, hub, rel in USER_HUBS]
+        edges += [(rel, "Transaction", "txn_id", hub, "value") for _, hub, rel in TRANSACTION_HUBS]
+    return edges
+
+def _schema(columns):
+    return pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+
+def _edge_columns(rel_type):
+    return [("source", "string"), ("target", "string")] + EDGE_PROPERTIES.get(rel_type, [])
+
+def node_export_query(label):
+    if label == "Transaction":
+        return """
+MATCH (n:Transaction)
+OPTIONAL MATCH (s:User)-[:SENT]->(n)
+OPTIONAL MATCH (n)-[:RECEIVED_BY]->(r:User)
+RETURN n.txn_id AS txn_id, n.amount AS amount, n.device_id AS device_id, n.ip_address AS ip_address,
+       n.timestamp AS timestamp, s.user_id AS sender_id, r.user_id AS receiver_id
+"""
+    return f"MATCH (n:{label}) RETURN " + ", ".join(f"n.{name} AS {name}" for name, _ in NODE_COLUMNS[label])
+
+def edge_export_query(rel_type, src_label, src_key, dst_label, dst_key):
+    props = "".join(f", r.{name} AS {name}" for name, _ in EDGE_PROPERTIES.get(rel_type, []))
+    return (f"MATCH (a:{src_label})-[r:{rel_type}]->(b:{dst_label}) "
+            f"RETURN a.{src_key} AS source, b.{dst_key} AS target{props}")
+
+def edge_restore_query(rel_type, src_label, src_key, dst_label, dst_key):
+    props = [name for name, _ in EDGE_PROPERTIES.get(rel_type, [])]
+    merge_key = " {attribute: row.attribute}" if "attribute" in props else ""
+    sets = [f"r.{name} = row.{name}" for name in props if name != "attribute"]
+    query = f"""
+UNWIND $rows AS row
+MATCH (a:{src_label} {{{src_key}: row.source}}), (b:{dst_label} {{{dst_key}: row.target}})
+MERGE (a)-[r:{rel_type}{merge_key}]->(b)
+"""
+    return query + (f"SET {', '.join(sets)}\n" if sets else "")
+
+def hub_restore_query(label):
+    return f"UNWIND $rows AS row MERGE (:{label} {{value: row.value}})"
+
+# -- files -----------------------------------------------------------------
+
+def _partition(kind, name, fmt):
+    column = "label" if kind == "nodes" else "type"
+    return os.path.join(kind, f"{column}={name}", f"part-0.{EXTENSIONS[fmt]}")
+
+class _Writer:
+    """One partition file, written batch by batch."""
+    def __init__(self, path, schema, fmt, compression):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.schema, self.rows = schema, 0
+        codec = None if compression == "none" else compression
+        if fmt == "parquet":
+            self.writer = pq.ParquetWriter(path, schema, compression=codec or "none")
+        else:
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = ipc.new_file(self.sink, schema, options=ipc.IpcWriteOptions(compression=codec))
+
+    def write(self, records):
+        if records:
+            self.writer.write_batch(pa.RecordBatch.from_pylist(records, schema=self.schema))
+            self.rows += len(records)
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+
+def _export(conn, query, path, schema, fmt, compression, batch_size):
+    writer = _Writer(path, schema, fmt, compression)
+    try:
+        batch = []
+        for record in conn.stream(query):
+            batch.append(record)
+            if len(batch) == batch_size:
+                writer.write(batch)
+                batch = []
+        writer.write(batch)
+    finally:
+        writer.close()
+    return writer.rows
+
+def export(out_dir, fmt=SNAPSHOT_FORMAT, compression=SNAPSHOT_COMPRESSION, batch_size=SNAPSHOT_BATCH, conn=None):
+    """Stream every node label and relationship type into `out_dir`; returns the manifest.
+
+    Files are written to `<out_dir>.partial` and moved into place at the
+    end, so an interrupted export never leaves a directory that looks complete.
+    """
+    _require_pyarrow()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown snapshot format {fmt!r}, expected one of {sorted(EXTENSIONS)}")
+    conn = conn or db
+    partial = f"{out_dir.rstrip(os.sep)}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    manifest = {"version": VERSION, "created": int(time.time() * 1000), "graph_model": GRAPH_MODEL,
+                "format": fmt, "compression": compression, "nodes": {}, "edges": {}}
+    start = time.perf_counter()
+    for label, columns in NODE_COLUMNS.items():
+        path = _partition("nodes", label, fmt)
+        rows = _export(conn, node_export_query(label), os.path.join(partial, path), _schema(columns), fmt,
+                       compression, batch_size)
+        manifest["nodes"][label] = {"path": path, "rows": rows}
+    for spec in stored_edges():
+        path = _partition("edges", spec[0], fmt)
+        rows = _export(conn, edge_export_query(*spec), os.path.join(partial, path),
+                       _schema(_edge_columns(spec[0])), fmt, compression, batch_size)
+        manifest["edges"][spec[0]] = {"source": spec[1:3], "target": spec[3:5], "path": path, "rows": rows}
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+    manifest["bytes"] = sum(os.path.getsize(os.path.join(partial, part["path"]))
+                            for part in [*manifest["nodes"].values(), *manifest["edges"].values()])
+    with open(os.path.join(partial, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(partial, out_dir)
+    return manifest
+
+# -- reading -----------------------------------------------------------------
+
+def read_manifest(snapshot_dir):
+    with open(os.path.join(snapshot_dir, "manifest.json")) as handle:
+        manifest = json.load(handle)
+    if manifest.get("version") != VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')}, expected {VERSION}")
+    return manifest
+
+def batches(snapshot_dir, part, batch_size=SNAPSHOT_BATCH):
+    """Record batches of one partition file, read through a memory map."""
+    _require_pyarrow()
+    source = pa.memory_map(os.path.join(snapshot_dir, part["path"]))
+    if part["path"].endswith(".parquet"):
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_size)
+    else:
+        reader = ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+
+def records(snapshot_dir, part, batch_size=SNAPSHOT_BATCH):
+    """Rows of one partition as lists of dicts, a batch at a time."""
+    for batch in batches(snapshot_dir, part, batch_size):
+        yield batch.to_pylist()
+
+# -- restore -----------------------------------------------------------------
+
+def _report(name, rows, seconds):
+    print(f"{name}: {rows} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s)")
+
+def restore(snapshot_dir, batch_size=None, bootstrap=True):
+    """Write a snapshot into the database through the bulk path; returns rows per partition."""
+    from .schema import bootstrap_schema
+
+    manifest = read_manifest(snapshot_dir)
+    if manifest["graph_model"] != GRAPH_MODEL:
+        raise RuntimeError(f"Snapshot is of the {manifest['graph_model']} graph model, "
+                           f"the database uses {GRAPH_MODEL} (GRAPH_MODEL)")
+    if bootstrap:
+        # The MERGEs below look nodes up by key, so the constraints must exist first
+        bootstrap_schema()
+    restored = {}
+    bulk = {"User": crud.create_users_bulk, "Transaction": crud.create_transactions_bulk}
+    for label, part in manifest["nodes"].items():
+        start, rows = time.perf_counter(), 0
+        for chunk in records(snapshot_dir, part):
+            if label in bulk:
+                bulk[label](chunk, batch_size, detect=False)
+            else:
+                crud._ingest(hub_restore_query(label), chunk, batch_size)
+            rows += len(chunk)
+        restored[label] = rows
+        _report(label, rows, time.perf_counter() - start)
+    for spec in stored_edges():
+        part = manifest["edges"].get(spec[0])
+        if part is None or spec[0] in crud.STRUCTURAL_EDGES:
+            continue  # SENT / RECEIVED_BY were written with the transactions
+        start, rows = time.perf_counter(), 0
+        for chunk in records(snapshot_dir, part):
+            crud._ingest(edge_restore_query(*spec), chunk, batch_size)
+            rows += len(chunk)
+        restored[spec[0]] = rows
+        _report(spec[0], rows, time.perf_counter() - start)
+    return restored
+
+# -- read-only serving ---------------------------------------------------------
+
+def serve(snapshot_dir=SNAPSHOT_READONLY):
+    """Fill the enabled in-memory indexes from a snapshot instead of the database; returns its manifest."""
+    from . import projection, components, similarity, features
+
+    manifest = read_manifest(snapshot_dir)
+    for chunk in records(snapshot_dir, manifest["nodes"]["User"]):
+        projection.record_users(chunk)
+        components.record_users(chunk)
+        if similarity.index is not None:
+            similarity.index.build(chunk)
+    for chunk in records(snapshot_dir, manifest["nodes"]["Transaction"]):
+        projection.record_transactions(chunk)
+        components.record_transactions(chunk)
+        features.record_transactions(chunk)
+    if projection.projection is not None:
+        with projection.projection._lock:
+            projection.projection.compact()
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export, restore or describe a graph snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_args = commands.add_parser("export", help="stream the database into a snapshot directory")
+    export_args.add_argument("dir")
+    export_args.add_argument("--format", choices=sorted(EXTENSIONS), default=SNAPSHOT_FORMAT)
+    export_args.add_argument("--compression", default=SNAPSHOT_COMPRESSION, help="zstd, lz4, snappy (parquet) or none")
+    export_args.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH)
+    restore_args = commands.add_parser("restore", help="write a snapshot into the database")
+    restore_args.add_argument("dir")
+    restore_args.add_argument("--batch-size", type=int, default=None, help="rows per write transaction")
+    restore_args.add_argument("--no-schema", action="store_true", help="skip creating constraints and indexes")
+    info_args = commands.add_parser("info", help="print a snapshot's manifest")
+    info_args.add_argument("dir")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export(args.dir, args.format, args.compression, args.batch_size)
+        print(f"Snapshot written to {args.dir} in {manifest['seconds']}s ({manifest['bytes'] / 2**20:.1f} MiB)")
+        for kind in ("nodes", "edges"):
+            for name, part in manifest[kind].items():
+                print(f"  {name}: {part['rows']}")
+    elif args.command == "restore":
+        start = time.perf_counter()
+        restored = restore(args.dir, args.batch_size, bootstrap=not args.no_schema)
+        print(f"Restored {sum(restored.values())} rows in {time.perf_counter() - start:.1f}s")
+    else:
+        print(json.dumps(read_manifest(args.dir), indent=2))
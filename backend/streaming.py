@@ -0,0 +1,63 @@
+"""Incremental encoders that turn record iterators into response chunks.
+
+Rows are encoded as they arrive and flushed every CHUNK_SIZE characters,
+so memory stays constant in the result size and the first chunk goes out
+as soon as the first rows are available. Every encoder accepts a plain
+iterator or an async iterator (and then returns an async generator).
+"""
+import csv
+import io
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+def _dumps(value):
+    return json.dumps(value, default=str)
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+def _chunked(items, head, encode, tail):
+    if head:
+        yield head
+    chunk, size = [], 0
+    for i, item in enumerate(items):
+        text = encode(i, item)
+        chunk.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    chunk.append(tail)
+    yield "".join(chunk)
+
+async def _achunked(items, head, encode, tail):
+    if head:
+        yield head
+    chunk, size, i = [], 0, 0
+    async for item in items:
+        text = encode(i, item)
+        i += 1
+        chunk.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    chunk.append(tail)
+    yield "".join(chunk)
+
+def _encode(items, head, encode, tail):
+    if hasattr(items, "__aiter__"):
+        return _achunked(items, head, encode, tail)
+    return _chunked(items, head, encode, tail)
+
+def csv_chunks(header, rows):
+    return _encode(rows, _csv_line(header), lambda i, row: _csv_line([row.get(f) for f in header]), "")
+
+def ndjson_chunks(items):
+    return _encode(items, "", lambda i, item: _dumps(item) + "\n", "")
+
+def json_array_chunks(items):
+    return _encode(items, "[", lambda i, item: ("," if i else "") + _dumps(item), "]")
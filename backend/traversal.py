@@ -0,0 +1,282 @@
+"""Bounded breadth-first traversal of the stored graph.
+
+Shortest paths and neighbourhoods are expanded one BFS layer at a time
+from Python, with one batched Cypher query per chunk of frontier nodes.
+Cypher's variable-length `[*]` patterns are not used. Each search stops
+at whichever limit it reaches first:
+
+- `max_depth`: relationships on the path, or the neighbourhood radius
+  (TRAVERSAL_MAX_DEPTH, 6);
+- `types`: relationship types that may be followed (default: all of
+  REL_TYPES);
+- `budget`: distinct nodes visited (TRAVERSAL_NODE_BUDGET, 10000);
+- `timeout`: seconds for the whole search (TRAVERSAL_TIMEOUT, 5). It is
+  also passed to every query as a transaction timeout, so one query
+  cannot outlive the search;
+- `degree_cap`: nodes with more relationships than this (shared IPs,
+  devices, hub values) can be reached but are never expanded
+  (TRAVERSAL_DEGREE_CAP, 1000).
+
+A search that stops early returns what it has, with `truncated` set and
+`reason` one of "budget", "timeout", "depth" or "degree_cap". Degrees
+are read with the neighbours, so the frontier is packed into queries
+whose total degree fits in the remaining budget.
+
+Shortest paths are bidirectional: each round expands the smaller of the
+two frontiers, so on a branching graph about half the depth is explored
+from each end. The searches are generators that yield
+`(query, params, timeout)` and receive the rows. `run` drives them on a
+Neo4jConnection and `arun` on an AsyncNeo4jConnection.
+"""
+from functools import lru_cache
+import os
+import time
+
+from neo4j.exceptions import Neo4jError
+
+from .database import db, async_db, GRAPH_MODEL
+from .hubs import USER_HUBS, TRANSACTION_HUBS
+from .similarity import SIMILARITY_ENABLED
+
+MAX_DEPTH = int(os.getenv("TRAVERSAL_MAX_DEPTH", "6"))
+NODE_BUDGET = int(os.getenv("TRAVERSAL_NODE_BUDGET", "10000"))
+TIMEOUT = float(os.getenv("TRAVERSAL_TIMEOUT", "5"))
+DEGREE_CAP = int(os.getenv("TRAVERSAL_DEGREE_CAP", "1000"))
+BATCH = 1000  # frontier nodes per expansion query
+CAPPED_SAMPLE = 100  # capped node ids listed in a result
+
+# Relationship types stored in the current graph model
+REL_TYPES = ["SENT", "RECEIVED_BY"] + (
+    [rel for _, _, rel in USER_HUBS + TRANSACTION_HUBS] if GRAPH_MODEL == "hub"
+    else ["SHARED_ATTRIBUTE", "LINKED"]
+) + (["SIMILAR_ATTRIBUTE"] if SIMILARITY_ENABLED else [])
+
+def rel_types(types=None):
+    """`types` checked against REL_TYPES, in REL_TYPES order; all of them when empty."""
+    if not types:
+        return tuple(REL_TYPES)
+    unknown = set(types) - set(REL_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown relationship types {sorted(unknown)}, expected some of {REL_TYPES}")
+    return tuple(t for t in REL_TYPES if t in types)
+
+@lru_cache(maxsize=None)
+def seed_query(types):
+    """Element id and degree of each user or transaction in `$keys`."""
+    rels = "|".join(types)
+    return f"""
+UNWIND $keys AS key
+CALL {{
+  WITH key MATCH (n:User {{user_id: key}}) RETURN n
+  UNION
+  WITH key MATCH (n:Transaction {{txn_id: key}}) RETURN n
+}}
+RETURN key, elementId(n) AS id, COUNT {{ (n)-[:{rels}]-() }} AS degree
+"""
+
+@lru_cache(maxsize=None)
+def expand_query(types):
+    """Neighbours of the nodes in `$ids` over `types`, with their own degree."""
+    rels = "|".join(types)
+    return f"""
+UNWIND $ids AS id
+MATCH (n) WHERE elementId(n) = id
+MATCH (n)-[:{rels}]-(m)
+WITH DISTINCT id, m
+RETURN id, elementId(m) AS neighbour, coalesce(m.user_id, m.txn_id, m.value) AS key,
+       COUNT {{ (m)-[:{rels}]-() }} AS degree
+"""
+
+class _Walk:
+    """Nodes seen by one search and the limits it runs under."""
+    def __init__(self, types, budget, timeout, degree_cap):
+        self.types = rel_types(types)
+        self.budget, self.degree_cap = budget, degree_cap
+        self.deadline = time.monotonic() + timeout
+        self.keys = {}      # element id -> user_id / txn_id / hub value
+        self.degrees = {}   # element id -> degree over `types`
+        self.capped = []
+        self.reason = None
+
+    def _remaining(self):
+        return self.deadline - time.monotonic()
+
+    def _fetch(self, query, params):
+        """Yield one query; rows, or None once the deadline has passed."""
+        remaining = self._remaining()
+        if remaining <= 0:
+            self.reason = "timeout"
+            return None
+        try:
+            return (yield query, params, remaining)
+        except TimeoutError:
+            self.reason = "timeout"
+            return None
+
+    def seed(self, keys):
+        """Element ids of `keys` that exist, by key."""
+        rows = yield from self._fetch(seed_query(self.types), {"keys": list(keys)})
+        ids = {}
+        for row in rows or ():
+            self.keys[row["id"]], self.degrees[row["id"]] = row["key"], row["degree"]
+            ids[row["key"]] = row["id"]
+        return ids
+
+    def expand(self, frontier, parent):
+        """The next BFS layer: nodes adjacent to `frontier` that are not in `parent`.
+
+        New nodes are added to `parent`, pointing at the node they were
+        reached from. Stops early, setting `reason`, on the budget or the
+        deadline.
+        """
+        expandable = []
+        for node in frontier:
+            if self.degrees[node] > self.degree_cap:
+                self.capped.append(self.keys[node])
+            else:
+                expandable.append(node)
+        layer = []
+        i = 0
+        while i < len(expandable) and self.reason is None:
+            room = self.budget - len(self.keys)
+            if room <= 0:
+                self.reason = "budget"
+                break
+            chunk, cost = [], 0
+            while i < len(expandable) and len(chunk) < BATCH:
+                degree = self.degrees[expandable[i]]
+                if chunk and cost + degree > room:
+                    break
+                chunk.append(expandable[i])
+                cost += degree
+                i += 1
+            rows = yield from self._fetch(expand_query(self.types), {"ids": chunk})
+            for row in rows or ():
+                node = row["neighbour"]
+                if node in parent:
+                    continue
+                if node not in self.keys:
+                    # Nodes seen already (e.g. by the other side) cost nothing
+                    if len(self.keys) >= self.budget:
+                        self.reason = "budget"
+                        continue
+                    self.keys[node], self.degrees[node] = row["key"], row["degree"]
+                parent[node] = row["id"]
+                layer.append(node)
+        return layer
+
+    def result(self, **fields):
+        return {**fields, "truncated": self.reason is not None, "reason": self.reason,
+                "visited": len(self.keys), "capped": self.capped[:CAPPED_SAMPLE]}
+
+def shortest_path_search(u1, u2, types=None, max_depth=MAX_DEPTH, budget=NODE_BUDGET, timeout=TIMEOUT,
+                         degree_cap=DEGREE_CAP):
+    """Bidirectional BFS between users or transactions `u1` and `u2`.
+
+    Returns {"path": [ids] or None, "length", "truncated", "reason",
+    "visited", "capped"}, or None if either end does not exist.
+    """
+    walk = _Walk(types, budget, timeout, degree_cap)
+    ids = yield from walk.seed([u1, u2])
+    if walk.reason:
+        return walk.result(path=None, length=None)
+    if u1 not in ids or u2 not in ids:
+        return None
+    start, goal = ids[u1], ids[u2]
+    if start == goal:
+        return walk.result(path=[u1], length=0)
+    parents = ({start: None}, {goal: None})
+    frontiers = [[start], [goal]]
+    depth = 0
+    while frontiers[0] and frontiers[1] and walk.reason is None:
+        if depth >= max_depth:
+            walk.reason = "depth"
+            break
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        layer = yield from walk.expand(frontiers[side], parents[side])
+        depth += 1
+        other = parents[1 - side]
+        meet = next((node for node in layer if node in other), None)
+        if meet is not None:
+            # Found in the first layer that meets, so shortest even if the layer was cut short
+            walk.reason = None
+            path = _join(parents, meet)
+            return walk.result(path=[walk.keys[node] for node in path], length=len(path) - 1)
+        frontiers[side] = layer
+    if walk.reason is None and walk.capped:
+        walk.reason = "degree_cap"
+    return walk.result(path=None, length=None)
+
+def _join(parents, meet):
+    """Path start -> meet -> goal from the two parent maps."""
+    head, node = [], meet
+    while node is not None:
+        head.append(node)
+        node = parents[0][node]
+    tail, node = [], parents[1][meet]
+    while node is not None:
+        tail.append(node)
+        node = parents[1][node]
+    return head[::-1] + tail
+
+def neighbourhood_search(key, depth=1, types=None, budget=NODE_BUDGET, timeout=TIMEOUT, degree_cap=DEGREE_CAP):
+    """Nodes within `depth` relationships of `key`.
+
+    Returns {"nodes": {id: distance}, "truncated", "reason", "visited",
+    "capped"}, or None if `key` does not exist.
+    """
+    walk = _Walk(types, budget, timeout, degree_cap)
+    ids = yield from walk.seed([key])
+    if walk.reason:
+        return walk.result(nodes={})
+    if key not in ids:
+        return None
+    start = ids[key]
+    parent, distance = {start: None}, {start: 0}
+    frontier = [start]
+    for level in range(1, depth + 1):
+        if not frontier or walk.reason is not None:
+            break
+        frontier = yield from walk.expand(frontier, parent)
+        for node in frontier:
+            distance[node] = level
+    if walk.reason is None and walk.capped:
+        walk.reason = "degree_cap"
+    return walk.result(nodes={walk.keys[node]: d for node, d in distance.items()})
+
+def _timed_out(error):
+    return "TransactionTimedOut" in (error.code or "")
+
+def run(search, conn=None):
+    """Drive a search generator on a Neo4jConnection and return its result."""
+    conn = conn or db
+    try:
+        query, params, timeout = next(search)
+        while True:
+            try:
+                rows = conn.query(query, params, timeout=timeout)
+            except Neo4jError as e:
+                if not _timed_out(e):
+                    raise
+                query, params, timeout = search.throw(TimeoutError())
+            else:
+                query, params, timeout = search.send(rows)
+    except StopIteration as done:
+        return done.value
+
+async def arun(search, conn=None):
+    """Async version of `run`, on an AsyncNeo4jConnection."""
+    conn = conn or async_db
+    try:
+        query, params, timeout = next(search)
+        while True:
+            try:
+                rows = await conn.query(query, params, timeout=timeout)
+            except Neo4jError as e:
+                if not _timed_out(e):
+                    raise
+                query, params, timeout = search.throw(TimeoutError())
+            else:
+                query, params, timeout = search.send(rows)
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,187 @@
+"""Compact columnar MessagePack encoding of graph pages and exports.
+
+Picked by content negotiation: clients sending `Accept: application/msgpack`
+get this instead of JSON. A graph page is one MessagePack map:
+
+    {"v": 1,
+     "strings": [...],                      # every string value, once
+     "nodes": {"count": n,
+               "id": i32[n],                # index into strings
+               "type": u8[n],               # index into "node_types"
+               "columns": {prop: column}},
+     "edges": {"count": m,
+               "source": i32[m], "target": i32[m],   # node row numbers
+               "type": u8[m]},              # index into "edge_types"
+     "node_types": ["user", "transaction"],
+     "edge_types": [[type, infix], ...],
+     "truncated": bool, "next": cursor}
+
+Integer and float arrays are raw little-endian bytes (MessagePack bin),
+so a browser decodes them with one typed-array view instead of parsing
+numbers. A column is `{"kind": "str", "data": i32[n]}` (string indices,
+-1 for missing), `{"kind": "num", "data": f64[n]}` (NaN for missing) or
+`{"kind": "raw", "data": [...]}`. Edge ids (`{source}-{infix}-{target}`)
+and labels are rebuilt by the client, see `decodeGraph` in
+frontend/index.html.
+
+Exports are a stream of such column batches, one map per EXPORT_BATCH
+rows, each with its own string table:
+
+    {"v": 1, "count": n, "strings": [...], "columns": {field: column}}
+
+Needs msgpack (pip install msgpack).
+"""
+from array import array
+from itertools import chain
+import math
+import sys
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for binary responses
+    msgpack = None
+
+from .crud import GRAPH_EDGES, NODE_KEYS
+
+MEDIA_TYPE = "application/msgpack"
+MEDIA_TYPES = (MEDIA_TYPE, "application/x-msgpack")
+EXPORT_BATCH = 10000
+
+NODE_TYPES = {"User": 0, "Transaction": 1}
+EDGE_TYPES = {spec[0]: i for i, spec in enumerate(GRAPH_EDGES)}
+
+def available():
+    return msgpack is not None
+
+def wants_msgpack(accept):
+    """True if the Accept header asks for MessagePack."""
+    return any(media.split(";")[0].strip() in MEDIA_TYPES for media in (accept or "").split(","))
+
+def _bytes(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+class _Strings:
+    """Interned string table."""
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def __call__(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def column(self, values):
+        """Table indices of `values` (strings or None), -1 for None."""
+        index = self.index
+        for value in dict.fromkeys(values):
+            if value is not None and value not in index:
+                index[value] = len(self.values)
+                self.values.append(value)
+        return array("i", [-1 if v is None else index[v] for v in values])
+
+def _column(values, strings):
+    kinds = set(map(type, values))
+    kinds.discard(type(None))
+    if kinds <= {str}:
+        return {"kind": "str", "data": _bytes(strings.column(values))}
+    if kinds <= {int, float}:
+        return {"kind": "num", "data": _bytes(array("d", [math.nan if v is None else v for v in values]))}
+    return {"kind": "raw", "data": values}
+
+class GraphEncoder:
+    """Accumulates graph rows (see crud.iter_graph_rows) into columns."""
+    def __init__(self):
+        self.strings = _Strings()
+        self.rows = {}                      # (label, key) -> node row
+        self.ids, self.types = array("i"), array("B")
+        self.props = []                     # node properties, one dict per node
+        self.source, self.target, self.edge_types = array("i"), array("i"), array("B")
+        self.truncated, self.next = False, None
+
+    def add(self, row):
+        kind = row[0]
+        if kind == "nodes":
+            _, label, props = row
+            key = props[NODE_KEYS[label]]
+            self.rows[label, key] = len(self.ids)
+            self.ids.append(self.strings(key))
+            self.types.append(NODE_TYPES[label])
+            self.props.append(props)
+        elif kind == "edges":
+            _, rel_type, _, a, b = row
+            code = EDGE_TYPES[rel_type]
+            _, src_label, _, dst_label, _, _ = GRAPH_EDGES[code]
+            self.source.append(self.rows[src_label, a])
+            self.target.append(self.rows[dst_label, b])
+            self.edge_types.append(code)
+        else:
+            _, self.truncated, self.next = row
+
+    def encode(self):
+        columns = _columns(self.props, None, self.strings)
+        return msgpack.packb({
+            "v": 1,
+            "strings": self.strings.values,
+            "nodes": {"count": len(self.ids), "id": _bytes(self.ids), "type": _bytes(self.types),
+                      "columns": columns},
+            "edges": {"count": len(self.source), "source": _bytes(self.source),
+                      "target": _bytes(self.target), "type": _bytes(self.edge_types)},
+            "node_types": ["user", "transaction"],
+            "edge_types": [[spec[0], spec[5]] for spec in GRAPH_EDGES],
+            "truncated": self.truncated,
+            "next": self.next,
+        }, default=str)
+
+def encode_graph(rows):
+    encoder = GraphEncoder()
+    for row in rows:
+        encoder.add(row)
+    return encoder.encode()
+
+async def aencode_graph(rows):
+    encoder = GraphEncoder()
+    async for row in rows:
+        encoder.add(row)
+    return encoder.encode()
+
+def _columns(records, fields, strings):
+    """Columns of `fields` (default: every key seen, in first-seen order) over `records`."""
+    fields = fields or list(dict.fromkeys(chain.from_iterable(records)))
+    return {name: _column([record.get(name) for record in records], strings) for name in fields}
+
+def _export_batch(records, fields):
+    strings = _Strings()
+    columns = _columns(records, fields, strings)
+    return msgpack.packb({"v": 1, "count": len(records), "strings": strings.values, "columns": columns},
+                         default=str)
+
+def export_chunks(records, fields=None):
+    """Records as a stream of column batches; `fields` defaults to the keys seen per batch."""
+    if hasattr(records, "__aiter__"):
+        return _aexport_chunks(records, fields)
+    return _export_chunks(records, fields)
+
+def _export_chunks(records, fields):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == EXPORT_BATCH:
+            yield _export_batch(batch, fields)
+            batch = []
+    if batch:
+        yield _export_batch(batch, fields)
+
+async def _aexport_chunks(records, fields):
+    batch = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) == EXPORT_BATCH:
+            yield _export_batch(batch, fields)
+            batch = []
+    if batch:
+        yield _export_batch(batch, fields)
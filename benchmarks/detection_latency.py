@@ -0,0 +1,81 @@
+"""Insert latency of `create_transaction` as the graph grows.
+
+Bulk-loads background transactions (without detection) up to each
+checkpoint, then times single inserts that go through the indexed
+LINKED detection. Each device/IP is shared by a fixed number of
+transactions, so the number of matches per insert stays constant and the
+latency should stay flat as the graph grows.
+
+    python -m benchmarks.detection_latency --checkpoints 1000 10000 100000 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from backend import crud
+from backend.database import db
+from backend.schema import bootstrap_schema
+
+USERS = 1000
+SHARE_FACTOR = 10
+
+def _users():
+    return [{"user_id": f"bench-u{i}", "name": f"Bench User {i}", "email": None,
+             "phone": None, "address": None, "payment_method": None}
+            for i in range(USERS)]
+
+def _transaction(i, prefix="bench-t"):
+    return {
+        "txn_id": f"{prefix}{i}",
+        "sender_id": f"bench-u{i % USERS}",
+        "receiver_id": f"bench-u{(i + 1) % USERS}",
+        "amount": round(random.uniform(5, 5000), 2),
+        "device_id": f"bench-d{i // SHARE_FACTOR}",
+        "ip_address": f"bench-ip{i // SHARE_FACTOR}",
+    }
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run(checkpoints, probes=200, batch_size=None):
+    db.query("MATCH (n) WHERE n.user_id STARTS WITH 'bench-' OR n.txn_id STARTS WITH 'bench-' DETACH DELETE n")
+    bootstrap_schema()
+    crud.create_users_bulk(_users(), batch_size, detect=False)
+
+    loaded = 0
+    results = []
+    for target in sorted(checkpoints):
+        crud.create_transactions_bulk([_transaction(i) for i in range(loaded, target)],
+                                      batch_size, detect=False)
+        loaded = target
+
+        latencies = []
+        for j in range(probes):
+            txn = _transaction(random.randrange(loaded), prefix=f"bench-p{target}-")
+            txn["txn_id"] += f"-{j}"
+            start = time.perf_counter()
+            crud.create_transaction(txn)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        row = {
+            "transactions": loaded,
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "max_ms": round(max(latencies), 2),
+        }
+        results.append(row)
+        print(f"{row['transactions']:>9} txns  p50 {row['p50_ms']:>7} ms  "
+              f"p95 {row['p95_ms']:>7} ms  max {row['max_ms']:>7} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkpoints", type=int, nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    run(args.checkpoints, args.probes, args.batch_size)
@@ -0,0 +1,323 @@
+"""In-process fake of Neo4jConnection for offline benchmarks.
+
+It does not parse Cypher: each statement the app issues (the crud query
+constants and builders) is mapped to a Python implementation over dicts,
+and anything else raises NotImplementedError. Results therefore measure
+the application side (query building, paging, encoding) plus a
+dictionary-backed store, not Neo4j itself. Only the pairwise graph model
+is supported for reads; of the hub model, the hub link statements and the
+migration to it are implemented. Hub nodes are keyed "<label>:<value>".
+"""
+import bisect
+import time
+
+from backend import crud, traversal, similarity, snapshot, components, hubs, migrate_hubs
+
+NODE_KEYS = crud.NODE_KEYS
+LABEL_OF_KEY = {key: label for label, key in NODE_KEYS.items()}
+
+class FakeConnection:
+    def __init__(self):
+        self.nodes = {"User": {}, "Transaction": {}}
+        self.out = {}   # rel type -> src key -> set of dst keys
+        self.inn = {}   # rel type -> dst key -> set of src keys
+        self.index = {}  # (label, attr) -> value -> set of keys
+        self.hubs = set()  # hub node keys
+        self._sorted = {}
+        self.handlers = self._handlers()
+
+    # -- storage ---------------------------------------------------------
+
+    def _upsert(self, label, props):
+        key = props[NODE_KEYS[label]]
+        old = self.nodes[label].get(key, {})
+        attrs = crud.USER_MATCH_ATTRIBUTES if label == "User" else crud.TRANSACTION_MATCH_ATTRIBUTES
+        for attr in attrs:
+            if old.get(attr) is not None:
+                self.index[(label, attr)][old[attr]].discard(key)
+            if props.get(attr) is not None:
+                self.index.setdefault((label, attr), {}).setdefault(props[attr], set()).add(key)
+        if key not in self.nodes[label]:
+            self._sorted.pop(label, None)
+        self.nodes[label][key] = props
+
+    def _link(self, rel_type, a, b):
+        self.out.setdefault(rel_type, {}).setdefault(a, set()).add(b)
+        self.inn.setdefault(rel_type, {}).setdefault(b, set()).add(a)
+
+    def _sorted_keys(self, label):
+        if label not in self._sorted:
+            self._sorted[label] = sorted(self.nodes[label])
+        return self._sorted[label]
+
+    # -- statements ------------------------------------------------------
+
+    def _create_user(self, p):
+        self._upsert("User", {k: p.get(k) for k in crud.USER_FIELDS})
+        return []
+
+    def _create_transaction(self, p):
+        props = {k: p.get(k) for k in ("txn_id", "amount", "device_id", "ip_address", "timestamp")}
+        self._upsert("Transaction", props)
+        if p["sender_id"] in self.nodes["User"] and p["receiver_id"] in self.nodes["User"]:
+            self._link("SENT", p["sender_id"], p["txn_id"])
+            self._link("RECEIVED_BY", p["txn_id"], p["receiver_id"])
+        return []
+
+    def _unlink(self, rel_type, key):
+        for a in self.inn.get(rel_type, {}).pop(key, ()):
+            self.out[rel_type][a].discard(key)
+        for b in self.out.get(rel_type, {}).pop(key, ()):
+            self.inn[rel_type][b].discard(key)
+        return []
+
+    def _edge_export(self, rel_type, src_label, src_key, dst_label, dst_key):
+        return lambda p: [{"source": a, "target": b} for a, targets in self.out.get(rel_type, {}).items()
+                          for b in targets]
+
+    def _edge_restore(self, rel_type):
+        return lambda r: self._link(rel_type, r["source"], r["target"]) or []
+
+    def _transaction_export(self, p):
+        sent, received = self.inn.get("SENT", {}), self.out.get("RECEIVED_BY", {})
+        return [{**t, "sender_id": next(iter(sent.get(k, ())), None),
+                 "receiver_id": next(iter(received.get(k, ())), None)}
+                for k, t in self.nodes["Transaction"].items()]
+
+    def _set_component(self, row):
+        for nodes in self.nodes.values():
+            if row["key"] in nodes:
+                nodes[row["key"]].update(component_id=row["id"], component_size=row["size"])
+        return []
+
+    def _rows(self, handler):
+        return lambda p: [row for r in p["rows"] for row in handler(r)]
+
+    def _detect(self, label, attrs, rel_type, window_ms=0):
+        def run(p):
+            for key in p["rows"]:
+                node = self.nodes[label].get(key)
+                if node is None:
+                    continue
+                for attr in attrs:
+                    if node.get(attr) is None:
+                        continue
+                    for other in self.index[(label, attr)][node[attr]]:
+                        if window_ms and not self._within(node, self.nodes[label][other], window_ms):
+                            continue
+                        # Undirected MERGE: one edge per pair, whichever end is detected first
+                        if other != key and other not in self.out.get(rel_type, {}).get(key, ()) \
+                                and key not in self.out.get(rel_type, {}).get(other, ()):
+                            self._link(rel_type, key, other)
+            return []
+        return run
+
+    @staticmethod
+    def _within(a, b, window_ms):
+        # As in Cypher, a missing timestamp never compares true
+        if a.get("timestamp") is None or b.get("timestamp") is None:
+            return False
+        return abs(a["timestamp"] - b["timestamp"]) <= window_ms
+
+    @staticmethod
+    def _in_window(label, node, p):
+        """Whether `node` passes the $since / $until filter of a windowed statement (users always do)."""
+        if label != "Transaction":
+            return True
+        since, until, ts = p.get("since"), p.get("until"), node.get("timestamp")
+        if since is None and until is None:
+            return True
+        return ts is not None and (since is None or ts >= since) and (until is None or ts < until)
+
+    def _hub_link(self, label, attr_hubs):
+        def run(p):
+            for key in p["rows"]:
+                node = self.nodes[label].get(key)
+                if node is None:
+                    continue
+                for _, _, rel in attr_hubs:
+                    for h in self.out.get(rel, {}).pop(key, ()):
+                        self.inn[rel][h].discard(key)
+                for attr, hub, rel in attr_hubs:
+                    if node.get(attr) is not None:
+                        self.hubs.add(f"{hub}:{node[attr]}")
+                        self._link(rel, key, f"{hub}:{node[attr]}")
+            return []
+        return run
+
+    def _edge_count(self, rel_type):
+        return sum(len(targets) for targets in self.out.get(rel_type, {}).values())
+
+    def _delete_edges(self, rel_type):
+        def run(p):
+            deleted = 0
+            out = self.out.get(rel_type, {})
+            for a in list(out):
+                while out[a] and deleted < p["limit"]:
+                    b = out[a].pop()
+                    self.inn[rel_type][b].discard(a)
+                    deleted += 1
+            return [{"deleted": deleted}]
+        return run
+
+    def _edges(self, rel_type, src_label, dst_label):
+        def run(p):
+            out, inn = self.out.get(rel_type, {}), self.inn.get(rel_type, {})
+            pairs = {(a, b) for a in p["src"] for b in out.get(a, ())}
+            pairs |= {(a, b) for b in p["dst"] for a in inn.get(b, ())}
+            rows = [{"a": self.nodes[src_label][a], "b": self.nodes[dst_label][b]} for a, b in pairs]
+            rows = [r for r in rows if self._in_window(src_label, r["a"], p) and self._in_window(dst_label, r["b"], p)]
+            return rows[:p["limit"]]
+        return run
+
+    def _scan(self, label):
+        def run(p):
+            keys = self._sorted_keys(label)
+            start = 0
+            if p.get("after") is not None:
+                start = bisect.bisect_right(keys, p["after"])
+            rows = []
+            for k in keys[start:]:
+                if len(rows) == p["limit"]:
+                    break
+                if self._in_window(label, self.nodes[label][k], p):
+                    rows.append({"n": self.nodes[label][k]})
+            return rows
+        return run
+
+    def _newest(self, p):
+        nodes = [n for n in self.nodes["Transaction"].values() if self._in_window("Transaction", n, p)]
+        if p.get("since") is not None or p.get("until") is not None:
+            nodes.sort(key=lambda n: n["timestamp"], reverse=True)
+        return [{"t": n} for n in nodes[:p["limit"]]]
+
+    def _seed(self, label):
+        def run(p):
+            node = self.nodes[label].get(p["seed"])
+            return [{"n": node}] if node else []
+        return run
+
+    def _export(self, label):
+        def run(p):
+            nodes = [n for n in self.nodes[label].values() if self._in_window(label, n, p)]
+            if p.get("limit"):
+                nodes = list(nodes)[:p["limit"]]
+            return [{"n": n} for n in nodes]
+        return run
+
+    def _neighbours(self, key):
+        for rels in (self.out, self.inn):
+            for adjacency in rels.values():
+                yield from adjacency.get(key, ())
+
+    def _degree(self, key):
+        return sum(1 for _ in self._neighbours(key))
+
+    # Node keys stand in for element ids; only the default (all) relationship types
+    def _traversal_seed(self, p):
+        return [{"key": key, "id": key, "degree": self._degree(key)}
+                for key in p["keys"] if key in self.nodes["User"] or key in self.nodes["Transaction"]]
+
+    def _traversal_expand(self, p):
+        return [{"id": key, "neighbour": n, "key": n, "degree": self._degree(n)}
+                for key in p["ids"] for n in set(self._neighbours(key))]
+
+    def _handlers(self):
+        handlers = {
+            crud.CREATE_USER_QUERY: self._create_user,
+            crud.CREATE_TRANSACTION_QUERY: self._create_transaction,
+            crud.UPSERT_USERS_QUERY: self._rows(self._create_user),
+            crud.UPSERT_TRANSACTIONS_QUERY: self._rows(self._create_transaction),
+            crud.DETECT_USERS_QUERY: self._detect("User", crud.USER_MATCH_ATTRIBUTES, "SHARED_ATTRIBUTE"),
+            crud.DETECT_TRANSACTIONS_QUERY: self._detect("Transaction", crud.TRANSACTION_MATCH_ATTRIBUTES, "LINKED",
+                                                         crud.LINK_WINDOW_MS),
+            similarity.SIMILAR_ATTRIBUTE_QUERY: self._rows(lambda r: self._link("SIMILAR_ATTRIBUTE", r["a"], r["b"]) or []),
+            similarity.UNLINK_SIMILAR_QUERY: self._rows(lambda key: self._unlink("SIMILAR_ATTRIBUTE", key)),
+            similarity.ALL_USERS_QUERY: lambda p: [{k: n.get(k) for k in ("user_id", "email", "phone", "address")}
+                                                   for n in self.nodes["User"].values()],
+            components.COMPONENT_IDS_QUERY: self._rows(self._set_component),
+            traversal.seed_query(traversal.rel_types()): self._traversal_seed,
+            traversal.expand_query(traversal.rel_types()): self._traversal_expand,
+        }
+        handlers["MATCH (u:User) RETURN u LIMIT $limit"] = lambda p: [{"u": n} for n in
+                                                                      list(self.nodes["User"].values())[:p["limit"]]]
+        # Event-time windows: the statement text depends only on which bounds are set
+        for window in (None, {"since": 0, "until": None}, {"since": None, "until": 0}, {"since": 0, "until": 0}):
+            handlers[crud.transactions_query(window)] = self._newest
+            for rel_type, src_label, src_key, dst_label, dst_key, _ in crud.GRAPH_EDGES:
+                query = crud._edge_query(rel_type, src_label, src_key, dst_label, dst_key, window)
+                handlers[query] = self._edges(rel_type, src_label, dst_label)
+            for label in NODE_KEYS:
+                handlers[crud._scan_query(label, None, window)] = self._scan(label)
+                handlers[crud._scan_query(label, "", window)] = self._scan(label)
+                handlers[crud.export_query(label, None, window)] = self._export(label)
+                handlers[crud.export_query(label, 1, window)] = self._export(label)
+        for spec in snapshot.stored_edges():
+            handlers[snapshot.edge_export_query(*spec)] = self._edge_export(*spec)
+            handlers[snapshot.edge_restore_query(*spec)] = self._rows(self._edge_restore(spec[0]))
+        handlers[snapshot.node_export_query("User")] = lambda p: [dict(n) for n in self.nodes["User"].values()]
+        handlers[snapshot.node_export_query("Transaction")] = self._transaction_export
+        for label in NODE_KEYS:
+            handlers[crud._seed_query(label)] = self._seed(label)
+        handlers[hubs.LINK_USERS_QUERY] = self._hub_link("User", hubs.USER_HUBS)
+        handlers[hubs.LINK_TRANSACTIONS_QUERY] = self._hub_link("Transaction", hubs.TRANSACTION_HUBS)
+        handlers.update({
+            migrate_hubs.REL_TYPES_QUERY: lambda p: [{"relationshipType": t} for t in self.out],
+            migrate_hubs.NODE_COUNT_QUERY: lambda p: [{"count": sum(map(len, self.nodes.values())) + len(self.hubs)}],
+            migrate_hubs.USER_KEYS_QUERY: lambda p: [{"key": k} for k in self.nodes["User"]],
+            migrate_hubs.TRANSACTION_KEYS_QUERY: lambda p: [{"key": k} for k in self.nodes["Transaction"]],
+        })
+        rel_types = {"SENT", "RECEIVED_BY", "SIMILAR_ATTRIBUTE", *migrate_hubs.PAIRWISE_TYPES}
+        rel_types.update(rel for _, _, rel in hubs.USER_HUBS + hubs.TRANSACTION_HUBS)
+        for rel_type in rel_types:
+            handlers[migrate_hubs.edge_count_query(rel_type)] = lambda p, t=rel_type: [{"count": self._edge_count(t)}]
+            handlers[migrate_hubs.delete_edges_query(rel_type)] = self._delete_edges(rel_type)
+        return handlers
+
+    # -- Neo4jConnection interface ----------------------------------------
+
+    def _run(self, query, parameters):
+        handler = self.handlers.get(query)
+        if handler is None:
+            raise NotImplementedError(f"FakeConnection does not implement: {' '.join(query.split())[:120]}")
+        return handler(parameters or {})
+
+    def query(self, query, parameters=None, timeout=None):
+        return self._run(query, parameters)
+
+    def stream(self, query, parameters=None):
+        yield from self._run(query, parameters)
+
+    def write_batches(self, query, batches):
+        for batch in batches:
+            start = time.perf_counter()
+            self._run(query, {"rows": batch})
+            yield len(batch), time.perf_counter() - start
+
+    def close(self):
+        pass
+
+class AsyncFakeConnection:
+    """AsyncNeo4jConnection interface over a FakeConnection (or any sync connection)."""
+    def __init__(self, conn=None):
+        self.conn = conn or FakeConnection()
+
+    async def query(self, query, parameters=None, timeout=None):
+        return self.conn.query(query, parameters, timeout)
+
+    async def stream(self, query, parameters=None):
+        for row in self.conn.stream(query, parameters):
+            yield row
+
+    async def write_batches(self, query, batches):
+        for batch in self.conn.write_batches(query, batches):
+            yield batch
+
+    async def close(self):
+        pass
+
+def install(conn=None):
+    """Point crud at `conn` (a new FakeConnection by default) and return it."""
+    conn = conn or FakeConnection()
+    crud.db = conn
+    return conn
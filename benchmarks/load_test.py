@@ -0,0 +1,136 @@
+"""Concurrent HTTP load test for the API.
+
+Opens `--concurrency` keep-alive connections and issues GET requests for
+`--duration` seconds, then reports throughput and latency percentiles.
+Uses only the standard library.
+
+    python -m benchmarks.load_test --url http://localhost:8000 --paths /users /graph -c 64
+
+`--stand-in` starts a local server in the same process that answers every
+request after `--latency-ms`, standing in for an API that waits on the
+database. It checks the harness itself and gives a ceiling to compare the
+real API against.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+async def _read_body(reader, headers):
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                return body
+            body += chunk[:-2]
+    return await reader.readexactly(int(headers.get("content-length", 0)))
+
+async def _request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.lower()] = value.strip().lower()
+    await _read_body(reader, headers)
+    return status
+
+async def _worker(host, port, paths, deadline, latencies, errors, offset):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status = await _request(reader, writer, host, path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append(path)
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            if status >= 400:
+                errors.append(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(url, paths, concurrency, duration):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(host, port, paths, deadline, latencies, errors, i) for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return {
+        "url": url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None,
+    }
+
+async def start_stand_in(port, latency_ms):
+    """Minimal keep-alive HTTP server answering `{}` after `latency_ms`."""
+    async def handle(reader, writer):
+        try:
+            while True:
+                if not (await reader.readline()).strip():
+                    break
+                while (await reader.readline()).strip():
+                    pass
+                await asyncio.sleep(latency_ms / 1000)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, "127.0.0.1", port)
+
+async def _main(args):
+    url = args.url
+    server = None
+    if args.stand_in:
+        server = await start_stand_in(args.stand_in_port, args.latency_ms)
+        url = f"http://127.0.0.1:{args.stand_in_port}"
+    try:
+        for concurrency in args.concurrency:
+            print(json.dumps(await run(url, args.paths, concurrency, args.duration)))
+    finally:
+        if server:
+            server.close()
+            await server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--paths", nargs="+", default=["/users", "/transactions", "/graph"])
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 8, 64, 256])
+    parser.add_argument("-d", "--duration", type=float, default=10)
+    parser.add_argument("--stand-in", action="store_true")
+    parser.add_argument("--stand-in-port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Memory per edge and query latency of the CSR projection vs a dict-of-sets.
+
+Builds the same synthetic user/transaction graph into
+`projection.GraphProjection` and into a `{key: set(neighbour keys)}`
+baseline, then reports adjacency bytes per edge and shortest-path / k-hop
+latencies. Needs numpy, no database.
+
+    python -m benchmarks.projection_memory --users 10000 --transactions 1000000
+"""
+import argparse
+from collections import deque
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from backend.projection import GraphProjection, USER_ATTRIBUTES, TRANSACTION_ATTRIBUTES
+
+def synthetic(users, transactions, share=20, seed=7):
+    rng = random.Random(seed)
+    user_rows = [{"user_id": f"u{i}", "email": f"e{i}", "phone": f"p{rng.randrange(users // 2 or 1)}",
+                  "address": f"a{rng.randrange(users // 2 or 1)}", "payment_method": None}
+                 for i in range(users)]
+    txn_rows = [{"txn_id": f"t{i}", "sender_id": f"u{rng.randrange(users)}",
+                 "receiver_id": f"u{rng.randrange(users)}",
+                 "device_id": f"d{rng.randrange(transactions // share or 1)}",
+                 "ip_address": f"ip{rng.randrange(transactions // share or 1)}"}
+                for i in range(transactions)]
+    return user_rows, txn_rows
+
+def dict_of_sets(user_rows, txn_rows):
+    adj = {}
+    def link(a, b):
+        adj.setdefault(a, set()).add(b)
+        adj.setdefault(b, set()).add(a)
+    for row in user_rows:
+        adj.setdefault(row["user_id"], set())
+        for attr in USER_ATTRIBUTES:
+            if row.get(attr) is not None:
+                link(row["user_id"], f"{attr}:{row[attr]}")
+    for row in txn_rows:
+        link(row["sender_id"], row["txn_id"])
+        link(row["txn_id"], row["receiver_id"])
+        for attr in TRANSACTION_ATTRIBUTES:
+            if row.get(attr) is not None:
+                link(row["txn_id"], f"{attr}:{row[attr]}")
+    return adj
+
+def _bfs(adj, a, b):
+    parent = {a: None}
+    queue = deque([a])
+    while queue:
+        v = queue.popleft()
+        if v == b:
+            return True
+        for n in adj[v]:
+            if n not in parent:
+                parent[n] = v
+                queue.append(n)
+    return False
+
+def _timed(fn, pairs):
+    samples = []
+    for pair in pairs:
+        start = time.perf_counter()
+        fn(*pair)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return round(statistics.median(samples), 1)
+
+def run(users, transactions, queries=50):
+    user_rows, txn_rows = synthetic(users, transactions)
+
+    proj = GraphProjection(transparent_hubs=False)
+    proj.add_users(user_rows)
+    proj.add_transactions(txn_rows)
+    proj.compact()
+    edges = len(proj.csr[1]) // 2
+
+    tracemalloc.start()
+    adj = dict_of_sets(user_rows, txn_rows)
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Keys are shared with the input rows except hub keys; count only containers
+    baseline_bytes -= sum(sys.getsizeof(k) for k in adj if ":" in k)
+
+    rng = random.Random(1)
+    pairs = [(f"u{rng.randrange(users)}", f"u{rng.randrange(users)}") for _ in range(queries)]
+    seeds = [(a, 2) for a, _ in pairs]
+    result = {
+        "vertices": len(proj.keys),
+        "edges": edges,
+        "csr_bytes": proj.memory_bytes(),
+        "csr_bytes_per_edge": round(proj.memory_bytes() / edges, 2),
+        "dict_of_sets_bytes": baseline_bytes,
+        "dict_of_sets_bytes_per_edge": round(baseline_bytes / edges, 2),
+        "csr_shortest_path_us": _timed(proj.shortest_path, pairs),
+        "dict_shortest_path_us": _timed(lambda a, b: _bfs(adj, a, b), pairs),
+        "csr_2hop_us": _timed(proj.k_hop, seeds),
+        "csr_degree_us": _timed(lambda a, _: proj.degree(a), seeds),
+    }
+    for key, value in result.items():
+        print(f"{key:<30} {value}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    run(args.users, args.transactions, args.queries)
@@ -0,0 +1,204 @@
+"""Reproducible benchmark suite.
+
+Runs each scenario for a fixed number of iterations against either the
+in-process FakeConnection (default, no network) or the configured Neo4j
+(`--target neo4j`) and writes latency percentiles as JSON. Each scenario
+is timed in `--rounds` rounds after a garbage collection; `best_p50_ms`
+is the fastest round's p50 and `spread` how far the slowest round's p50
+was above it. `--compare` checks the results against a stored baseline
+and exits non-zero when a scenario's best p50 regressed by more than
+`--threshold` plus the spread of either run. Sizes with a suspected
+regression are run again up to `--confirm` times, keeping each
+scenario's fastest run, so a one-off slow run is not reported.
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --compare bench.json --threshold 0.2
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from backend import crud, streaming, wire
+
+SIZES = (1_000, 10_000, 100_000)
+
+def _user(i):
+    return {"user_id": f"u{i:07d}", "name": f"User {i}", "email": f"user{i}@example.com",
+            "phone": f"+1555{i % 5000:07d}", "address": f"{i % 2000} Main St",
+            "payment_method": ("visa", "paypal", "bank", "mastercard")[i % 4]}
+
+def _transaction(i, users, rng):
+    sender, receiver = rng.sample(range(users), 2)
+    return {"txn_id": f"t{i:08d}", "sender_id": f"u{sender:07d}", "receiver_id": f"u{receiver:07d}",
+            "amount": round(rng.uniform(5, 5000), 2), "device_id": f"d{i // 20}", "ip_address": f"ip{i // 20}"}
+
+def populate(nodes, rng):
+    """Load `nodes` nodes (1 user per 10) through the bulk path, without detection."""
+    users = max(2, nodes // 10)
+    crud.create_users_bulk([_user(i) for i in range(users)], detect=False)
+    crud.create_transactions_bulk([_transaction(i, users, rng) for i in range(nodes - users)], detect=False)
+    return users
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(pick(50), 4),
+        "p90_ms": round(pick(90), 4),
+        "p99_ms": round(pick(99), 4),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+ROUNDS = 3
+
+def measure(fn, iterations, warmup=3, rounds=None):
+    """Percentiles of `iterations` calls of `fn(i)`, timed in `rounds` rounds."""
+    rounds = max(1, min(rounds or ROUNDS, iterations))
+    for i in range(warmup):
+        fn(i)
+    samples, p50s = [], []
+    for r in range(rounds):
+        gc.collect()
+        timed = []
+        for i in range(r * iterations // rounds, (r + 1) * iterations // rounds):
+            start = time.perf_counter()
+            fn(i)
+            timed.append((time.perf_counter() - start) * 1000)
+        samples += timed
+        p50s.append(statistics.median(timed))
+    best = min(p50s)
+    return {**_percentiles(samples), "best_p50_ms": round(best, 4),
+            "spread": round(max(p50s) / best - 1, 3) if best else 0.0}
+
+def _drain(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+def scenarios(nodes, users, rng, iterations):
+    """Yield (name, result) for every scenario at graph size `nodes`."""
+    base = 10_000_000
+    yield "create_user", measure(lambda i: crud.create_user(_user(base + nodes + i)), iterations)
+    yield "create_transaction", measure(
+        lambda i: crud.create_transaction(_transaction(base + nodes + i, users, rng)), iterations)
+    yield "detect_transaction_relationships", measure(
+        lambda i: crud.detect_transaction_relationships(f"t{rng.randrange(nodes - users):08d}"), iterations)
+    yield "detect_user_relationships", measure(
+        lambda i: crud.detect_user_relationships(f"u{rng.randrange(users):07d}"), iterations)
+    yield "get_graph_data_scan", measure(lambda i: crud.get_graph_data(node_limit=500), iterations)
+    yield "get_graph_data_seed_depth2", measure(
+        lambda i: crud.get_graph_data(seed=f"u{rng.randrange(users):07d}", depth=2, node_limit=500), iterations)
+    if wire.available():
+        yield "get_graph_msgpack_scan", measure(
+            lambda i: wire.encode_graph(crud.iter_graph_rows(node_limit=500)), iterations)
+        yield "export_transactions_msgpack", measure(
+            lambda i: _drain(wire.export_chunks(crud.iter_transactions())), max(3, iterations // 10))
+    yield "export_users_csv", measure(
+        lambda i: _drain(streaming.csv_chunks(crud.USER_FIELDS, crud.iter_users())), max(3, iterations // 10))
+    yield "export_transactions_json", measure(
+        lambda i: _drain(streaming.json_array_chunks(crud.iter_transactions())), max(3, iterations // 10))
+    yield "shortest_path", measure(
+        lambda i: crud.shortest_path(f"u{rng.randrange(users):07d}", f"u{rng.randrange(users):07d}"),
+        max(3, iterations // 10))
+
+def run(sizes, iterations, target, seed):
+    if target == "fake":
+        from benchmarks import fake_db
+    results = {}
+    for nodes in sizes:
+        rng = random.Random(seed)
+        if target == "fake":
+            fake_db.install()
+        else:
+            crud.db.query("MATCH (n) DETACH DELETE n")
+        users = populate(nodes, rng)
+        for name, result in scenarios(nodes, users, rng, iterations):
+            results[f"{name}@{nodes}"] = result
+            print(f"{name + '@' + str(nodes):<45} p50 {result['p50_ms']:>10} ms  p99 {result['p99_ms']:>10} ms",
+                  file=sys.stderr)
+    return {
+        "target": target,
+        "seed": seed,
+        "iterations": iterations,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+def _best_p50(result):
+    return result.get("best_p50_ms", result["p50_ms"])
+
+def compare(current, baseline, threshold, min_delta_ms=0.1):
+    """Scenarios whose best p50 grew by more than `threshold` (a fraction) over the baseline.
+
+    The allowed growth is widened by the round-to-round spread of either
+    run, and changes under `min_delta_ms` are ignored, so timer jitter on
+    microsecond scenarios is not reported. Baselines without `best_p50_ms`
+    are compared on `p50_ms`.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        now, then = _best_p50(result), _best_p50(before)
+        if not then:
+            continue
+        change = now / then - 1
+        allowed = threshold + max(result.get("spread", 0.0), before.get("spread", 0.0))
+        if change > allowed and now - then >= min_delta_ms:
+            regressions.append({"scenario": name, "baseline_p50_ms": then, "p50_ms": now,
+                                "change": round(change, 3), "allowed": round(allowed, 3)})
+    return regressions
+
+def keep_fastest(report, rerun):
+    """Replace the results of `report` that `rerun` measured faster."""
+    for name, result in rerun["results"].items():
+        before = report["results"].get(name)
+        if before is None or _best_p50(result) < _best_p50(before):
+            report["results"][name] = result
+
+def _sizes(regressions):
+    return sorted({int(r["scenario"].rsplit("@", 1)[1]) for r in regressions})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["fake", "neo4j"], default="fake")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="timing rounds per scenario")
+    parser.add_argument("--out", help="write results JSON here (default stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 growth, e.g. 0.2 = 20%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="ignore p50 changes smaller than this")
+    parser.add_argument("--confirm", type=int, default=2, help="reruns of the sizes with a suspected regression")
+    args = parser.parse_args()
+    ROUNDS = args.rounds
+
+    report = run(args.sizes, args.iterations, args.target, args.seed)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.threshold, args.min_delta_ms)
+        for _ in range(args.confirm):
+            if not report["regressions"]:
+                break
+            keep_fastest(report, run(_sizes(report["regressions"]), args.iterations, args.target, args.seed))
+            report["regressions"] = compare(report, baseline, args.threshold, args.min_delta_ms)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if report.get("regressions"):
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['scenario']}: p50 {r['baseline_p50_ms']} -> {r['p50_ms']} ms "
+                  f"(+{r['change']:.0%}, allowed +{r['allowed']:.0%})", file=sys.stderr)
+        sys.exit(1)
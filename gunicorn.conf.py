@@ -0,0 +1,31 @@
+"""gunicorn settings for running the API with several uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py backend.main:app
+
+Each worker runs the FastAPI lifespan on its own: it connects, pre-fills a
+pool of NEO4J_POOL_SIZE connections (NEO4J_TOTAL_POOL_SIZE split across
+WEB_CONCURRENCY workers by default) and runs the schema bootstrap, which
+only the first worker actually does (see schema.bootstrap_schema_once).
+Several workers need a shared cache (CACHE_BACKEND=redis) and the
+in-memory indexes off; the default is one worker otherwise.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# The memory cache and the in-memory indexes are per worker, and workers refuse
+# to start with them on (main.check_workers), so those default to one worker
+PER_WORKER_FLAGS = ("PROJECTION_ENABLED", "COMPONENTS_ENABLED", "SIMILARITY_ENABLED", "FEATURES_ENABLED")
+shared_state = os.getenv("CACHE_BACKEND", "memory") != "memory" and not any(
+    os.getenv(flag) == "1" for flag in PER_WORKER_FLAGS)
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() if shared_state else 1)))
+# Workers read WEB_CONCURRENCY to size their pools and pick the schema lock
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+# Startup waits for Neo4j (NEO4J_STARTUP_TIMEOUT) and may rebuild in-memory indexes
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+forwarded_allow_ips = "*"
+# The app is imported per worker; nothing connects at import time anyway
+preload_app = False
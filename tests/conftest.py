@@ -0,0 +1,25 @@
+import pytest
+
+from backend import async_crud, cache, crud
+from benchmarks import fake_db
+
+@pytest.fixture
+def lru(monkeypatch):
+    """A fresh in-process cache in place of the module-level one."""
+    fresh = cache.LRUCache(max_entries=100, ttl=60)
+    monkeypatch.setattr(cache, "cache", fresh)
+    return fresh
+
+@pytest.fixture
+def fake(monkeypatch):
+    """crud on an empty in-process FakeConnection."""
+    conn = fake_db.FakeConnection()
+    monkeypatch.setattr(crud, "db", conn)
+    return conn
+
+@pytest.fixture
+def async_fake(fake, monkeypatch):
+    """async_crud on the same FakeConnection as `fake`."""
+    conn = fake_db.AsyncFakeConnection(fake)
+    monkeypatch.setattr(async_crud, "async_db", conn)
+    return conn
@@ -0,0 +1,40 @@
+"""Regression checks of the benchmark suite (benchmarks/run.py)."""
+from benchmarks import run
+
+def _report(**p50s):
+    return {"results": {name: {"p50_ms": p50, "best_p50_ms": p50, "spread": 0.05} for name, p50 in p50s.items()}}
+
+BASELINE = _report(a=10.0, b=20.0, c=1.0, d=0.02)
+
+def test_a_slowdown_of_every_scenario_is_reported():
+    regressions = run.compare(_report(a=20.0, b=40.0, c=2.0, d=0.04), BASELINE, 0.2)
+    # d doubled too, but by less than --min-delta-ms
+    assert [(r["scenario"], r["change"]) for r in regressions] == [("a", 1.0), ("b", 1.0), ("c", 1.0)]
+
+def test_a_single_slower_scenario_is_reported():
+    regressions = run.compare(_report(a=10.0, b=40.0, c=1.0, d=0.02), BASELINE, 0.2)
+    assert [(r["scenario"], r["change"]) for r in regressions] == [("b", 1.0)]
+
+def test_noisy_rounds_widen_the_tolerance():
+    current = _report(a=14.0, b=20.0, c=1.0, d=0.02)
+    assert [r["scenario"] for r in run.compare(current, BASELINE, 0.2)] == ["a"]
+    current["results"]["a"]["spread"] = 0.5
+    assert run.compare(current, BASELINE, 0.2) == []
+
+def test_changes_under_the_minimum_delta_are_ignored():
+    assert run.compare(_report(a=10.0, b=20.0, c=1.0, d=0.06), BASELINE, 0.2) == []
+
+def test_baselines_without_rounds_compare_on_p50():
+    baseline = {"results": {name: {"p50_ms": result["p50_ms"]} for name, result in BASELINE["results"].items()}}
+    assert [r["scenario"] for r in run.compare(_report(a=10.0, b=30.0, c=1.0, d=0.02), baseline, 0.2)] == ["b"]
+
+def test_keep_fastest_drops_a_one_off_slow_run():
+    report = _report(a=10.0, b=40.0, c=1.0, d=0.02)
+    run.keep_fastest(report, _report(a=12.0, b=21.0, c=1.0, d=0.02))
+    assert report["results"]["a"]["best_p50_ms"] == 10.0 and report["results"]["b"]["best_p50_ms"] == 21.0
+    assert run.compare(report, BASELINE, 0.2) == []
+
+def test_measure_reports_rounds():
+    result = run.measure(lambda i: None, 9, warmup=0, rounds=3)
+    assert result["iterations"] == 9 and result["best_p50_ms"] <= result["p50_ms"] + 1e-3
+    assert result["spread"] >= 0
@@ -0,0 +1,84 @@
+"""Tag-based invalidation of the read-through cache (backend/cache.py)."""
+import asyncio
+
+from backend import cache, relationships, async_relationships
+
+ALICE = {"user_id": "A", "name": "Alice", "email": "a@x.com", "phone": "555-0101",
+         "address": "1 Main St", "payment_method": "card"}
+CAROL = {"user_id": "C", "name": "Carol", "email": "c@x.com", "phone": "555-0103",
+         "address": "1 Main St", "payment_method": "paypal"}
+# Shares only Alice's phone
+BOB = {"user_id": "B", "name": "Bob", "email": "b@x.com", "phone": "555-0101",
+       "address": "2 Oak Ave", "payment_method": "cash"}
+
+class RecordingDB:
+    """Answers every query with `rows` and counts the calls."""
+    def __init__(self, rows):
+        self.rows, self.calls = rows, 0
+
+    def query(self, query, parameters=None, timeout=None):
+        self.calls += 1
+        return self.rows
+
+class AsyncRecordingDB(RecordingDB):
+    async def query(self, query, parameters=None, timeout=None):
+        return RecordingDB.query(self, query, parameters, timeout)
+
+def test_entries_are_tagged_with_their_nodes_and_attributes(lru):
+    cache.read_through("user_txns:A", lambda: [{"u": ALICE}])
+    cache.read_through("user_txns:X", lambda: [{"u": {"user_id": "X", "email": "x@x.com"}}])
+    cache.invalidate_write({"user_id": "B", "email": "a@x.com"})
+    assert lru.get("user_txns:A") is None
+    assert lru.get("user_txns:X") is not None
+
+def test_any_write_tag_is_dropped_by_every_write(lru):
+    cache.read_through("graph:page", lambda: {"nodes": []}, [cache.ANY_WRITE])
+    cache.invalidate_write({"txn_id": "T1", "device_id": "d"})
+    assert lru.get("graph:page") is None
+
+def test_transaction_write_invalidates_sender_and_receiver(lru):
+    cache.read_through("user_txns:A", lambda: [], ["User:A"])
+    cache.invalidate_write({"txn_id": "T1", "sender_id": "A", "receiver_id": "C"})
+    assert lru.get("user_txns:A") is None
+
+def test_relationships_invalidated_by_a_new_user_sharing_an_attribute(lru, monkeypatch):
+    # A is only linked to C (address); B, written later, shares A's phone
+    conn = RecordingDB([{"node": ALICE, "relation": "SHARED_ATTRIBUTE", "connected": CAROL}])
+    monkeypatch.setattr(relationships, "db", conn)
+    first = relationships.get_user_relationships("A")
+    assert first["node"] == ALICE and len(first["relationships"]) == 1
+    relationships.get_user_relationships("A")
+    assert conn.calls == 1
+
+    cache.invalidate_write(BOB)
+    relationships.get_user_relationships("A")
+    assert conn.calls == 2
+
+def test_relationships_of_an_unlinked_user_are_invalidated_too(lru, monkeypatch):
+    # No relationships yet: the query still returns the node, with a null relation
+    conn = AsyncRecordingDB([{"node": ALICE, "relation": None, "connected": None}])
+    monkeypatch.setattr(async_relationships, "async_db", conn)
+    result = asyncio.run(async_relationships.get_user_relationships("A"))
+    assert result == {"node": ALICE, "relationships": [], "truncated": False}
+
+    cache.invalidate_write(BOB)
+    asyncio.run(async_relationships.get_user_relationships("A"))
+    assert conn.calls == 2
+
+def test_relationships_limit_sets_truncated():
+    rows = [{"node": ALICE, "relation": "SHARED_ATTRIBUTE", "connected": {"user_id": str(i)}} for i in range(3)]
+    result = relationships.bounded(rows, 2)
+    assert len(result["relationships"]) == 2 and result["truncated"]
+    assert relationships.bounded([], 2) == {"node": None, "relationships": [], "truncated": False}
+
+def test_lru_evicts_oldest_and_expires():
+    lru = cache.LRUCache(max_entries=2, ttl=60)
+    lru.set("a", 1, ["t"])
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None and lru.get("a") == 1
+    lru.ttl = -1
+    lru.set("d", 4)
+    assert lru.get("d") is None
+    assert lru.stats()["evictions"] == 2 and lru.stats()["expirations"] == 1
@@ -0,0 +1,86 @@
+"""Append-only change log and its readers (backend/changes.py)."""
+import asyncio
+import json
+
+from backend import changes, crud
+
+def _node(key):
+    return {"group": "nodes", "data": {"id": key}}
+
+def _seqs(lines):
+    return [json.loads(line)["seq"] for line in lines]
+
+def test_sequence_numbers_are_contiguous(tmp_path):
+    log = changes.ChangeLog(str(tmp_path / "changes.ndjson"))
+    assert log.bounds() == (None, 0)
+    assert log.append([_node("a"), _node("b")]) == 2
+    assert log.append([_node("c")], complete=False) == 4
+    entries = [json.loads(line) for line in log.read(0)]
+    assert [(e["seq"], e["op"]) for e in entries] == [(1, "upsert"), (2, "upsert"), (3, "upsert"), (4, "reload")]
+    assert entries[0]["element"] == _node("a") and "element" not in entries[3]
+
+def test_read_since_uses_the_sparse_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(changes, "INDEX_EVERY", 4)
+    log = changes.ChangeLog(str(tmp_path / "changes.ndjson"))
+    for i in range(25):
+        log.append([_node(str(i))])
+    assert len(log._seqs) > 1
+    for since in (0, 3, 4, 5, 17, 24):
+        assert _seqs(log.read(since, limit=3)) == list(range(since + 1, min(since + 4, 26)))
+    assert log.read(25) == []
+
+def test_appends_of_another_process_are_picked_up(tmp_path):
+    path = str(tmp_path / "changes.ndjson")
+    ours, theirs = changes.ChangeLog(path), changes.ChangeLog(path)
+    ours.append([_node("a")])
+    theirs.append([_node("b")])
+    assert ours.append([_node("c")]) == 3
+    assert _seqs(theirs.read(1)) == [2, 3]
+
+def test_a_reopened_log_resumes_its_sequence(tmp_path):
+    path = str(tmp_path / "changes.ndjson")
+    changes.ChangeLog(path).append([_node("a"), _node("b")])
+    log = changes.ChangeLog(path)
+    assert log.bounds() == (1, 2)
+    assert log.append([_node("c")]) == 3
+
+def test_a_truncated_log_starts_over(tmp_path):
+    path = tmp_path / "changes.ndjson"
+    log = changes.ChangeLog(str(path))
+    log.append([_node("a"), _node("b")])
+    path.write_bytes(b"")
+    assert log.bounds() == (None, 0)
+    assert log.append([_node("c")]) == 1
+
+def test_page_keeps_the_raw_lines(tmp_path):
+    log = changes.ChangeLog(str(tmp_path / "changes.ndjson"))
+    log.append([_node("a"), _node("b")])
+    body = json.loads(changes.page(log.read(0, limit=1), 0, log.head))
+    assert body["next"] == 1 and body["head"] == 2 and body["changes"][0]["element"] == _node("a")
+    assert json.loads(changes.page([], 2, 2)) == {"changes": [], "next": 2, "head": 2}
+
+def test_events_resume_after_the_last_event_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(changes, "CHANGES_POLL_INTERVAL", 0)
+    log = changes.ChangeLog(str(tmp_path / "changes.ndjson"))
+    log.append([_node("a"), _node("b"), _node("c")])
+
+    async def collect(since):
+        # The client disconnects once it has received something
+        received = []
+        async for chunk in changes.events(log, since, lambda: asyncio.sleep(0, bool(received))):
+            if chunk.startswith(b"id: "):
+                received.append(int(chunk.split(b"\n")[0][4:]))
+        return received
+
+    assert asyncio.run(collect(0)) == [1, 2, 3]
+    log.append([_node("d")])
+    assert asyncio.run(collect(2)) == [3, 4]
+
+def test_writes_are_logged_with_their_edges(tmp_path, fake, lru, monkeypatch):
+    monkeypatch.setattr(changes, "log", changes.ChangeLog(str(tmp_path / "changes.ndjson")))
+    for key in ("A", "B"):
+        crud.create_user({"user_id": key, "name": key, "email": f"{key}@x.com", "phone": "555-0101",
+                          "address": f"{key} St", "payment_method": key})
+    elements = [json.loads(line)["element"] for line in changes.log.read(0)]
+    assert [e["data"]["id"] for e in elements] == ["A", "B", "B-shared-A"]
+    assert elements[2]["data"]["type"] == "SHARED_ATTRIBUTE"
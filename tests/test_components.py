@@ -0,0 +1,44 @@
+"""Connected-component index (backend/components.py) and its ids on the write path."""
+import random
+
+from backend import components, crud
+
+def user(key, phone, email=None):
+    return {"user_id": key, "name": key, "email": email or f"{key}@x.com", "phone": phone,
+            "address": f"{key} street", "payment_method": f"pm-{key}"}
+
+RING = [user("u3", "1"), user("u1", "1"), user("u5", "2"), user("u2", "2", "u3@x.com"), user("u4", "3")]
+
+def test_id_is_the_smallest_member_whatever_the_insertion_order():
+    for seed in range(5):
+        rows = RING[:]
+        random.Random(seed).shuffle(rows)
+        index = components.ComponentIndex()
+        for row in rows:
+            index.add_users([row])
+        assert index.component_of("u5") == ("u1", 4)
+        assert index.component_of("u4") == ("u4", 1)
+        assert index.members_of("u2")["component_id"] == "u1"
+        assert [c["component_id"] for c in index.top(2)] == ["u1", "u4"]
+
+def test_add_reports_members_whose_id_changed():
+    index = components.ComponentIndex()
+    index.add_users([user("b", "1"), user("c", "1")])
+    rows = index.add_users([user("a", "1")])
+    assert sorted((r["key"], r["id"], r["size"]) for r in rows) == [("a", "a", 3), ("b", "a", 3), ("c", "a", 3)]
+    # A larger key joining keeps the id: only the new member is reported
+    assert index.add_users([user("d", "1")]) == [{"key": "d", "id": "a", "size": 4}]
+
+def test_transactions_join_their_senders_component():
+    index = components.ComponentIndex()
+    index.add_users([user("u2", "9")])
+    rows = index.add_transactions([{"txn_id": "t1", "sender_id": "u2", "receiver_id": "u9", "device_id": "d"}])
+    assert sorted((r["key"], r["id"]) for r in rows) == [("t1", "t1"), ("u2", "t1")]
+    assert index.component_of("u2") == ("t1", 2)
+
+def test_write_path_stores_component_ids_on_the_nodes(fake, monkeypatch):
+    monkeypatch.setattr(components, "components", components.ComponentIndex())
+    crud.create_users_bulk([user("b", "1"), user("c", "2")])
+    crud.create_user(user("a", "2"))
+    stored = {k: (n.get("component_id"), n.get("component_size")) for k, n in fake.nodes["User"].items()}
+    assert stored == {"a": ("a", 2), "b": ("b", 1), "c": ("a", 2)}
@@ -0,0 +1,116 @@
+"""crud and async_crud driving the same plans (backend/plans.py)."""
+import asyncio
+
+from backend import async_crud, crud
+from benchmarks import fake_db
+
+USERS = [{"user_id": f"U{i}", "name": f"User {i}", "email": f"u{i}@x.com", "phone": f"555-{i % 3}",
+          "address": f"{i} Main St", "payment_method": f"card-{i}"} for i in range(6)]
+TRANSACTIONS = [{"txn_id": f"T{i}", "sender_id": f"U{i}", "receiver_id": f"U{(i + 1) % 6}", "amount": 10.0 * i,
+                 "device_id": f"d{i % 2}", "ip_address": f"10.0.0.{i}", "timestamp": 1_700_000_000_000 + i}
+                for i in range(6)]
+
+async def _collect(rows):
+    return [row async for row in rows]
+
+def test_async_bulk_writes_match_sync(fake, async_fake, lru):
+    report = asyncio.run(async_crud.create_users_bulk(USERS, batch_size=4))
+    assert report["batches"] == 2 and [t["rows"] for t in report["batch_timings"]] == [4, 2]
+    assert report["detection"]["rows"] == len(USERS)
+    asyncio.run(async_crud.create_transactions_bulk(TRANSACTIONS, batch_size=4))
+    assert set(fake.nodes["User"]) == {u["user_id"] for u in USERS}
+    assert set(fake.nodes["Transaction"]) == {t["txn_id"] for t in TRANSACTIONS}
+
+def test_async_graph_rows_match_sync(fake, async_fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    for kwargs in ({"node_limit": 4}, {"node_limit": 4, "edge_limit": 3}, {"seed": "U0", "depth": 2}):
+        rows = list(crud.iter_graph_rows(**kwargs))
+        assert rows[-1][0] == "end"
+        assert asyncio.run(_collect(async_crud.iter_graph_rows(**kwargs))) == rows
+
+def _key(props):
+    return props.get("user_id", props.get("txn_id"))
+
+def _node_keys(rows):
+    return [_key(row[2]) for row in rows if row[0] == "nodes"]
+
+def _pages(**kwargs):
+    cursor, pages = None, []
+    while True:
+        rows = list(crud.iter_graph_rows(cursor=cursor, **kwargs))
+        pages.append(rows)
+        cursor = rows[-1][2]
+        if cursor is None:
+            return pages
+
+def test_cursor_pages_through_every_node_once(fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    # Without edges a page holds only its own nodes
+    pages = _pages(node_limit=5, edge_limit=0)
+    assert [len(rows) for rows in pages] == [6, 6, 3]
+    keys = [key for rows in pages for key in _node_keys(rows)]
+    assert keys == [u["user_id"] for u in USERS] + [t["txn_id"] for t in TRANSACTIONS]
+
+def test_every_edge_endpoint_is_sent_before_the_edge(fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    sent = set()
+    for row in crud.iter_graph_rows(node_limit=2):
+        if row[0] == "nodes":
+            sent.add(_key(row[2]))
+        elif row[0] == "edges":
+            assert {row[3], row[4]} <= sent
+
+def test_edge_limit_truncates_the_page(fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    rows = list(crud.iter_graph_rows(node_limit=12, edge_limit=3))
+    assert sum(row[0] == "edges" for row in rows) == 3
+    assert rows[-1] == ("end", True, None)
+
+def test_seeded_pages_follow_bfs_order(fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    first = list(crud.iter_graph_rows(seed="U0", depth=1, node_limit=1))
+    assert first[0] == ("nodes", "User", fake.nodes["User"]["U0"])
+    assert first[-1][2] is not None
+    second = list(crud.iter_graph_rows(seed="U0", depth=1, cursor=first[-1][2], node_limit=100, edge_limit=0))
+    assert crud.decode_cursor(first[-1][2]) == {"offset": 1}
+    assert second[-1][2] is None
+    # U0 sent T0, received T5 and shares a phone with U3
+    assert set(_node_keys(second)) == {"T0", "T5", "U3"}
+
+class InstantConnection(fake_db.FakeConnection):
+    """Reports every batch as taking no time."""
+    def write_batches(self, query, batches):
+        for count, _ in super().write_batches(query, batches):
+            yield count, 0.0
+
+def test_chunks_split_at_the_batch_size():
+    assert list(crud._chunks(list(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(crud._chunks(list(range(4)), 2)) == [[0, 1], [2, 3]]
+    assert list(crud._chunks([], 2)) == []
+
+def test_bulk_report_has_one_timing_per_batch(fake, lru):
+    report = crud.create_users_bulk(USERS, batch_size=4)
+    assert (report["rows"], report["batches"], report["batch_size"]) == (6, 2, 4)
+    assert [t["rows"] for t in report["batch_timings"]] == [4, 2]
+    assert report["seconds"] == round(sum(t["seconds"] for t in report["batch_timings"]), 4)
+    assert report["detection"]["rows"] == 6 and report["detection"]["batches"] == 2
+    exact = crud.create_transactions_bulk(TRANSACTIONS, batch_size=3, detect=False)
+    assert [t["rows"] for t in exact["batch_timings"]] == [3, 3] and "detection" not in exact
+    assert set(fake.nodes["Transaction"]) == {t["txn_id"] for t in TRANSACTIONS}
+
+def test_bulk_report_of_instant_batches_has_no_rate(lru, monkeypatch):
+    monkeypatch.setattr(crud, "db", InstantConnection())
+    report = crud.create_users_bulk(USERS, batch_size=5, detect=False)
+    assert report["seconds"] == 0 and report["rows_per_sec"] is None
+    assert report["batch_timings"] == [{"rows": 5, "seconds": 0.0, "rows_per_sec": None},
+                                       {"rows": 1, "seconds": 0.0, "rows_per_sec": None}]
+    assert crud._ingest_report([], 5, [])["rows_per_sec"] is None
+
+def test_bulk_default_batch_size(fake, lru, monkeypatch):
+    monkeypatch.setattr(crud, "INGEST_BATCH_SIZE", 4)
+    assert crud.create_users_bulk(USERS, detect=False)["batch_size"] == 4
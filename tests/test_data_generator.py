@@ -0,0 +1,57 @@
+"""Seeded smoke test of the synthetic data generator."""
+from collections import Counter
+
+import pytest
+
+from backend import crud, data_generator
+
+END = 1_700_000_000_000
+OPTIONS = dict(seed=7, chunk_size=64, collision_rate=0.2, end=END, days=1)
+
+@pytest.fixture(scope="module")
+def generated():
+    return list(data_generator.generate(200, 500, workers=2, **OPTIONS))
+
+def _rows(chunks, kind):
+    return [row for k, rows in chunks if k == kind for row in rows]
+
+def test_row_counts_and_chunks(generated):
+    assert [(kind, len(rows)) for kind, rows in generated] == \
+        [("users", 64)] * 3 + [("users", 8)] + [("transactions", 64)] * 7 + [("transactions", 52)]
+    users, txns = _rows(generated, "users"), _rows(generated, "transactions")
+    assert [u["user_id"] for u in users] == [f"u{i}" for i in range(200)]
+    assert [t["txn_id"] for t in txns] == [f"t{i}" for i in range(500)]
+
+def test_transactions_reference_users_in_the_window(generated):
+    user_ids = {u["user_id"] for u in _rows(generated, "users")}
+    for txn in _rows(generated, "transactions"):
+        assert txn["sender_id"] in user_ids and txn["receiver_id"] in user_ids
+        assert txn["sender_id"] != txn["receiver_id"]
+        assert END - 86_400_000 <= txn["timestamp"] < END
+
+def test_planted_shared_attributes_appear(generated):
+    users = _rows(generated, "users")
+    for attr, prefix in (("email", "shared"), ("phone", "+1999"), ("address", "1 Shared Way #")):
+        counts = Counter(u[attr] for u in users)
+        planted = {value: n for value, n in counts.items() if value.startswith(prefix)}
+        # About collision_rate of the users, drawn from a pool of 200 * 0.2 / 10 = 4 values
+        assert 20 <= sum(planted.values()) <= 60
+        assert len(planted) <= 4 and max(planted.values()) > 1
+        assert all(n == 1 for value, n in counts.items() if value not in planted)
+
+def test_planted_attributes_are_detected(generated, fake, lru):
+    data_generator.write_db([chunk for chunk in generated if chunk[0] == "users"], detect=True)
+    linked = {frozenset((a, b)) for a, targets in fake.out["SHARED_ATTRIBUTE"].items() for b in targets}
+    by_key = {u["user_id"]: u for u in _rows(generated, "users")}
+    expected = {frozenset((a["user_id"], b["user_id"])) for a in by_key.values() for b in by_key.values()
+                if a is not b and any(a[attr] == b[attr] for attr in crud.USER_MATCH_ATTRIBUTES)}
+    assert linked == expected
+
+def test_output_depends_only_on_the_seed(generated):
+    assert list(data_generator.generate(200, 500, workers=1, **OPTIONS)) == generated
+    assert list(data_generator.generate(200, 500, workers=1, **{**OPTIONS, "seed": 8})) != generated
+
+def test_no_collisions_without_a_collision_rate():
+    users = _rows(data_generator.generate(100, 0, workers=1, **{**OPTIONS, "collision_rate": 0}), "users")
+    for attr in ("email", "phone", "address"):
+        assert len({u[attr] for u in users}) == 100
@@ -0,0 +1,74 @@
+"""Relationship detection queries (crud._detection_query) and their parameters."""
+from backend import crud
+from benchmarks import fake_db
+
+def _user(key, email, phone):
+    return {"user_id": key, "name": key, "email": email, "phone": phone, "address": f"{key} St",
+            "payment_method": key}
+
+def test_one_indexed_lookup_per_attribute():
+    query = crud._detection_query("User", "user_id", ("email", "phone"), "SHARED_ATTRIBUTE")
+    assert query == """
+UNWIND $rows AS key
+MATCH (a:User {user_id: key})
+CALL {
+  WITH a MATCH (b:User) WHERE b.email = a.email RETURN b
+  UNION
+  WITH a MATCH (b:User) WHERE b.phone = a.phone RETURN b
+}
+WITH a, b WHERE a <> b
+MERGE (a)-[:SHARED_ATTRIBUTE]-(b)
+"""
+
+def test_window_clause_bounds_every_lookup():
+    query = crud._detection_query("Transaction", "txn_id", ("device_id", "ip_address"), "LINKED", 1000)
+    window = " AND b.timestamp >= a.timestamp - 1000 AND b.timestamp <= a.timestamp + 1000"
+    assert f"WHERE b.device_id = a.device_id{window} RETURN b" in query
+    assert f"WHERE b.ip_address = a.ip_address{window} RETURN b" in query
+    assert "timestamp" not in crud._detection_query("Transaction", "txn_id", ("device_id",), "LINKED")
+
+class Recording(fake_db.FakeConnection):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def _run(self, query, parameters):
+        self.calls.append((query, parameters))
+        return super()._run(query, parameters)
+
+def _detections(conn, query):
+    return [params for q, params in conn.calls if q == query]
+
+def test_detection_is_passed_the_written_keys(lru, monkeypatch):
+    conn = Recording()
+    monkeypatch.setattr(crud, "db", conn)
+    crud.create_user(_user("A", "a@x.com", "555-1"))
+    assert _detections(conn, crud.DETECT_USERS_QUERY) == [{"rows": ["A"]}]
+    crud.create_users_bulk([_user(k, f"{k}@x.com", "555-2") for k in "BCD"], batch_size=2)
+    assert _detections(conn, crud.DETECT_USERS_QUERY)[1:] == [{"rows": ["B", "C"]}, {"rows": ["D"]}]
+
+def _linked(conn, rel_type):
+    return {frozenset((a, b)) for a, targets in conn.out.get(rel_type, {}).items() for b in targets}
+
+def test_detection_links_each_sharing_pair_once(fake, lru):
+    crud.create_user(_user("A", "a@x.com", "555-1"))
+    crud.create_user(_user("B", "a@x.com", "555-1"))
+    # Same batch, and sharing with both A and B
+    crud.create_users_bulk([_user("C", "c@x.com", "555-1"), _user("D", "c@x.com", "555-9"),
+                            _user("E", "e@x.com", "555-8")])
+    pairs = _linked(fake, "SHARED_ATTRIBUTE")
+    assert pairs == {frozenset(p) for p in ("AB", "AC", "BC", "CD")}
+    assert sum(len(targets) for targets in fake.out["SHARED_ATTRIBUTE"].values()) == len(pairs)
+    # Written again: no second edge either way
+    crud.create_user(_user("B", "a@x.com", "555-1"))
+    assert sum(len(targets) for targets in fake.out["SHARED_ATTRIBUTE"].values()) == len(pairs)
+
+def test_transactions_link_on_device_or_ip(fake, lru):
+    crud.create_users_bulk([_user("A", "a@x.com", "1"), _user("B", "b@x.com", "2")])
+    crud.create_transactions_bulk([
+        {"txn_id": "T1", "sender_id": "A", "receiver_id": "B", "amount": 1.0, "device_id": "d1", "ip_address": "ip1"},
+        {"txn_id": "T2", "sender_id": "B", "receiver_id": "A", "amount": 1.0, "device_id": "d1", "ip_address": "ip2"},
+        {"txn_id": "T3", "sender_id": "B", "receiver_id": "A", "amount": 1.0, "device_id": "d3", "ip_address": "ip2"},
+        {"txn_id": "T4", "sender_id": "B", "receiver_id": "A", "amount": 1.0, "device_id": "d4", "ip_address": "ip4"},
+    ])
+    assert _linked(fake, "LINKED") == {frozenset(("T1", "T2")), frozenset(("T2", "T3"))}
@@ -0,0 +1,157 @@
+"""Background relationship detection (backend/detection_queue.py)."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import async_crud, crud, detection_queue, main
+from backend.detection_queue import DetectionQueue, QueueFull
+from benchmarks import fake_db
+
+QUERIES = {"users": crud.DETECT_USERS_QUERY, "transactions": crud.DETECT_TRANSACTIONS_QUERY}
+
+class RecordingConnection(fake_db.AsyncFakeConnection):
+    """Records every detection batch; the first `failures` batches raise."""
+    def __init__(self, conn, failures=0):
+        super().__init__(conn)
+        self.batches, self.failures = [], failures
+
+    async def write_batches(self, query, batches):
+        batches = list(batches)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("connection lost")
+        self.batches += [(query, batch) for batch in batches]
+        async for result in super().write_batches(query, batches):
+            yield result
+
+@pytest.fixture
+def detect_db(fake, lru, monkeypatch):
+    conn = RecordingConnection(fake)
+    monkeypatch.setattr(detection_queue, "async_db", conn)
+    return conn
+
+def _user(key, phone="555-0101"):
+    return {"user_id": key, "name": key, "email": f"{key}@x.com", "phone": phone,
+            "address": f"{key} St", "payment_method": key}
+
+async def _processed(queue, count):
+    while queue.counters["processed"] < count:
+        await asyncio.sleep(0.01)
+
+def test_repeated_keys_are_coalesced(detect_db):
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=10, max_delay=60, workers=1)
+        for key in ("A", "B", "A", "A"):
+            await queue.put("users", key, _user(key))
+        assert queue.depth() == 2
+        assert queue.counters["enqueued"] == 2 and queue.counters["coalesced"] == 2
+        queue.start()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert detect_db.batches == [(crud.DETECT_USERS_QUERY, ["A", "B"])]
+    assert queue.counters["processed"] == 2 and queue.depth() == 0
+
+def test_batches_are_per_kind_and_bounded(detect_db):
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=2, max_delay=0.01, workers=1)
+        queue.start()
+        for key in ("A", "B", "C"):
+            await queue.put("users", key, _user(key))
+        await queue.put("transactions", "T1", {"txn_id": "T1"})
+        while queue.depth():
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert sorted(detect_db.batches) == sorted([(crud.DETECT_USERS_QUERY, ["A", "B"]),
+                                                (crud.DETECT_USERS_QUERY, ["C"]),
+                                                (crud.DETECT_TRANSACTIONS_QUERY, ["T1"])])
+
+def test_a_full_batch_is_flushed_without_waiting(detect_db):
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=2, max_delay=60, workers=1)
+        queue.start()
+        await queue.put("users", "A", _user("A"))
+        await queue.put("users", "B", _user("B"))
+        await asyncio.wait_for(_processed(queue, 2), 5)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert detect_db.batches == [(crud.DETECT_USERS_QUERY, ["A", "B"])]
+
+def test_a_failed_batch_is_requeued_and_retried(fake, detect_db):
+    detect_db.failures = 1
+    fake.handlers[crud.CREATE_USER_QUERY](_user("A"))
+    fake.handlers[crud.CREATE_USER_QUERY](_user("B"))
+
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=10, max_delay=0.01, workers=1)
+        queue.start()
+        await queue.put("users", "A", _user("A"))
+        await queue.put("users", "B", _user("B"))
+        await asyncio.wait_for(_processed(queue, 2), 5)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.counters["failures"] == 1 and queue.counters["processed"] == 2
+    assert detect_db.batches == [(crud.DETECT_USERS_QUERY, ["A", "B"])]
+    # The retried batch created the link the shared phone calls for
+    assert fake.out["SHARED_ATTRIBUTE"] in ({"A": {"B"}}, {"B": {"A"}})
+
+def test_stop_drains_pending_keys(detect_db):
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=2, max_delay=60, workers=2)
+        queue.start()
+        for key in ("A", "B", "C"):
+            await queue.put("users", key, _user(key))
+        await queue.put("transactions", "T1", {"txn_id": "T1"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.depth() == 0 and queue.counters["processed"] == 4
+    assert sorted(key for _, batch in detect_db.batches for key in batch) == ["A", "B", "C", "T1"]
+
+def test_on_detected_gets_each_batch(detect_db):
+    seen = []
+
+    async def on_detected(kind, keys):
+        seen.append((kind, keys))
+
+    async def scenario():
+        queue = DetectionQueue(QUERIES, batch_size=10, max_delay=60, workers=1, on_detected=on_detected)
+        queue.start()
+        await queue.put("users", "A", _user("A"))
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert seen == [("users", ["A"])]
+
+def test_a_full_queue_rejects_after_the_put_timeout(detect_db, monkeypatch):
+    monkeypatch.setattr(detection_queue, "DETECTION_PUT_TIMEOUT", 0.01)
+
+    async def scenario():
+        queue = DetectionQueue(QUERIES, maxsize=1, workers=1)
+        await queue.put("users", "A", _user("A"))
+        # Coalescing needs no room
+        await queue.put("users", "A", _user("A"))
+        with pytest.raises(QueueFull):
+            await queue.put("users", "B", _user("B"))
+        return queue
+
+    assert asyncio.run(scenario()).counters["rejected"] == 1
+
+def test_post_returns_503_when_the_queue_is_full(fake, async_fake, detect_db, monkeypatch):
+    monkeypatch.setattr(detection_queue, "DETECTION_PUT_TIMEOUT", 0.01)
+    monkeypatch.setattr(async_crud, "DETECTION_MODE", "async")
+    queue = DetectionQueue(QUERIES, maxsize=1)
+    queue.pending["users"]["A"] = (0.0, _user("A"))
+    monkeypatch.setattr(async_crud, "detection", queue)
+    response = TestClient(main.app).post("/users", json=_user("B"))
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+    # The node itself was written; only its detection was refused
+    assert "B" in fake.nodes["User"]
@@ -0,0 +1,73 @@
+"""Velocity feature store (backend/features.py)."""
+import pickle
+
+from backend import features
+
+NOW = 1_700_000_000_000
+MINUTE = 60_000
+
+def txn(txn_id, sender="a", receiver="b", amount=10.0, ago=MINUTE, device="d1", ip="ip1"):
+    return {"txn_id": txn_id, "sender_id": sender, "receiver_id": receiver, "amount": amount,
+            "timestamp": NOW - ago, "device_id": device, "ip_address": ip}
+
+def test_windows_count_sum_and_distinct_counterparties():
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1"), txn("t2", receiver="c", amount=5.5), txn("t3", ago=3 * features.HOUR)],
+                           NOW)
+    sent = store.user_features("a", NOW)
+    assert sent["1h"]["sent_count"] == 2 and sent["1h"]["sent_sum"] == 15.5
+    assert sent["1h"]["distinct_receivers"] == 2
+    assert sent["24h"]["sent_count"] == 3
+    assert store.user_features("b", NOW)["24h"]["received_count"] == 2
+    assert store.fan_out("device", "d1", NOW)["7d"] == {"count": 3, "distinct_senders": 1}
+    # Two hours later the first two have left the 1h window
+    assert store.user_features("a", NOW + 2 * features.HOUR)["1h"]["sent_count"] == 0
+
+def test_transactions_written_again_are_counted_once():
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1"), txn("t1")], NOW)
+    store.add_transactions([txn("t1"), txn("t2")], NOW)
+    assert store.user_features("a", NOW)["1h"]["sent_count"] == 2
+    assert store.fan_out("ip", "ip1", NOW)["1h"]["count"] == 2
+
+def test_ids_older_than_the_horizon_are_forgotten():
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1")], NOW)
+    store.add_transactions([], NOW + features.HORIZON + features.HOUR)
+    assert store.seen == {}
+
+def test_save_and_load_keep_features_and_seen_ids(tmp_path):
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1"), txn("t2", sender="c")], NOW)
+    path = tmp_path / "features.pickle"
+    store.save(path)
+    loaded = features.FeatureStore().load(path)
+    assert loaded.compare(store, NOW) == []
+    loaded.add_transactions([txn("t1")], NOW)
+    assert loaded.user_features("a", NOW)["1h"]["sent_count"] == 1
+
+def test_writes_during_save_do_not_reach_the_pickled_copy(tmp_path, monkeypatch):
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1")], NOW)
+    dumps = pickle.dumps
+
+    def dumps_during_ingest(state, protocol):
+        # Runs outside the store lock, like ingest on the event loop would
+        store.add_transactions([txn("t2"), txn("t3", sender="new")], NOW)
+        return dumps(state, protocol)
+
+    monkeypatch.setattr(features.pickle, "dumps", dumps_during_ingest)
+    path = tmp_path / "features.pickle"
+    store.save(path)
+    monkeypatch.undo()
+    saved = features.FeatureStore().load(path)
+    assert saved.user_features("a", NOW)["1h"]["sent_count"] == 1
+    assert "new" not in saved
+    assert store.user_features("a", NOW)["1h"]["sent_count"] == 2
+
+def test_old_snapshots_without_seen_ids_load(tmp_path):
+    store = features.FeatureStore()
+    store.add_transactions([txn("t1")], NOW)
+    path = tmp_path / "old.pickle"
+    path.write_bytes(pickle.dumps((store.sent, store.received, store.devices, store.ips)))
+    assert features.FeatureStore().load(path).user_features("a", NOW)["1h"]["sent_count"] == 1
@@ -0,0 +1,95 @@
+"""Hub link statements and the pairwise-to-hub migration, through FakeConnection."""
+import pytest
+
+from backend import crud, hubs, migrate_hubs
+
+def _user(key, email, phone, payment_method=None):
+    return {"user_id": key, "name": key, "email": email, "phone": phone, "address": f"{key} St",
+            "payment_method": payment_method}
+
+def _txn(key, device_id, ip_address):
+    return {"txn_id": key, "sender_id": "A", "receiver_id": "B", "amount": 1.0,
+            "device_id": device_id, "ip_address": ip_address}
+
+def test_link_query_replaces_stale_hub_edges():
+    query = hubs.LINK_USERS_QUERY
+    assert "MATCH (a:User {user_id: key})" in query
+    assert "OPTIONAL MATCH (a)-[old:HAS_EMAIL|HAS_PHONE|HAS_ADDRESS|USES_PAYMENT_METHOD]->()" in query
+    # Deleted before the MERGEs, one null-guarded MERGE per attribute
+    assert query.index("FOREACH (r IN stale | DELETE r)") < query.index("MERGE")
+    for attr, hub, rel in hubs.USER_HUBS:
+        assert (f"FOREACH (v IN CASE WHEN a.{attr} IS NULL THEN [] ELSE [a.{attr}] END |\n"
+                f"  MERGE (h:{hub} {{value: v}})\n"
+                f"  MERGE (a)-[:{rel}]->(h))") in query
+    assert "OPTIONAL MATCH (a)-[old:USED_DEVICE|FROM_IP]->()" in hubs.LINK_TRANSACTIONS_QUERY
+
+def _hub_edges(conn, key):
+    return {(rel, h) for rel, adjacency in conn.out.items() if rel in hubs.USER_HUB_RELS.split("|")
+            + hubs.TRANSACTION_HUB_RELS.split("|") for h in adjacency.get(key, ())}
+
+def test_linking_follows_attribute_updates(fake, lru):
+    crud.create_users_bulk([_user("A", "a@x.com", "555-1", "visa"), _user("B", "a@x.com", None)], detect=False)
+    report = crud._ingest(hubs.LINK_USERS_QUERY, ["A", "B", "missing"], batch_size=2)
+    assert report["rows"] == 3 and report["batches"] == 2
+    assert _hub_edges(fake, "A") == {("HAS_EMAIL", "Email:a@x.com"), ("HAS_PHONE", "Phone:555-1"),
+                                     ("HAS_ADDRESS", "Address:A St"), ("USES_PAYMENT_METHOD", "PaymentMethod:visa")}
+    # A null attribute gets no hub; a shared one gets a single hub
+    assert _hub_edges(fake, "B") == {("HAS_EMAIL", "Email:a@x.com"), ("HAS_ADDRESS", "Address:B St")}
+    assert fake.inn["HAS_EMAIL"]["Email:a@x.com"] == {"A", "B"}
+
+    crud.create_users_bulk([_user("A", "new@x.com", "555-1")], detect=False)
+    crud._ingest(hubs.LINK_USERS_QUERY, ["A"])
+    assert _hub_edges(fake, "A") == {("HAS_EMAIL", "Email:new@x.com"), ("HAS_PHONE", "Phone:555-1"),
+                                     ("HAS_ADDRESS", "Address:A St")}
+    assert fake.inn["HAS_EMAIL"]["Email:a@x.com"] == {"B"}
+
+def test_transactions_link_to_device_and_ip_hubs(fake, lru):
+    crud.create_users_bulk([_user("A", "a@x.com", "1"), _user("B", "b@x.com", "2")], detect=False)
+    crud.create_transactions_bulk([_txn("T1", "d1", "ip1"), _txn("T2", "d1", None)], detect=False)
+    crud._ingest(hubs.LINK_TRANSACTIONS_QUERY, ["T1", "T2"])
+    assert _hub_edges(fake, "T1") == {("USED_DEVICE", "Device:d1"), ("FROM_IP", "IPAddress:ip1")}
+    assert _hub_edges(fake, "T2") == {("USED_DEVICE", "Device:d1")}
+
+@pytest.fixture
+def pairwise(fake, lru, monkeypatch):
+    """A pairwise-model graph with SHARED_ATTRIBUTE and LINKED edges, migrate_hubs on the same fake."""
+    monkeypatch.setattr(migrate_hubs, "db", fake)
+    crud.create_users_bulk([_user("A", "a@x.com", "1"), _user("B", "a@x.com", "2"),
+                            _user("C", "c@x.com", "2"), _user("D", "d@x.com", "4")])
+    crud.create_transactions_bulk([_txn("T1", "d1", "ip1"), _txn("T2", "d1", "ip2"), _txn("T3", "d3", "ip2")])
+    return fake
+
+def _pairs(conn, rel_type):
+    return {frozenset((a, b)) for a, targets in conn.out.get(rel_type, {}).items() for b in targets}
+
+def _derived_pairs(conn, rels):
+    """Pairs sharing a hub, as hubs.shared_attribute_pattern / linked_pattern derive them."""
+    return {frozenset((a, b)) for rel in rels for members in conn.inn.get(rel, {}).values()
+            for a in members for b in members if a != b}
+
+def test_migration_replaces_pairwise_edges_with_hubs(pairwise):
+    shared, linked = _pairs(pairwise, "SHARED_ATTRIBUTE"), _pairs(pairwise, "LINKED")
+    assert shared == {frozenset("AB"), frozenset("BC")}
+    assert linked == {frozenset(("T1", "T2")), frozenset(("T2", "T3"))}
+
+    report = migrate_hubs.migrate(batch_size=1)
+    before, after = report["before"], report["after"]
+    assert before["edges_by_type"]["SHARED_ATTRIBUTE"] == 2 and before["edges_by_type"]["LINKED"] == 2
+    assert before["store_size_bytes"] is None  # no APOC
+    assert report["deleted"] == {"LINKED": 2, "SHARED_ATTRIBUTE": 2}
+    assert after["edges_by_type"]["SHARED_ATTRIBUTE"] == 0 and after["edges_by_type"]["LINKED"] == 0
+    assert report["linked"]["users"]["rows"] == 4 and report["linked"]["users"]["batches"] == 4
+    assert report["linked"]["transactions"]["rows"] == 3
+    # 4 users and 3 transactions, plus 3 emails, 3 phones, 4 addresses, 2 devices, 2 IPs
+    assert before["nodes"] == 7 and after["nodes"] == 21
+    assert after["edges"] == before["edges"] - 4 + 4 * 3 + 3 * 2
+
+    # The hubs derive exactly the links that were materialised
+    assert _derived_pairs(pairwise, hubs.USER_HUB_RELS.split("|")) == shared
+    assert _derived_pairs(pairwise, hubs.TRANSACTION_HUB_RELS.split("|")) == linked
+
+def test_migration_can_keep_pairwise_edges(pairwise):
+    report = migrate_hubs.migrate(keep_edges=True)
+    assert report["deleted"] == {}
+    assert report["after"]["edges_by_type"]["SHARED_ATTRIBUTE"] == 2
+    assert report["after"]["edges_by_type"]["HAS_EMAIL"] == 4
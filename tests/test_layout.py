@@ -0,0 +1,24 @@
+"""Reading the graph for the layout, and tiles (backend/layout.py)."""
+from backend import crud, layout
+
+def seed(count=12):
+    # Every user shares a phone, so each page's edges overflow a small edge limit
+    crud.create_users_bulk([{"user_id": f"u{i:02}", "name": f"u{i}", "email": f"{i}@x.com", "phone": "555",
+                             "address": f"{i} st", "payment_method": f"pm{i}"} for i in range(count)])
+
+def test_read_graph_keeps_every_edge_of_a_truncated_page(fake):
+    seed()
+    graph = layout.read_graph(page_size=3, edges_per_node=1)
+    assert len(graph["keys"]) == 12
+    assert len(graph["src"]) == 12 * 11 // 2
+    pairs = {tuple(sorted(p)) for p in zip(graph["src"].tolist(), graph["dst"].tolist())}
+    assert len(pairs) == 66
+
+def test_tiles_list_nodes_or_clusters(fake):
+    seed()
+    graph = layout.read_graph(page_size=5)
+    index = layout.LayoutIndex(graph, layout.force_layout(len(graph["keys"]), graph["src"], graph["dst"],
+                                                          iterations=5))
+    detail = index.tile(0, 0, 0, limit=100)
+    assert not detail["clustered"] and len(detail["nodes"]) == 12 and len(detail["edges"]) == 66
+    assert index.tile(0, 0, 0, limit=2)["clustered"]
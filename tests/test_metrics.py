@@ -0,0 +1,61 @@
+"""Query and route metrics (backend/metrics.py) and their Prometheus rendering."""
+from collections import deque
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, metrics
+
+@pytest.fixture
+def fresh(monkeypatch):
+    monkeypatch.setattr(metrics, "query_seconds", metrics.Histogram())
+    monkeypatch.setattr(metrics, "route_seconds", metrics.Histogram())
+    monkeypatch.setattr(metrics, "_query_rows", {})
+    monkeypatch.setattr(metrics, "_query_text", {})
+    monkeypatch.setattr(metrics, "query_log", deque(maxlen=10))
+
+def _samples(text):
+    """{(name, labels): value} of the sample lines."""
+    samples = {}
+    for line in text.splitlines():
+        match = re.fullmatch(r'(\w+)(?:\{(.*)\})? (\S+)', line)
+        if match and not line.startswith("#"):
+            samples[match[1], match[2] or ""] = float(match[3])
+    return samples
+
+def test_metrics_after_one_request(fake, async_fake, lru, fresh):
+    client = TestClient(main.app)
+    assert client.get("/transactions").status_code == 200
+    text = client.get("/metrics").text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    samples = _samples(text)
+    labels = 'method="GET",route="/transactions",status="200"'
+    assert samples["http_request_duration_seconds_count", labels] == 1
+    assert samples["http_request_duration_seconds_bucket", labels + ',le="+Inf"'] == 1
+    assert samples["http_request_duration_seconds_bucket", labels + ',le="30"'] == 1
+    assert samples["http_request_duration_seconds_sum", labels] > 0
+    # Buckets are cumulative
+    buckets = [samples["http_request_duration_seconds_bucket", labels + f',le="{b}"'] for b in metrics.BUCKETS]
+    assert buckets == sorted(buckets)
+    assert samples["cache_hits", ""] >= 0
+
+def test_query_histogram_and_row_counter(fresh):
+    metrics.record_query("MATCH (n)\n  RETURN n", 0.003, 7)
+    metrics.record_query("MATCH (n) RETURN n", 0.2, 3)
+    fp, text = metrics.fingerprint("MATCH (n) RETURN n")
+    assert text == "MATCH (n) RETURN n"
+    samples = _samples(metrics.render_prometheus({"cache_size": 4, "flag": True}))
+    base = f'fingerprint="{fp}"'
+    assert samples["graph_query_duration_seconds_count", base] == 2
+    assert samples["graph_query_duration_seconds_bucket", base + ',le="0.0025"'] == 0
+    assert samples["graph_query_duration_seconds_bucket", base + ',le="0.005"'] == 1
+    assert samples["graph_query_duration_seconds_bucket", base + ',le="0.25"'] == 2
+    assert samples["graph_query_rows_total", base] == 10
+    assert samples["graph_query_info", base + ',query="MATCH (n) RETURN n"'] == 1
+    assert samples["cache_size", ""] == 4 and ("flag", "") not in samples
+    assert [e["rows"] for e in metrics.slow_queries()] == [3, 7]
+
+def test_label_values_are_escaped(fresh):
+    metrics.record_request("GET", 'a"b\\c', 200, 0.01)
+    assert 'route="a\\"b\\\\c"' in metrics.render_prometheus()
@@ -0,0 +1,126 @@
+"""CSR graph projection (backend/projection.py) against a dict-of-sets BFS."""
+import random
+from collections import deque
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from backend import projection
+from backend.projection import GraphProjection, USER_ATTRIBUTES, TRANSACTION_ATTRIBUTES
+
+class Reference:
+    """The same graph as plain adjacency sets, hubs keyed like the projection's."""
+    def __init__(self):
+        self.adj, self.hubs, self.attrs = {}, set(), {}
+
+    def _edge(self, a, b):
+        self.adj.setdefault(a, set()).add(b)
+        self.adj.setdefault(b, set()).add(a)
+
+    def _attributes(self, key, props, attributes):
+        for hub in self.attrs.get(key, ()):
+            self.adj[key].discard(hub)
+            self.adj[hub].discard(key)
+        self.attrs[key] = {f"{attr}:{props[attr]}" for attr in attributes if props.get(attr) is not None}
+        self.adj.setdefault(key, set())
+        for hub in self.attrs[key]:
+            self.hubs.add(hub)
+            self._edge(key, hub)
+
+    def add_users(self, users):
+        for user in users:
+            self._attributes(user["user_id"], user, USER_ATTRIBUTES)
+
+    def add_transactions(self, transactions):
+        for txn in transactions:
+            self.adj.setdefault(txn["txn_id"], set())
+            self._edge(txn["sender_id"], txn["txn_id"])
+            self._edge(txn["txn_id"], txn["receiver_id"])
+            self._attributes(txn["txn_id"], txn, TRANSACTION_ATTRIBUTES)
+
+    def hops(self, key, transparent):
+        if not transparent:
+            return self.adj[key]
+        out = set()
+        for n in self.adj[key]:
+            out |= (self.adj[n] - {key}) if n in self.hubs else {n}
+        return out
+
+    def distances(self, key, transparent, k=None):
+        dist, queue = {key: 0}, deque([key])
+        while queue:
+            v = queue.popleft()
+            if k is not None and dist[v] == k:
+                continue
+            for n in self.hops(v, transparent):
+                if n not in dist:
+                    dist[n] = dist[v] + 1
+                    queue.append(n)
+        return dist
+
+def _graph(rng, users=40, transactions=80, updates=15):
+    user_rows = [{"user_id": f"U{i}", "email": f"e{rng.randrange(30)}", "phone": f"p{rng.randrange(35)}",
+                  "address": None, "payment_method": None} for i in range(users)]
+    txn_rows = [{"txn_id": f"T{i}", "sender_id": f"U{rng.randrange(users)}", "receiver_id": f"U{rng.randrange(users)}",
+                 "device_id": f"d{rng.randrange(60)}", "ip_address": None} for i in range(transactions)]
+    changed = [{**user_rows[rng.randrange(users)], "email": f"e{rng.randrange(30)}", "phone": None}
+               for _ in range(updates)]
+    return user_rows, txn_rows, changed
+
+def _check(graph, reference, rng, transparent):
+    keys = [k for k in reference.adj if k not in reference.hubs]
+    for key in rng.sample(keys, 15):
+        for k in (1, 2, 3):
+            expected = {n: d for n, d in reference.distances(key, transparent, k).items() if n not in reference.hubs}
+            assert graph.k_hop(key, k) == expected
+        assert graph.degree(key) == len(reference.hops(key, transparent) - ({key} if transparent else set()))
+        other = rng.choice(keys)
+        dist = reference.distances(key, transparent)
+        path = graph.shortest_path(key, other)
+        if other not in dist:
+            assert path is None
+            continue
+        assert path[0] == key and path[-1] == other and len(path) - 1 == dist[other]
+        for a, b in zip(path, path[1:]):
+            assert b in reference.hops(a, transparent)
+
+@pytest.mark.parametrize("transparent", [True, False])
+def test_matches_a_dict_bfs_before_and_after_compaction(transparent):
+    rng = random.Random(7)
+    users, transactions, changed = _graph(rng)
+    graph, reference = GraphProjection(transparent_hubs=transparent), Reference()
+    for step in (lambda g: g.add_users(users), lambda g: g.add_transactions(transactions),
+                 lambda g: g.add_users(changed)):
+        step(graph)
+        step(reference)
+        # Delta adjacency over the CSR arrays, with removals pending
+        _check(graph, reference, rng, transparent)
+        graph.compact()
+        assert not graph.delta and not graph.removed
+        _check(graph, reference, rng, transparent)
+
+def test_compacts_at_the_threshold(monkeypatch):
+    monkeypatch.setattr(projection, "COMPACT_THRESHOLD", 10)
+    rng = random.Random(3)
+    users, transactions, changed = _graph(rng)
+    graph, reference = GraphProjection(), Reference()
+    for rows in (users, transactions, changed):
+        for row in rows:
+            batch = [row]
+            (graph.add_transactions if "txn_id" in row else graph.add_users)(batch)
+            (reference.add_transactions if "txn_id" in row else reference.add_users)(batch)
+    assert graph.delta_edges < 10 and len(graph.csr[1]) > 0
+    _check(graph, reference, rng, True)
+
+def test_an_updated_attribute_leaves_its_old_hub():
+    graph = GraphProjection()
+    graph.add_users([{"user_id": "A", "email": "x"}, {"user_id": "B", "email": "x"}])
+    assert graph.k_hop("A", 1) == {"A": 0, "B": 1}
+    graph.add_users([{"user_id": "B", "email": "y"}])
+    assert graph.k_hop("A", 1) == {"A": 0}
+    graph.compact()
+    assert graph.k_hop("A", 1) == {"A": 0} and graph.shortest_path("A", "B") is None
+    graph.add_users([{"user_id": "B", "email": "x"}])
+    assert graph.shortest_path("A", "B") == ["A", "B"]
+    assert graph.stats()["hubs"] == 2
@@ -0,0 +1,69 @@
+"""Near-duplicate matching by MinHash/LSH (backend/similarity.py)."""
+import pytest
+
+from backend import similarity
+
+def test_normalize_email():
+    assert similarity.normalize_email(" J.Doe+promo@GMail.com ") == "jdoe@gmail.com"
+    assert similarity.normalize_email("j.doe@example.com") == "j.doe@example.com"
+
+def test_normalize_phone():
+    for value in ("(555) 010-0123", "555.010.0123 ext. 7", "+1 555 010 0123"):
+        assert similarity.normalize_phone(value) == "+15550100123"
+
+def test_normalize_address():
+    assert similarity.normalize_address("12 North Oak Street, Apartment #4") == "12 n oak st apt 4"
+    assert similarity.normalize_address("12 N. Oak St apt 4") == "12 n oak st apt 4"
+    assert similarity.normalize_address("--") is None
+
+def test_estimate_tracks_jaccard_similarity():
+    pytest.importorskip("numpy")
+    sigs = similarity.signatures(["jane.doe@example.com", "jane.doe@example.org", "bob@elsewhere.net"])
+    assert similarity.estimate(sigs[0], sigs[0]) == 1.0
+    assert similarity.estimate(sigs[0], sigs[1]) > 0.5
+    assert similarity.estimate(sigs[0], sigs[2]) < 0.3
+
+def _user(key, email, phone, address):
+    return {"user_id": key, "email": email, "phone": phone, "address": address}
+
+def test_index_links_near_duplicates_once():
+    pytest.importorskip("numpy")
+    index = similarity.SimilarityIndex(threshold=0.6)
+    rows, replaced = index.add_users([
+        _user("A", "jane.doe@example.com", "555-010-0123", "12 Oak Street"),
+        _user("B", "bob@elsewhere.net", "555-999-0000", "7 Pine Road"),
+    ])
+    assert rows == [] and replaced == []
+    # Written later: A's phone in another format and a near-identical address
+    rows, _ = index.add_users([_user("C", "c@other.org", "(555) 010-0123", "12 Oak St")])
+    assert {(r["a"], r["b"], r["attribute"]) for r in rows} == {("A", "C", "phone"), ("A", "C", "address")}
+    assert all(r["score"] >= 0.6 for r in rows)
+    assert {m["user_id"] for m in index.similar("A")} == {"C"}
+
+def test_identical_raw_values_are_left_to_exact_detection():
+    pytest.importorskip("numpy")
+    index = similarity.SimilarityIndex()
+    rows, _ = index.add_users([_user("A", "a@x.com", "555-010-0123", "1 Main St"),
+                               _user("B", "b@y.com", "555-010-0123", "9 Elm Rd")])
+    assert rows == []
+
+def test_updated_users_replace_their_old_values():
+    pytest.importorskip("numpy")
+    index = similarity.SimilarityIndex()
+    index.add_users([_user("A", "a@x.com", "555-010-0123", "1 Main St"),
+                     _user("B", "b@y.com", "(555) 010-0123", "9 Elm Rd")])
+    rows, replaced = index.add_users([_user("B", "b@y.com", "555-222-3333", "9 Elm Rd")])
+    assert replaced == ["B"] and rows == []
+    assert index.similar("A") == []
+
+def test_bulk_build_pairs_match_incremental_adds():
+    pytest.importorskip("numpy")
+    users = [_user(f"U{i}", f"user{i % 5}@example.com", f"555-010-{i % 7:04d}", f"{i % 3} Oak Street")
+             for i in range(30)]
+    incremental = similarity.SimilarityIndex()
+    rows = []
+    for user in users:
+        rows += incremental.add_users([user])[0]
+    bulk = similarity.SimilarityIndex().build(users).pairs()
+    key = lambda r: (r["a"], r["b"], r["attribute"])
+    assert rows and sorted(map(key, bulk)) == sorted(map(key, rows))
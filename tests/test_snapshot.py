@@ -0,0 +1,42 @@
+"""Snapshot export and restore round trip (backend/snapshot.py)."""
+import pytest
+
+from backend import crud, snapshot
+from benchmarks import fake_db
+
+pytest.importorskip("pyarrow")
+
+USERS = [{"user_id": f"U{i}", "name": f"User {i}", "email": f"u{i}@x.com", "phone": f"555-{i % 2}",
+          "address": f"{i} Main St", "payment_method": f"card-{i}"} for i in range(5)]
+TRANSACTIONS = [{"txn_id": f"T{i}", "sender_id": f"U{i}", "receiver_id": f"U{(i + 1) % 5}", "amount": 1.5 * i,
+                 "device_id": f"d{i % 2}", "ip_address": f"10.0.0.{i}", "timestamp": 1_700_000_000_000 + i}
+                for i in range(5)]
+
+def _edges(conn):
+    return {rel: {(a, b) for a, targets in out.items() for b in targets} for rel, out in conn.out.items()}
+
+@pytest.mark.parametrize("fmt,compression", [("parquet", "zstd"), ("arrow", "none")])
+def test_restore_reproduces_the_exported_graph(fake, lru, tmp_path, monkeypatch, fmt, compression):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    out = str(tmp_path / "snapshot")
+    manifest = snapshot.export(out, fmt, compression, batch_size=2, conn=fake)
+    assert manifest["nodes"]["User"]["rows"] == 5 and manifest["edges"]["SENT"]["rows"] == 5
+    assert snapshot.read_manifest(out)["nodes"] == manifest["nodes"]
+    assert not (tmp_path / "snapshot.partial").exists()
+
+    restored = fake_db.FakeConnection()
+    monkeypatch.setattr(crud, "db", restored)
+    counts = snapshot.restore(out, batch_size=2, bootstrap=False)
+    assert counts["User"] == 5 and counts["Transaction"] == 5
+    assert restored.nodes["User"] == fake.nodes["User"]
+    assert restored.nodes["Transaction"] == fake.nodes["Transaction"]
+    assert {rel: edges for rel, edges in _edges(restored).items() if edges} == \
+        {rel: edges for rel, edges in _edges(fake).items() if edges}
+
+def test_restore_refuses_the_other_graph_model(fake, tmp_path, monkeypatch):
+    out = str(tmp_path / "snapshot")
+    snapshot.export(out, conn=fake)
+    monkeypatch.setattr(snapshot, "GRAPH_MODEL", "hub" if snapshot.GRAPH_MODEL != "hub" else "property")
+    with pytest.raises(RuntimeError):
+        snapshot.restore(out, bootstrap=False)
@@ -0,0 +1,56 @@
+"""Bounded bidirectional BFS (backend/traversal.py) on the in-process fake graph."""
+from backend import crud
+
+# A chain U0 -SENT-> T0 -RECEIVED_BY-> U1 -SENT-> T1 ... -> U5, nothing shared
+USERS = [{"user_id": f"U{i}", "name": f"User {i}", "email": f"u{i}@x.com", "phone": f"555-{i}",
+          "address": f"{i} Main St", "payment_method": f"card-{i}"} for i in range(6)]
+TRANSACTIONS = [{"txn_id": f"T{i}", "sender_id": f"U{i}", "receiver_id": f"U{i + 1}", "amount": 1.0,
+                 "device_id": f"d{i}", "ip_address": f"10.0.0.{i}", "timestamp": 1_700_000_000_000 + i}
+                for i in range(5)]
+CHAIN = [key for i in range(5) for key in (f"U{i}", f"T{i}")] + ["U5"]
+
+def _chain():
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+
+def test_shortest_path_meets_in_the_middle(fake, lru):
+    _chain()
+    result = crud.shortest_path("U0", "U5", max_depth=10)
+    assert result["path"] == CHAIN and result["length"] == 10
+    assert not result["truncated"]
+    assert crud.shortest_path("U5", "U0", max_depth=10)["path"] == CHAIN[::-1]
+    assert crud.shortest_path("U0", "T0")["path"] == ["U0", "T0"]
+    assert crud.shortest_path("U2", "U2")["length"] == 0
+
+def test_shortest_path_of_a_missing_node_is_none(fake, lru):
+    _chain()
+    assert crud.shortest_path("U0", "nobody") is None
+    assert crud.neighbourhood("nobody") is None
+
+def test_shortest_path_stops_at_the_depth_limit(fake, lru):
+    _chain()
+    result = crud.shortest_path("U0", "U5", max_depth=9)
+    assert result["path"] is None and result["truncated"] and result["reason"] == "depth"
+
+def test_shortest_path_stops_at_the_node_budget(fake, lru):
+    _chain()
+    result = crud.shortest_path("U0", "U5", max_depth=10, budget=4)
+    assert result["path"] is None and result["reason"] == "budget"
+    assert result["visited"] <= 4
+
+def test_search_times_out(fake, lru):
+    _chain()
+    result = crud.shortest_path("U0", "U5", timeout=0)
+    assert result["path"] is None and result["reason"] == "timeout"
+
+def test_neighbourhood_distances(fake, lru):
+    _chain()
+    result = crud.neighbourhood("U2", depth=2)
+    assert result["nodes"] == {"U2": 0, "T1": 1, "T2": 1, "U1": 2, "U3": 2}
+    assert not result["truncated"]
+
+def test_neighbourhood_does_not_expand_capped_nodes(fake, lru):
+    _chain()
+    result = crud.neighbourhood("U2", depth=2, degree_cap=1)
+    assert result["nodes"] == {"U2": 0}
+    assert result["reason"] == "degree_cap" and result["capped"] == ["U2"]
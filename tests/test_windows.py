@@ -0,0 +1,73 @@
+"""Event-time windows: `since` / `until` filters and the LINKED link window."""
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import crud, hubs, main
+
+DAY = 24 * 3600 * 1000
+JAN = 1_704_067_200_000  # 2024-01-01T00:00:00Z
+
+USERS = [{"user_id": f"U{i}", "name": f"User {i}", "email": f"u{i}@x.com", "phone": f"555-{i}",
+          "address": f"{i} Main St", "payment_method": f"card-{i}"} for i in range(2)]
+# One transaction a day through January 2024, all from the same device
+TRANSACTIONS = [{"txn_id": f"T{i:02d}", "sender_id": "U0", "receiver_id": "U1", "amount": 1.0,
+                 "device_id": "d0", "ip_address": f"10.0.0.{i}", "timestamp": JAN + i * DAY} for i in range(31)]
+
+@pytest.fixture
+def client(fake, async_fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS, detect=False)
+    # Without `with`, so the lifespan (which connects to Neo4j) does not run
+    return TestClient(main.app)
+
+def test_time_window_treats_naive_as_utc():
+    assert crud.time_window() is None
+    aware = crud.time_window(datetime(2024, 1, 1, tzinfo=timezone.utc), "2024-02-01T00:00:00Z")
+    naive = crud.time_window(datetime(2024, 1, 1), "2024-02-01T00:00:00")
+    assert aware == naive == {"since": JAN, "until": JAN + 31 * DAY}
+    assert crud.time_window(until=JAN) == {"since": None, "until": JAN}
+
+def test_transactions_in_a_window_with_mixed_timezones(client):
+    response = client.get("/transactions", params={"since": "2024-01-10T00:00:00Z", "until": "2024-01-13T00:00:00"})
+    assert response.status_code == 200
+    assert [t["txn_id"] for t in response.json()] == ["T11", "T10", "T09"]
+
+def test_empty_window_is_rejected(client):
+    response = client.get("/transactions", params={"since": "2024-01-10T00:00:00", "until": "2024-01-10T00:00:00Z"})
+    assert response.status_code == 400
+    assert client.get("/graph", params={"since": "2024-01-11", "until": "2024-01-10"}).status_code == 400
+
+def test_graph_leaves_out_transactions_outside_the_window(client):
+    graph = client.get("/graph", params={"since": "2024-01-30T00:00:00Z", "node_limit": 100}).json()
+    transactions = {n["data"]["id"] for n in graph["nodes"] if n["data"]["type"] == "transaction"}
+    assert transactions == {"T29", "T30"}
+    assert all(e["data"]["source"] in transactions | {"U0", "U1"} for e in graph["edges"])
+    assert all(e["data"]["target"] in transactions | {"U0", "U1"} for e in graph["edges"])
+    assert len(graph["edges"]) == 4
+
+def test_export_honours_the_window(client):
+    response = client.get("/export/transactions/json", params={"until": "2024-01-03T00:00:00Z"})
+    assert sorted(t["txn_id"] for t in response.json()) == ["T00", "T01"]
+
+def test_link_window_bounds_pairwise_detection(fake):
+    query = crud._detection_query("Transaction", "txn_id", crud.TRANSACTION_MATCH_ATTRIBUTES, "LINKED", 2 * DAY)
+    assert "b.timestamp >= a.timestamp - 172800000 AND b.timestamp <= a.timestamp + 172800000" in query
+    fake.handlers[query] = fake._detect("Transaction", crud.TRANSACTION_MATCH_ATTRIBUTES, "LINKED", 2 * DAY)
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS, detect=False)
+    crud._ingest(query, [t["txn_id"] for t in TRANSACTIONS])
+    linked = {tuple(sorted((a, b))) for a, targets in fake.out["LINKED"].items() for b in targets}
+    # Same device throughout: each transaction links to the ones up to two days away
+    assert linked == {(f"T{i:02d}", f"T{j:02d}") for i in range(31) for j in range(i + 1, min(i + 3, 31))}
+
+def test_link_window_applies_to_hub_derived_links(monkeypatch):
+    monkeypatch.setattr(crud, "HUB_MODEL", True)
+    monkeypatch.setattr(crud, "LINK_WINDOW_MS", DAY)
+    linked = crud._edge_query("LINKED", "Transaction", "txn_id", "Transaction", "txn_id")
+    assert hubs.link_window("a", "b", DAY) in linked
+    assert "abs(a.timestamp - b.timestamp) <= 86400000" in linked
+    shared = crud._edge_query("SHARED_ATTRIBUTE", "User", "user_id", "User", "user_id")
+    assert "timestamp" not in shared
+    assert hubs.link_window("a", "b", 0) == ""
@@ -0,0 +1,94 @@
+"""Columnar MessagePack graph pages (backend/wire.py) against the JSON response."""
+import math
+from array import array
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import crud, main, wire
+
+msgpack = pytest.importorskip("msgpack")
+
+USERS = [{"user_id": f"U{i}", "name": f"User {i}", "email": f"u{i}@x.com", "phone": "555-0101" if i % 2 else None,
+          "address": f"{i} Main St", "payment_method": f"card-{i}"} for i in range(4)]
+TRANSACTIONS = [{"txn_id": f"T{i}", "sender_id": f"U{i}", "receiver_id": f"U{(i + 1) % 4}",
+                 "amount": None if i == 0 else 2.5 * i, "device_id": "d0", "ip_address": f"10.0.0.{i}",
+                 "timestamp": 1_700_000_000_000 + i} for i in range(4)]
+
+def _ints(data, code="i"):
+    values = array(code)
+    values.frombytes(data)
+    return values.tolist()
+
+def _value(column, row, strings):
+    """One cell, or None when missing: -1 for strings, NaN for numbers."""
+    if column["kind"] == "str":
+        i = _ints(column["data"])[row]
+        return None if i == -1 else strings[i]
+    if column["kind"] == "num":
+        value = _ints(column["data"], "d")[row]
+        return None if math.isnan(value) else value
+    return column["data"][row]
+
+def decode_graph(payload):
+    """Cytoscape elements from a page, as frontend/index.html decodeGraph does (without labels)."""
+    page = msgpack.unpackb(payload)
+    strings, nodes, edges = page["strings"], page["nodes"], page["edges"]
+    ids = [strings[i] for i in _ints(nodes["id"])]
+    types = [page["node_types"][t] for t in _ints(nodes["type"], "B")]
+    elements = []
+    for row in range(nodes["count"]):
+        data = {"id": ids[row], "type": types[row]}
+        for name, column in nodes["columns"].items():
+            value = _value(column, row, strings)
+            if value is not None:
+                data[name] = value
+        elements.append({"group": "nodes", "data": data})
+    for source, target, code in zip(_ints(edges["source"]), _ints(edges["target"]), _ints(edges["type"], "B")):
+        rel_type, infix = page["edge_types"][code]
+        a, b = ids[source], ids[target]
+        elements.append({"group": "edges", "data": {"id": f"{a}-{infix}-{b}", "source": a, "target": b,
+                                                    "type": rel_type}})
+    return elements, page["truncated"], page["next"]
+
+@pytest.fixture
+def client(fake, async_fake, lru):
+    crud.create_users_bulk(USERS)
+    crud.create_transactions_bulk(TRANSACTIONS)
+    return TestClient(main.app)
+
+@pytest.mark.parametrize("params", [{"node_limit": 5}, {"node_limit": 100, "edge_limit": 3}, {"seed": "U1", "depth": 2}])
+def test_msgpack_page_matches_the_json_page(client, params):
+    graph = client.get("/graph", params=params).json()
+    response = client.get("/graph", params=params, headers={"Accept": wire.MEDIA_TYPE})
+    assert response.headers["content-type"] == wire.MEDIA_TYPE
+    elements, truncated, cursor = decode_graph(response.content)
+    expected = [{"group": e["group"], "data": {k: v for k, v in e["data"].items() if v is not None and k != "label"}}
+                for e in graph["nodes"] + graph["edges"]]
+    assert elements == expected
+    assert (truncated, cursor) == (graph["truncated"], graph["next"])
+
+def test_missing_values_are_minus_one_and_nan():
+    page = msgpack.unpackb(wire.encode_graph([
+        ("nodes", "User", {"user_id": "U0", "phone": None}),
+        ("nodes", "Transaction", {"txn_id": "T0", "amount": None}),
+        ("nodes", "Transaction", {"txn_id": "T1", "amount": 2.5}),
+        ("edges", "SENT", "sent", "U0", "T1"),
+        ("end", False, None),
+    ]))
+    columns = page["nodes"]["columns"]
+    assert _ints(columns["phone"]["data"]) == [-1, -1, -1]
+    amounts = _ints(columns["amount"]["data"], "d")
+    assert math.isnan(amounts[0]) and math.isnan(amounts[1]) and amounts[2] == 2.5
+    # Edge endpoints are node row numbers
+    assert _ints(page["edges"]["source"]) == [0] and _ints(page["edges"]["target"]) == [2]
+
+def test_export_batches_round_trip(monkeypatch):
+    monkeypatch.setattr(wire, "EXPORT_BATCH", 2)
+    records = [{"txn_id": "T0", "amount": 1.5}, {"txn_id": "T1", "amount": None}, {"txn_id": "T2", "device_id": "d"}]
+    batches = [msgpack.unpackb(chunk) for chunk in wire.export_chunks(records)]
+    assert [b["count"] for b in batches] == [2, 1]
+    decoded = [{name: _value(column, row, batch["strings"]) for name, column in batch["columns"].items()}
+               for batch in batches for row in range(batch["count"])]
+    assert decoded == [{"txn_id": "T0", "amount": 1.5}, {"txn_id": "T1", "amount": None},
+                       {"txn_id": "T2", "device_id": "d"}]
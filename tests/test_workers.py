@@ -0,0 +1,21 @@
+"""Multi-worker startup check (backend/main.py)."""
+import pytest
+
+from backend import cache, main
+
+def test_memory_cache_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "memory")
+    with pytest.raises(RuntimeError, match="CACHE_BACKEND=memory"):
+        main.check_workers(4)
+    main.check_workers(1)
+
+def test_shared_cache_allows_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    assert main.per_worker_state() == []
+    main.check_workers(4)
+
+def test_in_memory_indexes_refuse_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(main.features, "features", main.features.FeatureStore())
+    with pytest.raises(RuntimeError, match="FEATURES_ENABLED"):
+        main.check_workers(2)